@@ -33,18 +33,22 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "django.contrib.humanize",
+    "django.contrib.postgres",
     "rest_framework",
+    "django_filters",
     "corsheaders",
     "inventory",
 ]
 
 MIDDLEWARE = [
+    "inventory.metrics.RequestMetricsMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "inventory.cart.CartMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -74,6 +78,13 @@ DATABASES = {
     "default": env.db("DATABASE_URL", default=f"postgres://{env('POSTGRES_USER', default='agrovet')}:{env('POSTGRES_PASSWORD', default='agrovet')}@{env('POSTGRES_HOST', default='db')}:{env('POSTGRES_PORT', default='5432')}/{env('POSTGRES_DB', default='agrovet')}")
 }
 
+# --- CACHE ---
+# File-based by default so every gunicorn worker sees the same storefront cache
+# and invalidations; point CACHE_URL at Redis/Memcached for multi-host setups.
+CACHES = {
+    "default": env.cache("CACHE_URL", default="filecache:///tmp/agrovet-cache"),
+}
+
 # --- AUTHENTICATION ---
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
@@ -106,6 +117,9 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.BasicAuthentication",
     ],
+    "DEFAULT_PAGINATION_CLASS": "inventory.pagination.StableCursorPagination",
+    "DEFAULT_FILTER_BACKENDS": ["django_filters.rest_framework.DjangoFilterBackend"],
+    "PAGE_SIZE": 100,
 }
 
 # --- MPESA DARAJA SETTINGS ---
@@ -114,6 +128,41 @@ MPESA_CONSUMER_SECRET = env('MPESA_CONSUMER_SECRET', default='')
 MPESA_PASSKEY = env('MPESA_PASSKEY', default='')
 MPESA_SHORTCODE = env('MPESA_SHORTCODE', default='174379')
 MPESA_CALLBACK_URL = env('MPESA_CALLBACK_URL', default='')
+MPESA_BASE_URL = env('MPESA_BASE_URL', default='https://sandbox.safaricom.co.ke')
+MPESA_CONNECT_TIMEOUT = env.float('MPESA_CONNECT_TIMEOUT', default=3.05)
+MPESA_READ_TIMEOUT = env.float('MPESA_READ_TIMEOUT', default=15)
+MPESA_POOL_SIZE = env.int('MPESA_POOL_SIZE', default=10)
+# Seconds after an STK push before its status is queried if no callback has arrived
+MPESA_STATUS_QUERY_DELAY = env.int('MPESA_STATUS_QUERY_DELAY', default=120)
+
+# --- BACKGROUND JOBS ---
+# Base delay in seconds before a failed job is retried; doubles on each attempt.
+JOB_RETRY_BACKOFF = env.int('JOB_RETRY_BACKOFF', default=30)
+
+# --- ORDERS ---
+# Storefront cart storage: inventory.cart.SignedCookieCartBackend,
+# CacheCartBackend (cache, plus the DB for signed-in customers) or SessionCartBackend.
+CART_BACKEND = env('CART_BACKEND', default='inventory.cart.SignedCookieCartBackend')
+
+# Unpaid web orders (including pay-on-pick-up) older than this are cancelled
+# by `manage.py expire_pending_orders` and their stock released.
+PENDING_ORDER_TTL_HOURS = env.int('PENDING_ORDER_TTL_HOURS', default=48)
+
+# --- REQUEST METRICS ---
+# Per-request query/timing instrumentation (Server-Timing header, a JSON log
+# line per request and the staff page at /dashboard/metrics/). Off by default.
+REQUEST_METRICS = env.bool('REQUEST_METRICS', default=False)
+# Requests kept per worker process for the metrics page.
+REQUEST_METRICS_BUFFER = env.int('REQUEST_METRICS_BUFFER', default=5000)
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "inventory.metrics": {"handlers": ["console"], "level": "INFO", "propagate": False},
+    },
+}
 
 # --- EMAIL SETTINGS ---
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -1,7 +1,8 @@
 from django.contrib import admin
+from django.utils import timezone
 from .models import (
     Unit, Category, Product, Supplier, Customer,
-    Purchase, PurchaseItem, Sale, SaleItem, StockTransaction
+    Purchase, PurchaseItem, Sale, SaleItem, StockTransaction, Job
 )
 
 @admin.register(Unit)
@@ -16,6 +17,10 @@ class CategoryAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ("sku", "name", "category", "unit", "selling_price", "stock_quantity", "reorder_level", "active")
     search_fields = ("sku", "name")
+    list_select_related = ("category", "unit")
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_stock()
 
 @admin.register(Supplier)
 class SupplierAdmin(admin.ModelAdmin):
@@ -36,13 +41,65 @@ class PurchaseAdmin(admin.ModelAdmin):
 
 class SaleItemInline(admin.TabularInline):
     model = SaleItem
-    extra = 1
+    extra = 0
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
-    list_display = ("id", "customer", "date", "total")
+    """
+    Sales are created and moved between statuses by the services, which keep
+    DailySalesSummary and the stock ledger in step; here they are only viewed.
+    """
+    list_display = ("id", "customer", "date", "total", "status", "channel")
+    list_filter = ("status", "channel")
+    readonly_fields = ("date", "total", "status", "channel")
     inlines = [SaleItemInline]
 
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(StockTransaction)
 class StockTransactionAdmin(admin.ModelAdmin):
-    list_display = ("product", "transaction_type", "quantity", "reference", "timestamp")
\ No newline at end of file
+    """
+    The ledger is append-only: corrections are new rows (quantity signed,
+    negative for OUT), recorded through StockTransaction.objects.record() so
+    StockBalance moves with them.
+    Editing or deleting past rows would desync balances and snapshots.
+    """
+    list_display = ("product", "transaction_type", "quantity", "reference", "timestamp")
+    fields = ("product", "transaction_type", "quantity", "reference")
+    list_select_related = ("product",)
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        obj.pk = StockTransaction.objects.record(
+            obj.product, obj.quantity, obj.transaction_type, obj.reference
+        ).pk
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("id", "name", "status", "attempts", "run_at", "finished_at")
+    list_filter = ("status", "name")
+    readonly_fields = ("last_error",)
+    actions = ["requeue"]
+
+    @admin.action(description="Requeue selected jobs")
+    def requeue(self, request, queryset):
+        queryset.update(status=Job.QUEUED, attempts=0, run_at=timezone.now(), locked_until=None)
+
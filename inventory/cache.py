@@ -0,0 +1,96 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+# Storefront fragments are keyed by a catalogue version number; bumping the
+# version orphans every cached fragment at once, and the TTL bounds how long
+# an orphaned entry lingers in the backend. Fragments that show stock are
+# also keyed by a per-product stock version, so a sale only orphans the
+# fragments showing the products it moved.
+CATALOGUE_TIMEOUT = 300
+_VERSION_KEY = "catalogue:version"
+_STOCK_VERSION_KEY = "catalogue:stock:{}"
+
+
+def catalogue_version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a version lost to eviction is never reused
+        cache.add(_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def _bump_catalogue_version():
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_catalogue():
+    """Drop all cached storefront fragments once the current transaction commits."""
+    transaction.on_commit(_bump_catalogue_version)
+
+
+def stock_versions(product_ids):
+    """{pk: version} of the given products' stock, seeding missing ones from the clock."""
+    keys = {pk: _STOCK_VERSION_KEY.format(pk) for pk in product_ids}
+    found = cache.get_many(list(keys.values()))
+    missing = {key: time.time_ns() for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {pk: found[key] for pk, key in keys.items()}
+
+
+def invalidate_stock(product_ids):
+    """Drop the cached fragments showing these products' stock once the current transaction commits."""
+    keys = [_STOCK_VERSION_KEY.format(pk) for pk in product_ids]
+    if keys:
+        transaction.on_commit(lambda: cache.set_many({key: time.time_ns() for key in keys}, timeout=None))
+
+
+def cached_catalogue(name, params, build):
+    """Return the cached value for (name, params), calling build() on a miss."""
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    key = f"catalogue:{catalogue_version()}:{name}:{digest}"
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, CATALOGUE_TIMEOUT)
+    return value
+
+
+def cached_catalogue_many(name, keys, build_many):
+    """
+    Batched cached_catalogue: one cache round trip for all ``keys``, with
+    build_many(missing_keys) -> {key: value} called once for the misses.
+    """
+    prefix = f"catalogue:{catalogue_version()}:{name}:"
+    found = cache.get_many([f"{prefix}{key}" for key in keys])
+    values = {key: found[f"{prefix}{key}"] for key in keys if f"{prefix}{key}" in found}
+    missing = [key for key in keys if key not in values]
+    if missing:
+        built = build_many(missing)
+        cache.set_many({f"{prefix}{key}": value for key, value in built.items()}, CATALOGUE_TIMEOUT)
+        values.update(built)
+    return values
+
+
+def cached_stock_fragment(name, params, product_ids, build):
+    """cached_catalogue for a fragment showing the stock of ``product_ids``."""
+    versions = stock_versions(product_ids)
+    return cached_catalogue(name, (params, [versions[pk] for pk in product_ids]), build)
+
+
+def cached_stock_many(name, product_ids, build_many):
+    """cached_catalogue_many keyed by product, for values showing each product's stock."""
+    versions = stock_versions(product_ids)
+    keys = {f"{pk}:{versions[pk]}": pk for pk in product_ids}
+    values = cached_catalogue_many(name, list(keys), lambda missing: {
+        f"{pk}:{versions[pk]}": value for pk, value in build_many([keys[key] for key in missing]).items()
+    })
+    return {keys[key]: value for key, value in values.items()}
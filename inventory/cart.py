@@ -0,0 +1,182 @@
+"""
+Storefront cart with pluggable storage.
+
+``CartMiddleware`` attaches a lazily loaded ``request.cart`` and writes it
+back through ``settings.CART_BACKEND`` only when a view changed it, so
+browsing never touches storage and adding to the cart no longer costs a
+session-table write:
+
+* ``SignedCookieCartBackend`` (default) keeps the cart in a signed cookie.
+* ``CacheCartBackend`` keeps it in the cache under a random cart id, and for
+  signed-in customers also in ``SavedCart`` so it survives cache eviction.
+* ``SessionCartBackend`` is the previous ``request.session['cart']`` storage.
+
+Signing out empties the cart, as it did when the cart lived in the session.
+"""
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.module_loading import import_string
+
+from .cache import cached_stock_many
+from .models import Product, SavedCart
+
+CART_COOKIE = "cart"
+CART_MAX_AGE = 60 * 60 * 24 * 30
+
+
+class Cart:
+    """Product id (as a string) -> quantity."""
+
+    def __init__(self, items=None):
+        self.items = {}
+        for pk, qty in (items or {}).items():
+            try:
+                if int(qty) > 0:
+                    self.items[str(int(pk))] = int(qty)
+            except (TypeError, ValueError):
+                continue
+        self.modified = False
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+    @property
+    def count(self):
+        return sum(self.items.values())
+
+    def quantity(self, pk):
+        return self.items.get(str(pk), 0)
+
+    def add_many(self, quantities):
+        for pk, qty in quantities.items():
+            self.items[str(pk)] = self.quantity(pk) + qty
+        self.modified = True
+
+    def add(self, pk, quantity=1):
+        self.add_many({pk: quantity})
+
+    def remove(self, pk):
+        if self.items.pop(str(pk), None) is not None:
+            self.modified = True
+
+    def clear(self):
+        if self.items:
+            self.items = {}
+            self.modified = True
+
+
+def availability(product_ids):
+    """
+    {pk: {"name", "on_hand"}} for the given products, from the catalogue cache
+    (keyed by each product's stock version) with one query for the misses.
+    Checkout re-checks stock under lock, so this only has to be fresh, not exact.
+    """
+    def build(missing):
+        return {
+            pk: {"name": name, "on_hand": on_hand}
+            for pk, name, on_hand in Product.objects.with_stock()
+            .filter(pk__in=missing).values_list("pk", "name", "on_hand")
+        }
+    return cached_stock_many("availability", sorted({int(pk) for pk in product_ids}), build)
+
+
+def _set_cookie(request, response, value, signed=False):
+    setter = response.set_signed_cookie if signed else response.set_cookie
+    kwargs = {"salt": "inventory.cart"} if signed else {}
+    setter(
+        CART_COOKIE, value, max_age=CART_MAX_AGE, httponly=True,
+        samesite="Lax", secure=request.is_secure(), **kwargs,
+    )
+
+
+class SignedCookieCartBackend:
+    def load(self, request):
+        try:
+            return Cart(json.loads(request.get_signed_cookie(CART_COOKIE, default="{}", salt="inventory.cart")))
+        except (ValueError, AttributeError):
+            return Cart()
+
+    def save(self, request, response, cart):
+        if cart:
+            _set_cookie(request, response, json.dumps(cart.items, separators=(",", ":")), signed=True)
+        else:
+            response.delete_cookie(CART_COOKIE, samesite="Lax")
+
+
+class CacheCartBackend:
+    def _cart_id(self, request):
+        try:
+            return uuid.UUID(request.COOKIES.get(CART_COOKIE, "")).hex
+        except ValueError:
+            return None
+
+    def load(self, request):
+        cart_id = self._cart_id(request)
+        if not request.user.is_authenticated:
+            cart = Cart(cache.get(f"cart:{cart_id}") if cart_id else None)
+            cart.cart_id = cart_id
+            return cart
+
+        key = f"cart:user:{request.user.pk}"
+        items = cache.get(key)
+        if items is None:
+            items = SavedCart.objects.filter(user=request.user).values_list("items", flat=True).first()
+            cache.set(key, items or {}, CART_MAX_AGE)
+        cart = Cart(items)
+        cart.cart_id = cart_id
+        if cart_id:
+            # Items added before signing in move to the customer's own cart
+            guest = cache.get(f"cart:{cart_id}")
+            if guest:
+                cart.add_many(Cart(guest).items)
+                cache.delete(f"cart:{cart_id}")
+            cart.modified = True
+        return cart
+
+    def save(self, request, response, cart):
+        if request.user.is_authenticated:
+            cache.set(f"cart:user:{request.user.pk}", cart.items, CART_MAX_AGE)
+            SavedCart.objects.bulk_create(
+                [SavedCart(user=request.user, items=cart.items)],
+                update_conflicts=True, unique_fields=["user"], update_fields=["items", "updated_at"],
+            )
+            if cart.cart_id:
+                response.delete_cookie(CART_COOKIE, samesite="Lax")
+            return
+        if not cart and not cart.cart_id:
+            return
+        cart_id = cart.cart_id or uuid.uuid4().hex
+        cache.set(f"cart:{cart_id}", cart.items, CART_MAX_AGE)
+        if cart_id != cart.cart_id:
+            _set_cookie(request, response, cart_id)
+
+
+class SessionCartBackend:
+    def load(self, request):
+        return Cart(request.session.get('cart'))
+
+    def save(self, request, response, cart):
+        request.session['cart'] = cart.items
+
+
+class CartMiddleware:
+    """Attach ``request.cart``; must come after AuthenticationMiddleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.backend = import_string(settings.CART_BACKEND)()
+
+    def __call__(self, request):
+        request.cart = SimpleLazyObject(lambda: self.backend.load(request))
+        response = self.get_response(request)
+        cart = request.cart._wrapped
+        if cart is not empty and cart.modified:
+            self.backend.save(request, response, cart)
+        return response
@@ -1,8 +1,8 @@
 from django import forms
-from django.forms import inlineformset_factory
+from django.utils.functional import cached_property
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Product, Supplier, Customer, Purchase, PurchaseItem, Sale, SaleItem, Category, Unit
+from .models import Product, Supplier, Customer, Category, Unit
 
 class CustomerSignupForm(UserCreationForm):
     class Meta:
@@ -27,6 +27,41 @@ class UnitForm(forms.ModelForm):
             "abbreviation": forms.TextInput(attrs={"class": "form-control", "placeholder": "e.g. kg"}),
         }
 
+class YesNoField(forms.Field):
+    """Spreadsheet-friendly boolean: yes/no, true/false, 1/0; blank is None."""
+
+    def to_python(self, value):
+        value = (value or "").strip().lower()
+        if not value:
+            return None
+        if value in ("1", "true", "yes", "y"):
+            return True
+        if value in ("0", "false", "no", "n"):
+            return False
+        raise forms.ValidationError("Use yes/no, true/false or 1/0.")
+
+class ProductImportForm(forms.Form):
+    """One row of a product import file; blank cells keep the existing value."""
+    sku = forms.CharField(max_length=64)
+    name = forms.CharField(max_length=255, required=False)
+    description = forms.CharField(required=False)
+    category = forms.CharField(max_length=100, required=False)
+    unit = forms.CharField(max_length=50, required=False)
+    buying_price = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    selling_price = forms.DecimalField(max_digits=10, decimal_places=2, min_value=0, required=False)
+    reorder_level = forms.IntegerField(min_value=0, required=False)
+    active = YesNoField(required=False)
+
+class ProductImportUploadForm(forms.Form):
+    file = forms.FileField(
+        label="CSV file",
+        widget=forms.ClearableFileInput(attrs={"class": "form-control", "accept": ".csv,text/csv"}),
+    )
+    dry_run = forms.BooleanField(
+        required=False, label="Validate only (don't save)",
+        widget=forms.CheckboxInput(attrs={"class": "form-check-input"}),
+    )
+
 class ProductForm(forms.ModelForm):
     class Meta:
         model = Product
@@ -66,10 +101,46 @@ class CustomerForm(forms.ModelForm):
             "address": forms.Textarea(attrs={"rows": 2, "class": "form-control"}),
         }
 
-PurchaseItemFormSet = inlineformset_factory(
-    Purchase, PurchaseItem, fields=("product", "quantity", "unit_price"), extra=1, can_delete=True
+class ProductChoiceField(forms.ModelChoiceField):
+    """ModelChoiceField that first looks the id up in a prefetched {pk: Product} map."""
+    prefetched = {}
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.prefetched[int(value)]
+        except (KeyError, TypeError, ValueError):
+            return super().to_python(value)
+
+class StockLineForm(forms.Form):
+    product = ProductChoiceField(queryset=Product.objects.all())
+    quantity = forms.DecimalField(max_digits=10, decimal_places=2, initial=1)
+    unit_price = forms.DecimalField(max_digits=12, decimal_places=2, initial=0)
+
+    def __init__(self, *args, products=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["product"].prefetched = products or {}
+
+class BaseStockLineFormSet(forms.BaseFormSet):
+    """Resolves the product of every submitted line with one query instead of one per form."""
+
+    @cached_property
+    def products(self):
+        if not self.is_bound:
+            return {}
+        ids = [self.data.get(f"{self.add_prefix(i)}-product") for i in range(self.total_form_count())]
+        return Product.objects.in_bulk([pk for pk in ids if pk and str(pk).isdigit()])
+
+    def get_form_kwargs(self, index):
+        kwargs = super().get_form_kwargs(index)
+        kwargs["products"] = self.products
+        return kwargs
+
+PurchaseItemFormSet = forms.formset_factory(
+    StockLineForm, formset=BaseStockLineFormSet, extra=1, can_delete=True
 )
 
-SaleItemFormSet = inlineformset_factory(
-    Sale, SaleItem, fields=("product", "quantity", "unit_price"), extra=1, can_delete=True
+SaleItemFormSet = forms.formset_factory(
+    StockLineForm, formset=BaseStockLineFormSet, extra=1, can_delete=True
 )
\ No newline at end of file
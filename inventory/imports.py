@@ -0,0 +1,177 @@
+"""
+Bulk product catalogue import from CSV.
+
+Rows are read as a stream and handled in chunks: each chunk is validated
+with ProductImportForm, category and unit names are resolved from maps
+loaded once per import, and valid rows are upserted on ``sku`` with a single
+``bulk_create(update_conflicts=True)``. Blank cells keep the product's
+current value (or the model default for new products).
+"""
+import csv
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .cache import invalidate_catalogue
+from .forms import ProductImportForm
+from .models import Category, Product, StockBalance, Unit
+
+CHUNK_SIZE = 1000
+FIELDS = ProductImportForm.base_fields
+COLUMNS = list(FIELDS)
+UPDATE_FIELDS = [
+    "name", "description", "category", "unit", "buying_price",
+    "selling_price", "reorder_level", "active", "updated_at",
+]
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    updated: int = 0
+    errors: list = field(default_factory=list)  # (line number, message)
+    warnings: list = field(default_factory=list)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+
+def _normalise(header):
+    return header.strip().lower().replace(" ", "_") if header else header
+
+
+def _lookup(model, *fields):
+    """{lowercased name or alias: pk} for a small reference table."""
+    mapping = {}
+    for row in model.objects.values_list("pk", *fields):
+        for value in row[1:]:
+            if value:
+                mapping.setdefault(value.strip().lower(), row[0])
+    return mapping
+
+
+def import_products(lines, chunk_size=CHUNK_SIZE, dry_run=False):
+    """
+    Import products from an iterable of CSV text lines (a file object works).
+    The first line is the header; ``sku`` is required and other columns are
+    optional, so a price list with just sku and selling_price updates prices.
+    """
+    result = ImportResult()
+    reader = csv.DictReader(lines)
+    reader.fieldnames = [_normalise(name) for name in (reader.fieldnames or [])]
+    if "sku" not in reader.fieldnames:
+        result.errors.append((1, "The header row must include a 'sku' column."))
+        return result
+    unknown = [name for name in reader.fieldnames if name and name not in COLUMNS]
+    if unknown:
+        result.warnings.append(f"Unknown columns ignored: {', '.join(unknown)}")
+
+    categories = _lookup(Category, "name")
+    units = _lookup(Unit, "name", "abbreviation")
+    rows = ((reader.line_num, row) for row in reader)
+    seen = {}  # sku: line of the row saved for it, across chunks
+    with transaction.atomic():
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            _import_chunk(chunk, categories, units, seen, result)
+        if dry_run:
+            transaction.set_rollback(True)
+    if not dry_run and (result.created or result.updated):
+        invalidate_catalogue()
+    return result
+
+
+def _clean_row(row):
+    """
+    Validate the non-blank cells of a row with ProductImportForm's fields.
+    The field instances are used directly: building a bound form per row
+    deep-copies every field and dominated import time.
+    """
+    data, errors = {}, []
+    for name, form_field in FIELDS.items():
+        value = (row.get(name) or "").strip()
+        if not value and name != "sku":
+            continue
+        try:
+            data[name] = form_field.clean(value)
+        except ValidationError as exc:
+            errors.append(f"{name}: {' '.join(exc.messages)}")
+    return data, errors
+
+
+def _import_chunk(chunk, categories, units, seen, result):
+    valid = {}
+    for line, row in chunk:
+        data, row_errors = _clean_row(row)
+        if row_errors:
+            result.errors.extend((line, message) for message in row_errors)
+            continue
+        for name, mapping in (("category", categories), ("unit", units)):
+            if name in data:
+                pk = mapping.get(data[name].lower())
+                if pk is None:
+                    result.errors.append((line, f"{name}: unknown {name} '{data[name]}'."))
+                    break
+                data[name] = pk
+        else:
+            first = valid[data["sku"]][0] if data["sku"] in valid else seen.get(data["sku"])
+            if first is not None:
+                result.errors.append((first, f"sku: {data['sku']} appears again on line {line}; the later row is used."))
+            valid[data["sku"]] = (line, data)
+    if not valid:
+        return
+
+    existing = {
+        row["sku"]: row
+        for row in Product.objects.filter(sku__in=list(valid)).values(
+            "sku", "name", "description", "category_id", "unit_id",
+            "buying_price", "selling_price", "reorder_level", "active",
+        )
+    }
+    now = timezone.now()
+    products = []
+    for sku, (line, data) in valid.items():
+        current = existing.get(sku)
+        if current is None and not data.get("name"):
+            result.errors.append((line, "name: required for a new product."))
+            continue
+        values = {
+            "name": "", "description": "", "category_id": None, "unit_id": None,
+            "buying_price": 0, "selling_price": 0, "reorder_level": 5, "active": True,
+        }
+        if current:
+            values.update({key: value for key, value in current.items() if key != "sku"})
+        for key, value in data.items():
+            if key in ("category", "unit"):
+                values[f"{key}_id"] = value
+            elif key != "sku":
+                values[key] = value
+        products.append(Product(sku=sku, updated_at=now, **values))
+
+    try:
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products, update_conflicts=True, unique_fields=["sku"], update_fields=UPDATE_FIELDS,
+            )
+            imported = Product.objects.filter(sku__in=[product.sku for product in products])
+            imported.update_search_vector()
+            StockBalance.objects.bulk_create(
+                [StockBalance(product_id=pk) for pk in imported.values_list("pk", flat=True)],
+                ignore_conflicts=True,
+            )
+    except DatabaseError as exc:
+        first, last = chunk[0][0], chunk[-1][0]
+        result.errors.append((first, f"Lines {first}-{last} were not saved: {exc}"))
+        return
+    # A product already saved from an earlier chunk was counted there
+    counted = [product for product in products if product.sku not in seen]
+    created = sum(1 for product in counted if product.sku not in existing)
+    result.created += created
+    result.updated += len(counted) - created
+    seen.update((product.sku, valid[product.sku][0]) for product in products)
@@ -0,0 +1,173 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job, MpesaTransaction, Sale
+from .utils import MpesaClient, MpesaError, MpesaTimeout
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class NoRetry(Exception):
+    """Raised by a job whose failure must not be retried; the job goes straight to DEAD."""
+
+
+def job(name=None, max_attempts=5):
+    """Register a function as a background job; call ``func.enqueue(**payload)`` to queue it."""
+    def decorator(func):
+        job_name = name or func.__name__
+        _registry[job_name] = func
+        func.enqueue = lambda run_at=None, **payload: enqueue(
+            job_name, run_at=run_at, max_attempts=max_attempts, **payload
+        )
+        return func
+    return decorator
+
+
+def enqueue(name, run_at=None, max_attempts=5, **payload):
+    """
+    Queue a job. The row is written in the caller's transaction, so workers
+    see it exactly when that transaction commits and never if it rolls back.
+    """
+    return Job.objects.create(
+        name=name, payload=payload, max_attempts=max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+
+
+def claim_jobs(limit=10, lease=timedelta(minutes=5)):
+    """
+    Lock up to ``limit`` due jobs with SKIP LOCKED so concurrent workers never
+    claim the same row. Jobs whose worker died mid-run become claimable again
+    once their lease expires, which is what makes delivery at-least-once.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=Job.QUEUED, run_at__lte=now)
+                | Q(status=Job.RUNNING, locked_until__lt=now)
+            )
+            .order_by("run_at")[:limit]
+        )
+        for claimed in jobs:
+            claimed.status = Job.RUNNING
+            claimed.attempts += 1
+            claimed.locked_until = now + lease
+        Job.objects.bulk_update(jobs, ["status", "attempts", "locked_until"])
+    return jobs
+
+
+def run_job(claimed):
+    func = _registry.get(claimed.name)
+    try:
+        if func is None:
+            raise LookupError(f"No job registered as {claimed.name!r}")
+        func(**claimed.payload)
+    except Exception as exc:
+        error = traceback.format_exc()
+        if isinstance(exc, NoRetry) or claimed.attempts >= claimed.max_attempts:
+            claimed.status = Job.DEAD
+            claimed.finished_at = timezone.now()
+            logger.error("Job %s dead after %s attempts:\n%s", claimed, claimed.attempts, error)
+        else:
+            claimed.status = Job.QUEUED
+            claimed.run_at = timezone.now() + timedelta(seconds=settings.JOB_RETRY_BACKOFF * 2 ** (claimed.attempts - 1))
+            logger.warning("Job %s failed (attempt %s), retrying:\n%s", claimed, claimed.attempts, error)
+        claimed.last_error = error
+    else:
+        claimed.status = Job.DONE
+        claimed.finished_at = timezone.now()
+        claimed.last_error = ""
+    claimed.locked_until = None
+    claimed.save(update_fields=["status", "run_at", "locked_until", "last_error", "finished_at"])
+    return claimed.status
+
+
+# ==========================================
+# CHECKOUT SIDE EFFECTS
+# ==========================================
+
+@job()
+def send_order_confirmation(sale_id):
+    sale = Sale.objects.select_related("customer").get(pk=sale_id)
+    email = sale.customer.email if sale.customer else ""
+    if not email:
+        return
+    lines = "\n".join(
+        f"  {item.quantity:g} x {item.product.name} @ KES {item.unit_price}"
+        for item in sale.items.select_related("product")
+    )
+    send_mail(
+        subject=f"Agrovet order #{sale.id} received",
+        message=(
+            f"Hello {sale.customer.name},\n\nThank you for your order #{sale.id}.\n\n"
+            f"{lines}\n\nTotal: KES {sale.total}\nStatus: {sale.get_status_display()}\n"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        recipient_list=[email],
+    )
+
+
+@job(max_attempts=3)
+def mpesa_stk_push(sale_id, phone, cancel_on_failure=False):
+    """
+    Send the STK prompt for a pending sale. Errors where the prompt was
+    certainly not sent are retried by the queue; a timed-out push is not, as
+    the customer may already have been prompted and a second push could
+    charge them twice.
+    """
+    from .services import cancel_pending_sales
+
+    sale = Sale.objects.get(pk=sale_id)
+    if sale.status != 'PENDING':
+        return
+    if sale.payments.exclude(status='FAILED').exists():
+        # An earlier attempt got through before its worker died
+        return
+    try:
+        response = MpesaClient().stk_push(phone, sale.total, sale.id)
+    except MpesaTimeout as exc:
+        raise NoRetry(f"STK push for sale {sale_id} timed out and was not resent") from exc
+    if response.get('ResponseCode') != '0':
+        logger.warning("STK push for sale %s rejected: %s", sale_id, response)
+        if cancel_on_failure:
+            cancel_pending_sales([sale_id])
+        return
+    with transaction.atomic():
+        payment = MpesaTransaction.objects.create(
+            sale=sale,
+            merchant_request_id=response.get('MerchantRequestID'),
+            checkout_request_id=response.get('CheckoutRequestID'),
+            amount=sale.total,
+            phone=phone,
+        )
+        mpesa_payment_status.enqueue(
+            run_at=timezone.now() + timedelta(seconds=settings.MPESA_STATUS_QUERY_DELAY),
+            checkout_request_id=payment.checkout_request_id,
+        )
+
+
+@job(max_attempts=4)
+def mpesa_payment_status(checkout_request_id):
+    """
+    Ask Daraja for the outcome of a push whose callback has not arrived yet.
+    A payment Daraja is still processing is retried with the queue's backoff;
+    the reconcile_payments sweep picks up any still pending after that.
+    """
+    from .services import reconcile_payments
+
+    if not MpesaTransaction.objects.filter(checkout_request_id=checkout_request_id, status='PENDING').exists():
+        return
+    completed, failed, unresolved = reconcile_payments([checkout_request_id], workers=1)
+    if unresolved:
+        raise MpesaError(f"Payment {checkout_request_id} has no outcome yet")
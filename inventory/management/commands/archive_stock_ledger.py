@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventory.models import StockSnapshot, StockTransaction
+from inventory.services import archive_stock_ledger
+
+
+class Command(BaseCommand):
+    help = (
+        "Move stock ledger rows older than the last --keep-months months into the archive table. "
+        "Balances, snapshots and as-of queries are unchanged; the dashboard history shows live rows only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--keep-months", type=int, default=12, help="Months of ledger to keep live.")
+        parser.add_argument("--batch", type=int, default=10000, help="Rows moved per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report how many rows would move.")
+
+    def handle(self, *args, **options):
+        cutoff = StockSnapshot.month_start(timezone.now())
+        for _ in range(options["keep_months"]):
+            cutoff = StockSnapshot.month_start(cutoff - timedelta(days=1))
+        before = (
+            StockSnapshot.objects.filter(as_of__lte=cutoff)
+            .order_by("-as_of").values_list("as_of", flat=True).first()
+        )
+        if before is None:
+            raise CommandError(f"No stock snapshot on or before {cutoff:%Y-%m-%d}; run snapshot_stock first.")
+        if options["dry_run"]:
+            count = StockTransaction.objects.filter(timestamp__lt=before).count()
+            self.stdout.write(f"Would archive {count} ledger rows before {timezone.localtime(before):%Y-%m-%d}.")
+            return
+        moved = archive_stock_ledger(before, batch_size=options["batch"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} ledger rows before {timezone.localtime(before):%Y-%m-%d}."))
@@ -0,0 +1,178 @@
+import json
+import random
+import subprocess
+import time
+from statistics import mean
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment
+from django.urls import reverse
+
+from inventory.metrics import QueryRecorder, percentile
+from inventory.models import Customer, Product, Sale, StockTransaction
+from inventory.pagination import approximate_count
+from inventory.seeding import seeded_with
+
+
+class Scenario:
+    """One benchmarked request. ``prepare`` runs untimed before each ``request``."""
+
+    def __init__(self, name, request, prepare=None):
+        self.name = name
+        self.request = request
+        self.prepare = prepare
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the hot storefront and dashboard endpoints through the Django test client and "
+        "print latency percentiles and query counts as JSON. Everything written (orders, POS "
+        "sales, queued jobs) is rolled back, so runs against the same data are comparable. "
+        "Seed the database first with `seed_data`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Timed requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=5, help="Untimed requests per scenario first.")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for the products and search terms used.")
+        parser.add_argument("--only", nargs="+", metavar="SCENARIO", help="Run only these scenarios.")
+        parser.add_argument("--output", help="Write the JSON here instead of stdout.")
+
+    def handle(self, *args, **options):
+        # Allows the test client's host and keeps order emails in memory
+        setup_test_environment()
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            scenarios = self.scenarios(rng)
+            if options["only"]:
+                unknown = set(options["only"]) - {s.name for s in scenarios}
+                if unknown:
+                    raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+                scenarios = [s for s in scenarios if s.name in options["only"]]
+            results = {s.name: self.run(s, options["requests"], options["warmup"]) for s in scenarios}
+            transaction.set_rollback(True)
+
+        seeded = seeded_with()
+        report = {
+            "commit": self.commit(),
+            "database": connection.vendor,
+            # The seed_data run behind the numbers, so a rerun can reproduce the data
+            "seeded_with": seeded and {"seed": seeded["seed"], "now": seeded["now"].isoformat()},
+            "approx_rows": {
+                model._meta.model_name: approximate_count(model.objects.all())
+                for model in (Product, Customer, Sale, StockTransaction)
+            },
+            "requests_per_scenario": options["requests"],
+            "scenarios": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                f.write(output + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+    def scenarios(self, rng):
+        products = list(
+            Product.objects.filter(active=True, stock_balance__quantity__gte=1000)
+            .order_by("pk").values_list("pk", "name")[:500]
+        )
+        if len(products) < 10:
+            raise CommandError("Need at least 10 active products with 1000+ in stock; run seed_data first.")
+        terms = sorted({word for _, name in products for word in name.split() if word.isalpha()})
+
+        staff, _ = User.objects.get_or_create(username="benchmark-staff", defaults={"is_staff": True})
+        shopper, _ = User.objects.get_or_create(username="benchmark-shopper")
+        Customer.objects.get_or_create(user=shopper, defaults={"name": "Benchmark Shopper"})
+        staff_client, shop_client, guest_client = Client(), Client(), Client()
+        staff_client.force_login(staff)
+        shop_client.force_login(shopper)
+
+        def pick():
+            return rng.choice(products)[0]
+
+        def cart_client(backend):
+            """A guest client whose cart middleware uses ``backend`` whatever CART_BACKEND says."""
+            client = Client()
+            with override_settings(CART_BACKEND=f"inventory.cart.{backend}"):
+                # The handler builds its middleware on the first request
+                client.get(reverse("inventory:cart"))
+            return client
+
+        def add_to_cart(name, client):
+            return Scenario(
+                name, lambda: client.get(reverse("inventory:add_to_cart", args=[pick()])),
+                prepare=lambda: client.get(reverse("inventory:clear_cart")),
+            )
+
+        def pos_sale():
+            data = {"items-TOTAL_FORMS": "3", "items-INITIAL_FORMS": "0"}
+            for i in range(3):
+                data.update({f"items-{i}-product": pick(), f"items-{i}-quantity": "1", f"items-{i}-unit_price": "0"})
+            return staff_client.post(reverse("inventory:sale_add"), data)
+
+        return [
+            Scenario("store_home", lambda: guest_client.get(reverse("inventory:store_home"))),
+            Scenario("store_search", lambda: guest_client.get(reverse("inventory:store_home"), {"q": rng.choice(terms)})),
+            Scenario("product_detail", lambda: guest_client.get(reverse("inventory:store_product_detail", args=[pick()]))),
+            add_to_cart("add_to_cart", guest_client),
+            # The same request against each cart storage, to compare them on one dataset
+            add_to_cart("add_to_cart_cookie", cart_client("SignedCookieCartBackend")),
+            add_to_cart("add_to_cart_cache", cart_client("CacheCartBackend")),
+            add_to_cart("add_to_cart_session", cart_client("SessionCartBackend")),
+            Scenario(
+                "checkout", lambda: shop_client.post(reverse("inventory:checkout"), {"payment_method": "cash"}),
+                prepare=lambda: shop_client.post(
+                    reverse("inventory:add_many_to_cart"),
+                    {"product": [pick(), pick()], "quantity": ["1", "2"]},
+                ),
+            ),
+            Scenario("pos_sale", pos_sale),
+            Scenario("my_orders", lambda: shop_client.get(reverse("inventory:my_orders"))),
+            Scenario("dashboard", lambda: staff_client.get(reverse("inventory:dashboard"))),
+            Scenario("order_list", lambda: staff_client.get(reverse("inventory:order_list"))),
+            Scenario("report", lambda: staff_client.get(reverse("inventory:admin_report"), {"period": "monthly"})),
+        ]
+
+    def run(self, scenario, requests, warmup):
+        self.stderr.write(f"{scenario.name}...")
+        timings, queries, statuses = [], [], {}
+        for i in range(warmup + requests):
+            if scenario.prepare:
+                scenario.prepare()
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                start = time.perf_counter()
+                response = scenario.request()
+                elapsed = (time.perf_counter() - start) * 1000
+            if i < warmup:
+                continue
+            timings.append(elapsed)
+            queries.append(recorder.count)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+        timings.sort()
+        queries.sort()
+        return {
+            "p50_ms": round(percentile(timings, 50), 2),
+            "p95_ms": round(percentile(timings, 95), 2),
+            "p99_ms": round(percentile(timings, 99), 2),
+            "max_ms": round(timings[-1], 2),
+            "mean_ms": round(mean(timings), 2),
+            "queries_p50": percentile(queries, 50),
+            "queries_max": queries[-1],
+            "statuses": statuses,
+        }
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory.services import expire_pending_orders
+
+
+class Command(BaseCommand):
+    help = "Cancel pending web orders older than PENDING_ORDER_TTL_HOURS and release their stock (run periodically)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ttl-hours", type=float, default=None,
+            help="Override PENDING_ORDER_TTL_HOURS for this run.",
+        )
+        parser.add_argument("--batch", type=int, default=500, help="Orders cancelled per transaction.")
+
+    def handle(self, *args, **options):
+        hours = options["ttl_hours"]
+        if hours is None:
+            hours = settings.PENDING_ORDER_TTL_HOURS
+        expired = expire_pending_orders(timedelta(hours=hours), batch_size=options["batch"])
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} pending orders."))
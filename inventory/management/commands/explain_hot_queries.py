@@ -0,0 +1,198 @@
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test import Client, RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Category, Customer, Product, StockBalance
+from inventory.seeding import Seeder, analyze, seeded_with
+from inventory.services import expired_orders, stale_payments
+from inventory.views import StoreHomeView
+
+# Tables that grow with sales or the catalogue; a sequential scan on any other
+# (categories, units, suppliers, sessions) is cheap.
+HOT_TABLES = (
+    "inventory_sale", "inventory_saleitem", "inventory_stocktransaction", "inventory_archivedstocktransaction",
+    "inventory_mpesatransaction", "inventory_mpesacallback", "inventory_product", "inventory_stockbalance",
+    "inventory_job",
+)
+SEQ_SCAN = re.compile(r"Seq Scan on (\w+)")
+# Below this many 8kB pages a scan is as cheap as an index, and the planner
+# rightly picks it, so such tables say nothing about the indexes.
+MIN_PAGES = 100
+
+# Scans bounded by the catalogue rather than by sales. The storefront menu and
+# pager count the whole active catalogue (and are served from the catalogue
+# cache); low_stock() compares every balance with its product's reorder level.
+CATALOGUE = ("inventory_product", "inventory_stockbalance")
+
+
+class HotPath:
+    """
+    One view or sweep. ``run`` exercises its real code; every SELECT it issues
+    is EXPLAINed, and sequential scans are allowed only on ``allow`` tables.
+    """
+
+    def __init__(self, label, run, allow=()):
+        self.label = label
+        self.run = run
+        self.allow = allow
+
+
+def hot_paths():
+    """The pages and sweeps that run on every request or pass, driven through their own views and querysets."""
+    staff, _ = User.objects.get_or_create(username="explain-staff", defaults={"is_staff": True})
+    customer = Customer.objects.filter(user__isnull=False).select_related("user").order_by("pk").first()
+    if customer is None:
+        shopper = User.objects.create(username="explain-shopper")
+        customer = Customer.objects.create(user=shopper, name="Explain Shopper")
+    product = Product.objects.filter(active=True).order_by("pk").first()
+    category_id = Category.objects.values_list("pk", flat=True).order_by("pk").first()
+    term = next((word for word in (product.name if product else "").split() if word.isalpha()), "feed")
+    misspelt = term[:-2] + term[-1] + term[-2]
+
+    staff_client, shop_client, guest_client = Client(), Client(), Client()
+    staff_client.force_login(staff)
+    shop_client.force_login(customer.user)
+
+    def get(client, name, args=(), **params):
+        return lambda: client.get(reverse(name, args=args), params)
+
+    def search_results(query):
+        """The storefront's first page of results, from the view's own queryset."""
+        def run():
+            view = StoreHomeView()
+            view.setup(RequestFactory().get(reverse("inventory:store_home"), {"q": query}))
+            return list(view.get_queryset()[:view.paginate_by])
+        return run
+
+    def deep_page(name):
+        """The page after the first, through the cursor the first page links to."""
+        def run():
+            page = staff_client.get(reverse(name)).context["page_obj"]
+            return staff_client.get(reverse(name), {"after": page.next_cursor})
+        return run
+
+    # Terminals poll every few minutes, so most pulls find little or nothing new
+    since = max(
+        filter(None, [Product.objects.aggregate(at=Max("updated_at"))["at"],
+                      StockBalance.objects.aggregate(at=Max("updated_at"))["at"]]),
+        default=timezone.now(),
+    ).isoformat()
+    ttl = timedelta(hours=settings.PENDING_ORDER_TTL_HOURS)
+    paths = [
+        HotPath("store home", get(guest_client, "inventory:store_home"), allow=CATALOGUE),
+        HotPath("store category", get(guest_client, "inventory:store_home", category=category_id or 0), allow=CATALOGUE),
+        HotPath("store search", get(guest_client, "inventory:store_home", q=term), allow=CATALOGUE),
+        # Matches are ranked before the page is cut, so their balances are
+        # hashed; the products themselves must come from the search index
+        HotPath("store search results", search_results(term), allow=("inventory_stockbalance",)),
+        HotPath("store search results, misspelt", search_results(misspelt), allow=("inventory_stockbalance",)),
+        HotPath("customer order history", get(shop_client, "inventory:my_orders")),
+        HotPath("dashboard", get(staff_client, "inventory:dashboard"), allow=CATALOGUE),
+        # The category rollup sums every line of the month's sales, a slice of
+        # the table large enough that scanning it beats probing the index
+        HotPath(
+            "report", get(staff_client, "inventory:admin_report", period="monthly"),
+            allow=CATALOGUE + ("inventory_saleitem",),
+        ),
+        HotPath("web order list", get(staff_client, "inventory:order_list")),
+        HotPath("web order list, next page", deep_page("inventory:order_list")),
+        HotPath("stock history page", get(staff_client, "inventory:stock_history")),
+        HotPath("stock history, next page", deep_page("inventory:stock_history")),
+        HotPath("product list, next page", deep_page("inventory:product_list")),
+        HotPath("api product page", lambda: staff_client.get("/api/products/")),
+        HotPath("sync pull, up to date", get(staff_client, "inventory:sync_pull", since=since)),
+        HotPath("pending order expiry", lambda: list(expired_orders(ttl).values_list("pk", flat=True)[:500])),
+        HotPath("stale payment sweep", lambda: list(
+            stale_payments(timedelta(minutes=10)).values_list("date_created", "pk", "checkout_request_id")[:100]
+        )),
+    ]
+    if product:
+        paths.insert(5, HotPath("product detail", get(guest_client, "inventory:store_product_detail", args=[product.pk])))
+    return paths
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN every query the hot pages and sweeps run and fail if one falls back to a sequential "
+        "scan of a large table. Use --seed on an empty or small database so the planner sees realistic "
+        "table sizes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seed", type=int, default=0,
+            help="Insert this many synthetic sales (with items, ledger rows and payments) in a transaction that is rolled back afterwards.",
+        )
+        parser.add_argument("--verbose-plans", action="store_true", help="Print every plan, not only failures.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("explain_hot_queries needs PostgreSQL.")
+        # Allows the test client's host and exposes response.context
+        setup_test_environment()
+        with transaction.atomic():
+            if options["seed"]:
+                self.seed(options["seed"])
+            # No cache, so every page runs the queries a cold cache would
+            with override_settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+                failures = self.explain_all(options["verbose_plans"])
+            transaction.set_rollback(True)
+        if failures:
+            raise CommandError(f"Sequential scan in: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("No hot query uses a sequential scan."))
+
+    def large_tables(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT relname, relpages FROM pg_class WHERE relkind = 'r' AND relname = ANY(%s)", [list(HOT_TABLES)]
+            )
+            pages = dict(cursor.fetchall())
+        small = sorted(table for table in HOT_TABLES if pages.get(table, 0) < MIN_PAGES)
+        if small:
+            self.stdout.write(f"Too small to judge (under {MIN_PAGES} pages): {', '.join(small)}")
+        return set(HOT_TABLES) - set(small)
+
+    def explain_all(self, verbose):
+        failures = []
+        large = self.large_tables()
+        for path in hot_paths():
+            with CaptureQueriesContext(connection) as captured:
+                path.run()
+            selects = dict.fromkeys(q["sql"] for q in captured.captured_queries if q["sql"].startswith("SELECT"))
+            bad = []
+            with connection.cursor() as cursor:
+                for sql in selects:
+                    cursor.execute(f"EXPLAIN {sql}")
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                    scanned = set(SEQ_SCAN.findall(plan)) & large
+                    if scanned - set(path.allow):
+                        bad.append((sql, plan))
+                    elif verbose:
+                        self.stdout.write(f"{sql}\n{plan}\n")
+            if bad:
+                failures.append(path.label)
+            self.stdout.write(f"{'SEQ SCAN' if bad else 'ok':8s} {path.label} ({len(selects)} queries)")
+            for sql, plan in bad:
+                self.stdout.write(f"{sql}\n{plan}\n")
+        return failures
+
+    def seed(self, count):
+        self.stdout.write(f"Seeding {count} sales...")
+        # Date the extra sales like the seeded history they join
+        seeder = Seeder(seed=0, now=(seeded_with() or {}).get("now"))
+        if Customer.objects.count() < 100:
+            seeder.customers(100, users=50)
+        try:
+            seeder.sales(count)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        analyze()
@@ -0,0 +1,40 @@
+import csv
+import sys
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from inventory.exports import EXPORTS, export_rows
+
+
+class Command(BaseCommand):
+    help = "Export sales, purchases or the stock ledger for a date range as CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dataset", choices=sorted(EXPORTS))
+        parser.add_argument("--start", help="First day (YYYY-MM-DD); defaults to the beginning of records.")
+        parser.add_argument("--end", help="Last day, inclusive (YYYY-MM-DD); defaults to today.")
+        parser.add_argument("--output", "-o", help="File to write; defaults to stdout.")
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_date(options["start"]) if options["start"] else date(2000, 1, 1)
+            end = parse_date(options["end"]) if options["end"] else timezone.localdate()
+        except ValueError as exc:
+            raise CommandError(exc)
+        if start is None or end is None:
+            raise CommandError("Dates must be YYYY-MM-DD.")
+
+        out = open(options["output"], "w", newline="") if options["output"] else sys.stdout
+        try:
+            writer = csv.writer(out)
+            count = -1
+            for count, row in enumerate(export_rows(options["dataset"], start, end)):
+                writer.writerow(row)
+        finally:
+            if options["output"]:
+                out.close()
+        if options["output"]:
+            self.stderr.write(self.style.SUCCESS(f"Wrote {count} rows to {options['output']}."))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.imports import import_products
+
+
+class Command(BaseCommand):
+    help = "Create or update products from a CSV file keyed on sku (columns: sku, name, description, category, unit, buying_price, selling_price, reorder_level, active)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and report without saving.")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            source = open(options["path"], newline="", encoding="utf-8-sig")
+        except OSError as exc:
+            raise CommandError(exc)
+        with source:
+            result = import_products(source, chunk_size=options["chunk_size"], dry_run=options["dry_run"])
+        for message in result.warnings:
+            self.stderr.write(self.style.WARNING(message))
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        summary = f"{result.created} created, {result.updated} updated, {len(result.errors)} errors"
+        if options["dry_run"]:
+            summary += " (dry run, nothing saved)"
+        self.stdout.write(self.style.SUCCESS(summary) if result.ok else self.style.WARNING(summary))
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.services import process_mpesa_callbacks
+
+
+class Command(BaseCommand):
+    help = "Apply received M-Pesa callbacks to payments and orders in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="Callbacks applied per transaction.")
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the inbox is empty.")
+        parser.add_argument("--once", action="store_true", help="Drain the inbox, then exit.")
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            count = process_mpesa_callbacks(limit=options["batch"])
+            processed += count
+            if count < options["batch"]:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} callbacks."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+from inventory.models import Sale, DailySalesSummary
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailySalesSummary rollup from the Sale table (run while no sales are being written)."
+
+    def handle(self, *args, **options):
+        rows = (
+            Sale.objects.annotate(day=TruncDate("date"))
+            .values("day", "channel", "status")
+            .annotate(sale_count=Count("pk"), revenue=Sum("total"))
+            .order_by()
+        )
+        with transaction.atomic():
+            DailySalesSummary.objects.all().delete()
+            DailySalesSummary.objects.bulk_create(
+                [
+                    DailySalesSummary(
+                        date=row["day"], channel=row["channel"], status=row["status"],
+                        sale_count=row["sale_count"], revenue=row["revenue"] or 0,
+                    )
+                    for row in rows.iterator()
+                ],
+                batch_size=1000,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {DailySalesSummary.objects.count()} daily sales summary rows."
+        ))
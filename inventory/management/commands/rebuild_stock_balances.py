@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.cache import invalidate_catalogue
+from inventory.models import Product, StockBalance, StockTransaction
+
+
+class Command(BaseCommand):
+    help = "Rebuild StockBalance rows from the stock ledger (live and archived), or check them with --check."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check", action="store_true",
+            help="Only report products whose balance differs from the ledger; exit non-zero on drift.",
+        )
+
+    def ledger_totals(self):
+        # Archived rows still count: archiving moves ledger history, not stock
+        totals = StockTransaction.objects.totals()
+        return {pk: totals.get(pk, 0) for pk in Product.objects.values_list("pk", flat=True)}
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if not options["check"]:
+                # Block concurrent ledger writers while the totals are recomputed.
+                list(StockBalance.objects.select_for_update().values_list("pk", flat=True))
+            ledger = self.ledger_totals()
+            balances = dict(StockBalance.objects.values_list("product_id", "quantity"))
+            drift = {
+                pk: (balances.get(pk, 0), qty)
+                for pk, qty in ledger.items()
+                if balances.get(pk, 0) != qty
+            }
+
+            if options["check"]:
+                for pk, (stored, expected) in sorted(drift.items()):
+                    self.stdout.write(f"Product {pk}: balance {stored}, ledger {expected}")
+                if drift:
+                    raise CommandError(f"{len(drift)} stock balance(s) out of sync with the ledger.")
+                self.stdout.write(self.style.SUCCESS(f"All {len(ledger)} stock balances match the ledger."))
+                return
+
+            now = timezone.now()
+            StockBalance.objects.bulk_create(
+                [StockBalance(product_id=pk, quantity=qty, updated_at=now) for pk, qty in ledger.items()],
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=["quantity", "updated_at"],
+                batch_size=1000,
+            )
+            invalidate_catalogue()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(ledger)} stock balances ({len(drift)} corrected)."
+        ))
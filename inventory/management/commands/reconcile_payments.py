@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from inventory.services import reconcile_payments, stale_payments
+
+
+class Command(BaseCommand):
+    help = "Resolve M-Pesa payments left PENDING because their callback never arrived (run periodically)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than", type=int, default=10, help="Minutes a payment must have been pending.")
+        parser.add_argument("--batch", type=int, default=100, help="Payments queried per batch.")
+        parser.add_argument("--workers", type=int, default=8, help="Concurrent STK status queries.")
+
+    def handle(self, *args, **options):
+        stale = stale_payments(timedelta(minutes=options["older_than"]))
+        totals = [0, 0, 0]
+        last = None
+        while True:
+            page = stale
+            if last:
+                page = page.filter(Q(date_created__gt=last[0]) | Q(date_created=last[0], pk__gt=last[1]))
+            batch = list(page.values_list("date_created", "pk", "checkout_request_id")[:options["batch"]])
+            if not batch:
+                break
+            counts = reconcile_payments([row[2] for row in batch], workers=options["workers"])
+            totals = [total + count for total, count in zip(totals, counts)]
+            last = batch[-1][:2]
+        self.stdout.write(self.style.SUCCESS(
+            "Completed {}, failed {}, still pending {}.".format(*totals)
+        ))
@@ -0,0 +1,31 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from inventory.jobs import claim_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs. Start several workers to scale out; rows are claimed with SKIP LOCKED."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=10, help="Jobs claimed per round trip.")
+        parser.add_argument("--sleep", type=float, default=1.0, help="Seconds to wait when the queue is empty.")
+        parser.add_argument("--lease", type=int, default=300, help="Seconds before a job claimed by a dead worker is retried.")
+        parser.add_argument("--once", action="store_true", help="Drain the jobs that are due now, then exit.")
+
+    def handle(self, *args, **options):
+        lease = timedelta(seconds=options["lease"])
+        processed = 0
+        while True:
+            jobs = claim_jobs(limit=options["batch"], lease=lease)
+            for claimed in jobs:
+                status = run_job(claimed)
+                processed += 1
+                self.stdout.write(f"{claimed.name} #{claimed.pk}: {status}")
+            if not jobs:
+                if options["once"]:
+                    break
+                time.sleep(options["sleep"])
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs."))
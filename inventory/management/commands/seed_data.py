@@ -0,0 +1,66 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from inventory.seeding import Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill an empty database with a large, reproducible synthetic dataset for load tests "
+        "and benchmarks. The defaults match production scale; use --scale to shrink it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed gives the same data.")
+        parser.add_argument("--products", type=int, default=50000)
+        parser.add_argument("--customers", type=int, default=20000)
+        parser.add_argument("--sales", type=int, default=1000000)
+        parser.add_argument(
+            "--ledger", type=int, default=5000000,
+            help="Target StockTransaction rows; whatever the sales do not write is filled with restocks.",
+        )
+        parser.add_argument("--scale", type=float, default=1.0, help="Multiply every count, e.g. 0.01 for a dev-sized set.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--now", help="Date or datetime the history runs up to (default: the start of today); "
+                          "pass the same value to reproduce a dataset on a later day.",
+        )
+
+    def handle(self, *args, **options):
+        scale = options["scale"]
+        products, customers, sales, ledger = (
+            max(1, int(options[name] * scale)) for name in ("products", "customers", "sales", "ledger")
+        )
+        now = self.parse_now(options["now"]) if options["now"] else None
+        started = time.monotonic()
+        seeder = Seeder(
+            seed=options["seed"], batch_size=options["batch_size"], now=now,
+            log=lambda message: self.stdout.write(f"[{time.monotonic() - started:7.1f}s] {message}"),
+        )
+        self.stdout.write(f"Seed {options['seed']}, history up to {seeder.now.isoformat()}.")
+        try:
+            with transaction.atomic():
+                seeder.products(products)
+                seeder.customers(customers)
+                sale_rows = seeder.sales(sales)
+                # Restock at least a tenth as often as items are sold so balances stay positive
+                seeder.purchases(max(ledger - sale_rows, sale_rows // 10))
+                seeder.finish(stdout=self.stdout)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.monotonic() - started:.0f}s."))
+
+    def parse_now(self, value):
+        try:
+            day = parse_date(value)
+            now = datetime.combine(day, datetime.min.time()) if day else parse_datetime(value)
+        except ValueError:
+            now = None
+        if now is None:
+            raise CommandError("--now must be YYYY-MM-DD or an ISO 8601 datetime.")
+        return timezone.make_aware(now) if timezone.is_naive(now) else now
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.models import StockSnapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Take the monthly StockSnapshot rows that are due (every month start since the first "
+        "ledger row, once the month is settled). Safe to run daily."
+    )
+
+    def handle(self, *args, **options):
+        boundaries = StockSnapshot.due()
+        for as_of in boundaries:
+            count = StockSnapshot.take(as_of)
+            self.stdout.write(f"{timezone.localtime(as_of):%Y-%m-%d}: {count} products")
+        self.stdout.write(self.style.SUCCESS(f"Took {len(boundaries)} monthly snapshot(s)."))
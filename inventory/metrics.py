@@ -0,0 +1,140 @@
+import json
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r"IN \((?:%s|\?)(?:, (?:%s|\?))*\)")
+
+
+def fingerprint(sql):
+    """SQL with literals and IN-lists collapsed, so the queries of an N+1 loop share one fingerprint."""
+    return _IN_LISTS.sub("IN (...)", _LITERALS.sub("?", sql))
+
+
+class QueryRecorder:
+    """``connection.execute_wrapper`` callable counting queries, DB time and repeated fingerprints."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        """(sql, count) for fingerprints run more than once in the request, most repeated first."""
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n > 1]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(pct / 100 * len(values)) - 1))]
+
+
+class MetricsBuffer:
+    """The last ``size`` request samples of this worker process, oldest dropped first."""
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+
+    def add(self, sample):
+        with self.lock:
+            self.samples.append(sample)
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.samples)
+
+    def clear(self):
+        with self.lock:
+            self.samples.clear()
+
+    def summary(self):
+        """Per-view rows with p50/p95 wall and DB time (ms), query counts and the worst repeated query."""
+        by_view = {}
+        for sample in self.snapshot():
+            by_view.setdefault(sample["view"], []).append(sample)
+        rows = []
+        for view, samples in by_view.items():
+            wall = sorted(s["wall_ms"] for s in samples)
+            db = sorted(s["db_ms"] for s in samples)
+            queries = sorted(s["queries"] for s in samples)
+            worst = max(samples, key=lambda s: s["top_duplicate_count"])
+            rows.append({
+                "view": view,
+                "requests": len(samples),
+                "wall_p50": percentile(wall, 50),
+                "wall_p95": percentile(wall, 95),
+                "db_p50": percentile(db, 50),
+                "db_p95": percentile(db, 95),
+                "queries_p50": percentile(queries, 50),
+                "queries_max": queries[-1],
+                "top_duplicate": worst["top_duplicate"],
+                "top_duplicate_count": worst["top_duplicate_count"],
+            })
+        return sorted(rows, key=lambda row: row["wall_p95"], reverse=True)
+
+
+buffer = MetricsBuffer(settings.REQUEST_METRICS_BUFFER)
+
+
+class RequestMetricsMiddleware:
+    """
+    Opt-in (``REQUEST_METRICS``) per-request instrumentation: query count, DB
+    time, repeated query fingerprints and wall time, reported as a
+    ``Server-Timing`` header and one JSON log line on ``inventory.metrics``,
+    and kept in ``buffer`` for the staff metrics page. Place it first so the
+    other middleware's queries are counted too. Streaming responses are
+    timed up to the point the body starts.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - start) * 1000
+        db_ms = recorder.duration * 1000
+        duplicates = recorder.duplicates()
+        match = request.resolver_match
+        sample = {
+            "view": match.view_name if match else "<unresolved>",
+            "method": request.method,
+            "status": response.status_code,
+            "wall_ms": round(wall_ms, 2),
+            "db_ms": round(db_ms, 2),
+            "queries": recorder.count,
+            "duplicate_queries": sum(n - 1 for _, n in duplicates),
+            "top_duplicate": duplicates[0][0] if duplicates else "",
+            "top_duplicate_count": duplicates[0][1] if duplicates else 0,
+        }
+        buffer.add(sample)
+        response["Server-Timing"] = (
+            f'db;dur={db_ms:.1f};desc="{recorder.count} queries", app;dur={wall_ms:.1f}'
+        )
+        logger.info("request %s", json.dumps({"path": request.path, **sample}))
+        return response
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:46
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Coalesce
+import django.utils.timezone
+
+
+def backfill_balances(apps, schema_editor):
+    Product = apps.get_model("inventory", "Product")
+    StockBalance = apps.get_model("inventory", "StockBalance")
+    totals = (
+        Product.objects.annotate(qty=Coalesce(
+            models.Sum("transactions__quantity"), models.Value(0), output_field=models.DecimalField()
+        ))
+        .values_list("pk", "qty")
+    )
+    StockBalance.objects.bulk_create(
+        [StockBalance(product_id=pk, quantity=qty) for pk, qty in totals.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_mpesatransaction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockBalance',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stock_balance', serialize=False, to='inventory.product')),
+                ('quantity', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_stockbalance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockbalance',
+            index=models.Index(fields=['quantity'], name='stockbalance_quantity_idx'),
+        ),
+    ]
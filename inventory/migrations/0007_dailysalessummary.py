@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-17 18:48
+
+from django.db import migrations, models
+from django.db.models.functions import TruncDate
+
+
+def backfill_summary(apps, schema_editor):
+    Sale = apps.get_model("inventory", "Sale")
+    DailySalesSummary = apps.get_model("inventory", "DailySalesSummary")
+    rows = (
+        Sale.objects.annotate(day=TruncDate("date"))
+        .values("day", "channel", "status")
+        .annotate(sale_count=models.Count("pk"), revenue=models.Sum("total"))
+        .order_by()
+    )
+    DailySalesSummary.objects.bulk_create(
+        [
+            DailySalesSummary(
+                date=row["day"], channel=row["channel"], status=row["status"],
+                sale_count=row["sale_count"], revenue=row["revenue"] or 0,
+            )
+            for row in rows.iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_stockbalance_quantity_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('channel', models.CharField(choices=[('POS', 'In-Store'), ('WEB', 'Online Store')], max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending (Online)'), ('COMPLETED', 'Completed'), ('CANCELLED', 'Cancelled')], max_length=20)),
+                ('sale_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalessummary',
+            constraint=models.UniqueConstraint(fields=('date', 'channel', 'status'), name='dailysalessummary_unique_day'),
+        ),
+        migrations.RunPython(backfill_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_mpesacallback'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mpesatransaction',
+            index=models.Index(fields=['status', 'date_created'], name='mpesatxn_status_created_idx'),
+        ),
+    ]
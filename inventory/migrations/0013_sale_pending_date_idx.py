@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_mpesatransaction_status_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(condition=models.Q(('status', 'PENDING')), fields=['date'], name='sale_pending_date_idx'),
+        ),
+    ]
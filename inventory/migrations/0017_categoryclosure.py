@@ -0,0 +1,45 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_closure(apps, schema_editor):
+    Category = apps.get_model("inventory", "Category")
+    CategoryClosure = apps.get_model("inventory", "CategoryClosure")
+    parents = dict(Category.objects.values_list("pk", "parent_id"))
+    links = []
+    for pk in parents:
+        ancestor, depth, seen = pk, 0, set()
+        while ancestor is not None and ancestor not in seen:
+            links.append(CategoryClosure(ancestor_id=ancestor, descendant_id=pk, depth=depth))
+            seen.add(ancestor)
+            ancestor, depth = parents.get(ancestor), depth + 1
+    CategoryClosure.objects.bulk_create(links, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveSmallIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='descendant_links', to='inventory.category')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ancestor_links', to='inventory.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['descendant', 'depth'], name='categoryclosure_descendant_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='categoryclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='categoryclosure_unique_pair'),
+        ),
+        migrations.RunPython(backfill_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_categoryclosure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('as_of', models.DateTimeField()),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='inventory.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedStockTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('transaction_type', models.CharField(choices=[('IN', 'In'), ('OUT', 'Out')], max_length=3)),
+                ('reference', models.CharField(blank=True, max_length=255)),
+                ('timestamp', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_transactions', to='inventory.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('as_of', 'product'), name='stocksnapshot_unique_month'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedstocktransaction',
+            index=models.Index(fields=['timestamp'], name='archivedtxn_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedstocktransaction',
+            index=models.Index(fields=['product', 'timestamp'], name='archivedtxn_product_ts_idx'),
+        ),
+    ]
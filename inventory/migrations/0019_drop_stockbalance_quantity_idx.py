@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 19:59
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_stock_snapshots'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockbalance',
+            name='stockbalance_quantity_idx',
+        ),
+    ]
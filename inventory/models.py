@@ -1,7 +1,19 @@
-from django.db import models
+import difflib
+import functools
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField, TrigramWordSimilarity
+)
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .cache import cached_catalogue, invalidate_stock
+
 class Unit(models.Model):
     name = models.CharField(max_length=50)
     abbreviation = models.CharField(max_length=10, blank=True)
@@ -12,6 +24,223 @@ class Category(models.Model):
     parent = models.ForeignKey("self", null=True, blank=True, related_name="children", on_delete=models.SET_NULL)
     def __str__(self): return self.name
 
+    def clean(self):
+        if self.pk and self.parent_id and CategoryClosure.objects.filter(
+            ancestor_id=self.pk, descendant_id=self.parent_id
+        ).exists():
+            raise ValidationError({"parent": "A category cannot be placed under itself or one of its subcategories."})
+
+    def ancestors(self):
+        """Breadcrumb path from the root down to this category (inclusive), in one query."""
+        return Category.objects.filter(descendant_links__descendant_id=self.pk).order_by("-descendant_links__depth")
+
+class CategoryClosure(models.Model):
+    """
+    Every (ancestor, descendant) pair of the category tree, including each
+    category paired with itself at depth 0, so subtree filters, breadcrumbs
+    and rollups are single joins instead of walks up ``parent``. Kept in step
+    by the Category signals; ``rebuild()`` recomputes it after bulk writes.
+    """
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="descendant_links")
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="ancestor_links")
+    depth = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="categoryclosure_unique_pair"),
+        ]
+        indexes = [models.Index(fields=["descendant", "depth"], name="categoryclosure_descendant_idx")]
+
+    @classmethod
+    @transaction.atomic
+    def attach(cls, category):
+        """Link a new category, or re-link a moved one's whole subtree, under its current parent."""
+        subtree = dict(cls.objects.filter(ancestor=category).values_list("descendant_id", "depth"))
+        if not subtree:
+            cls.objects.create(ancestor=category, descendant=category, depth=0)
+            subtree = {category.pk: 0}
+        if category.parent_id in subtree:
+            raise ValueError(f"Category {category.pk} cannot be its own ancestor.")
+        cls.objects.filter(descendant_id__in=subtree).exclude(ancestor_id__in=subtree).delete()
+        if category.parent_id:
+            cls.objects.bulk_create([
+                cls(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=up + down + 1)
+                for ancestor_id, up in cls.objects.filter(descendant_id=category.parent_id).values_list("ancestor_id", "depth")
+                for descendant_id, down in subtree.items()
+            ])
+
+    @classmethod
+    def detach(cls, category):
+        """Before a delete: the children become roots, so cut their subtrees off from the old ancestors."""
+        cls.objects.filter(
+            descendant__in=cls.objects.filter(ancestor=category).values("descendant_id"),
+            ancestor__in=cls.objects.filter(descendant=category, depth__gt=0).values("ancestor_id"),
+        ).delete()
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls):
+        """Recompute every pair from ``Category.parent`` with one recursive query."""
+        table, categories = cls._meta.db_table, Category._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table}")
+            cursor.execute(f"""
+                INSERT INTO {table} (ancestor_id, descendant_id, depth)
+                WITH RECURSIVE tree (ancestor_id, descendant_id, depth) AS (
+                    SELECT id, id, 0 FROM {categories}
+                    UNION ALL
+                    SELECT tree.ancestor_id, child.id, tree.depth + 1
+                    FROM tree JOIN {categories} child ON child.parent_id = tree.descendant_id
+                    WHERE tree.depth < 100
+                )
+                SELECT ancestor_id, descendant_id, depth FROM tree
+            """)
+
+    @classmethod
+    def rollup(cls, categories, sales=None):
+        """
+        Product count, stock on hand (units and value at selling price) and
+        revenue from ``sales`` (default: all completed sales) for each of
+        ``categories``, every figure covering the category's whole subtree.
+        Three queries however deep the tree is.
+        """
+        categories = list(categories)
+        links = cls.objects.filter(ancestor__in=categories)
+        stock = {
+            row["ancestor_id"]: row for row in links.values("ancestor_id").annotate(
+                products=models.Count("descendant__product"),
+                stock_units=models.Sum("descendant__product__stock_balance__quantity"),
+                stock_value=models.Sum(
+                    models.F("descendant__product__stock_balance__quantity")
+                    * models.F("descendant__product__selling_price")
+                ),
+            )
+        }
+        if sales is None:
+            sales = Sale.objects.filter(status='COMPLETED')
+        revenue = {
+            row["ancestor_id"]: row for row in SaleItem.objects.filter(
+                sale__in=sales, product__category__ancestor_links__ancestor__in=categories,
+            ).values(ancestor_id=models.F("product__category__ancestor_links__ancestor_id")).annotate(
+                units_sold=models.Sum("quantity"),
+                revenue=models.Sum(models.F("quantity") * models.F("unit_price")),
+            )
+        }
+        rows = []
+        for category in categories:
+            held, sold = stock.get(category.pk, {}), revenue.get(category.pk, {})
+            rows.append({
+                "category": category,
+                "products": held.get("products", 0),
+                "stock_units": held.get("stock_units") or 0,
+                "stock_value": held.get("stock_value") or 0,
+                "units_sold": sold.get("units_sold") or 0,
+                "revenue": sold.get("revenue") or 0,
+            })
+        return rows
+
+@functools.lru_cache(maxsize=None)
+def _has_pg_trgm():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        return cursor.fetchone() is not None
+
+_SEARCH_TERM = re.compile(r"[^\W_]+")
+
+def search_vocabulary():
+    """Distinct lower-cased words of every product's name, SKU and description, for spelling correction."""
+    def build():
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT word FROM ts_stat($$SELECT to_tsvector('simple', "
+                "name || ' ' || sku || ' ' || description) FROM inventory_product$$)"
+            )
+            return sorted(row[0] for row in cursor.fetchall())
+    return cached_catalogue("search_vocabulary", (), build)
+
+def _corrected(terms):
+    """Each term, or the closest vocabulary word if it starts no word in the catalogue."""
+    vocabulary = search_vocabulary()
+    corrected = []
+    for term in terms:
+        known = any(word.startswith(term) for word in vocabulary)
+        corrected.append(term if known else (difflib.get_close_matches(term, vocabulary, n=1, cutoff=0.75) or [term])[0])
+    return corrected
+
+def _prefix_query(terms):
+    """tsquery matching each term as a word prefix: "dai meal" -> 'dai':* & 'meal':*."""
+    return SearchQuery(" & ".join(f"{term}:*" for term in terms), config="english", search_type="raw")
+
+class ProductQuerySet(models.QuerySet):
+    def with_stock(self):
+        """Annotate ``on_hand`` from StockBalance via a single LEFT JOIN."""
+        return self.annotate(on_hand=Coalesce(
+            "stock_balance__quantity", models.Value(Decimal(0)),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        ))
+
+    def in_category(self, category_id):
+        """Products anywhere in the category's subtree, as one join through CategoryClosure."""
+        return self.filter(category__ancestor_links__ancestor_id=category_id)
+
+    def search(self, query):
+        """
+        Ranked product search. On PostgreSQL every word of the query matches
+        as a prefix of a word in the GIN-indexed ``search_vector`` ("dai"
+        finds "Dairy Meal"), or the query is the exact SKU. Misspellings are
+        caught by trigram word similarity on ``name`` where pg_trgm is
+        installed; elsewhere words that start no catalogue word are also
+        tried corrected against the cached vocabulary, ranked below exact
+        hits. Other backends fall back to ``icontains``.
+        """
+        if connection.vendor != "postgresql":
+            return self.filter(
+                models.Q(name__icontains=query) | models.Q(description__icontains=query) | models.Q(sku__icontains=query)
+            ).order_by("name")
+        terms = [term.lower() for term in _SEARCH_TERM.findall(query)]
+        if not terms:
+            return self.none()
+        search_query = _prefix_query(terms)
+        match = models.Q(search_vector=search_query) | models.Q(sku=query.strip())
+        qs = self.annotate(rank=SearchRank(models.F("search_vector"), search_query))
+        if _has_pg_trgm():
+            return (
+                qs.annotate(similarity=TrigramWordSimilarity(query, "name"))
+                .filter(match | models.Q(name__trigram_word_similar=query))
+                .order_by("-rank", "-similarity", "name")
+            )
+        corrected = _corrected(terms)
+        if corrected == terms:
+            return qs.filter(match).order_by("-rank", "name")
+        corrected_query = _prefix_query(corrected)
+        return (
+            qs.annotate(corrected_rank=SearchRank(models.F("search_vector"), corrected_query))
+            .filter(match | models.Q(search_vector=corrected_query))
+            .order_by("-rank", "-corrected_rank", "name")
+        )
+
+    def update_search_vector(self):
+        """Recompute ``search_vector`` for the selected rows (PostgreSQL only)."""
+        if connection.vendor != "postgresql":
+            return 0
+        return self.update(search_vector=(
+            SearchVector("name", weight="A", config="english")
+            + SearchVector("sku", weight="A", config="english")
+            + SearchVector("description", weight="B", config="english")
+        ))
+
+    def low_stock(self):
+        """Products at or below their reorder level, out-of-stock first, then by shortfall."""
+        return (
+            self.with_stock()
+            .filter(on_hand__lte=models.F("reorder_level"))
+            .annotate(shortfall=models.F("reorder_level") - models.F("on_hand"))
+            .order_by(
+                models.Case(models.When(on_hand__lte=0, then=models.Value(0)), default=models.Value(1)),
+                "-shortfall", "name", "pk",
+            )
+        )
+
 class Product(models.Model):
     sku = models.CharField(max_length=64, unique=True)
     name = models.CharField(max_length=255)
@@ -23,20 +252,44 @@ class Product(models.Model):
     selling_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     reorder_level = models.PositiveIntegerField(default=5)
     active = models.BooleanField(default=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ProductQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=["name", "id"], name="product_name_id_idx")]
 
     def __str__(self): return f"{self.name} ({self.sku})"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"name", "sku", "description"} & set(update_fields):
+            Product.objects.filter(pk=self.pk).update_search_vector()
+
     @property
     def stock_quantity(self):
-        from django.db.models import Sum
-        qs = StockTransaction.objects.filter(product=self).aggregate(qty=Sum("quantity"))
-        return qs.get("qty") or 0
+        if "on_hand" in self.__dict__:
+            return self.on_hand
+        try:
+            return self.stock_balance.quantity
+        except StockBalance.DoesNotExist:
+            return 0
+
+    def stock_as_of(self, when):
+        """Quantity on hand at a past moment, from the nearest StockSnapshot plus later ledger rows."""
+        return StockSnapshot.stock_at(when, [self.pk]).get(self.pk, 0)
 
 class Supplier(models.Model):
     name = models.CharField(max_length=255)
     phone = models.CharField(max_length=100, blank=True)
     email = models.EmailField(blank=True)
     address = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["name", "id"], name="supplier_name_id_idx")]
+
     def __str__(self): return self.name
 
 class Customer(models.Model):
@@ -47,8 +300,18 @@ class Customer(models.Model):
     phone = models.CharField(max_length=100, blank=True)
     email = models.EmailField(blank=True)
     address = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["name", "id"], name="customer_name_id_idx")]
+
     def __str__(self): return self.name
 
+class SavedCart(models.Model):
+    """Durable copy of a signed-in customer's cart for the cache cart backend."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='saved_cart')
+    items = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
 class Purchase(models.Model):
     supplier = models.ForeignKey(Supplier, on_delete=models.PROTECT)
     invoice_number = models.CharField(max_length=128, blank=True)
@@ -78,15 +341,129 @@ class Sale(models.Model):
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='COMPLETED')
     channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES, default='POS')
+    # Set by offline POS terminals so a re-pushed sale is recognised and not booked twice
+    client_uuid = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Pending orders are a tiny slice of all sales; the dashboard count
+            # and the expiry sweep scan only them
+            models.Index(
+                fields=["channel", "date"], name="sale_pending_channel_date_idx",
+                condition=models.Q(status='PENDING'),
+            ),
+            models.Index(fields=["status", "-date"], name="sale_status_date_idx"),
+            models.Index(fields=["channel", "-date"], name="sale_channel_date_idx"),
+            models.Index(fields=["customer", "-date"], name="sale_customer_date_idx"),
+        ]
 
     def __str__(self): return f"Sale {self.id} - {self.date.date()} ({self.status})"
 
+class DailySalesSummary(models.Model):
+    """Per-day sales totals by channel and status, maintained as sales are written."""
+    date = models.DateField()
+    channel = models.CharField(max_length=10, choices=Sale.CHANNEL_CHOICES)
+    status = models.CharField(max_length=20, choices=Sale.STATUS_CHOICES)
+    sale_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "channel", "status"], name="dailysalessummary_unique_day"),
+        ]
+
+    def __str__(self): return f"{self.date} {self.channel} {self.status}: {self.revenue}"
+
+    @classmethod
+    def _bump(cls, day, channel, status, count, revenue):
+        key = dict(date=day, channel=channel, status=status)
+        cls.objects.bulk_create([cls(**key)], ignore_conflicts=True)
+        cls.objects.filter(**key).update(
+            sale_count=models.F("sale_count") + count,
+            revenue=models.F("revenue") + revenue,
+        )
+
+    @classmethod
+    def add_sale(cls, sale):
+        """Count a newly created sale once its total is final."""
+        cls._bump(timezone.localdate(sale.date), sale.channel, sale.status, 1, Decimal(sale.total))
+
+    @classmethod
+    def move_sale(cls, sale, old_status):
+        """Move a sale's totals from old_status to its current status."""
+        cls.move_sales([sale], old_status, sale.status)
+
+    @classmethod
+    def move_sales(cls, sales, old_status, new_status):
+        """Move many sales between statuses with one pair of updates per (day, channel)."""
+        if old_status == new_status:
+            return
+        groups = {}
+        for sale in sales:
+            key = (timezone.localdate(sale.date), sale.channel)
+            count, total = groups.get(key, (0, Decimal(0)))
+            groups[key] = (count + 1, total + Decimal(sale.total))
+        for (day, channel), (count, total) in groups.items():
+            cls._bump(day, channel, old_status, -count, -total)
+            cls._bump(day, channel, new_status, count, total)
+
 class SaleItem(models.Model):
     sale = models.ForeignKey(Sale, related_name="items", on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
     quantity = models.DecimalField(max_digits=10, decimal_places=2, default=1)
     unit_price = models.DecimalField(max_digits=12, decimal_places=2, default=0)
 
+    @property
+    def line_total(self):
+        return self.quantity * self.unit_price
+
+class StockTransactionManager(models.Manager):
+    def totals(self, start=None, end=None, product_ids=None):
+        """
+        Net {product_id: quantity} of the ledger rows timestamped in [start, end),
+        live and archived alike. Either bound may be None for open-ended.
+
+        Both tables are read in one UNION ALL statement, so archive_stock_ledger
+        moving a batch between them mid-read can't count it twice or not at all.
+        """
+        filters = {}
+        if start is not None:
+            filters["timestamp__gte"] = start
+        if end is not None:
+            filters["timestamp__lt"] = end
+        if product_ids is not None:
+            filters["product_id__in"] = product_ids
+        live, archived = (
+            model._base_manager.filter(**filters).values("product_id").annotate(qty=models.Sum("quantity"))
+            .order_by().values_list("product_id", "qty")
+            for model in (self.model, ArchivedStockTransaction)
+        )
+        totals = {}
+        for pk, qty in live.union(archived, all=True):
+            totals[pk] = totals.get(pk, 0) + qty
+        return totals
+
+    def record(self, product, quantity, transaction_type, reference=""):
+        """Insert a ledger row and move the product's StockBalance with it."""
+        txn = self.create(
+            product=product, quantity=quantity,
+            transaction_type=transaction_type, reference=reference
+        )
+        StockBalance.apply({product.pk: quantity})
+        return txn
+
+    def record_many(self, movements, transaction_type, reference=""):
+        """Bulk version of record() for a list of (product, quantity) pairs."""
+        txns = self.bulk_create([
+            self.model(product=product, quantity=quantity, transaction_type=transaction_type, reference=reference)
+            for product, quantity in movements
+        ])
+        deltas = {}
+        for product, quantity in movements:
+            deltas[product.pk] = deltas.get(product.pk, 0) + quantity
+        StockBalance.apply(deltas)
+        return txns
+
 class StockTransaction(models.Model):
     IN = "IN"
     OUT = "OUT"
@@ -96,7 +473,154 @@ class StockTransaction(models.Model):
     transaction_type = models.CharField(max_length=3, choices=TRANSACTION_TYPES)
     reference = models.CharField(max_length=255, blank=True)
     timestamp = models.DateTimeField(default=timezone.now)
-    class Meta: ordering = ("-timestamp",)
+    objects = StockTransactionManager()
+
+    class Meta:
+        ordering = ("-timestamp",)
+        indexes = [
+            models.Index(fields=["-timestamp", "-id"], name="stocktxn_timestamp_id_idx"),
+            models.Index(fields=["product", "-timestamp"], name="stocktxn_product_timestamp_idx"),
+        ]
+
+class ArchivedStockTransaction(models.Model):
+    """
+    Ledger rows moved out of StockTransaction by ``archive_stock_ledger``, ids
+    preserved. Only rows older than a StockSnapshot are archived, so balances,
+    snapshots and as-of queries are unaffected.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="archived_transactions")
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_type = models.CharField(max_length=3, choices=StockTransaction.TRANSACTION_TYPES)
+    reference = models.CharField(max_length=255, blank=True)
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["timestamp"], name="archivedtxn_timestamp_idx"),
+            models.Index(fields=["product", "timestamp"], name="archivedtxn_product_ts_idx"),
+        ]
+
+# Months are snapshotted only once they ended this long ago, so ledger rows
+# from transactions still open across the boundary are never missed.
+SNAPSHOT_DELAY = timedelta(hours=1)
+
+class StockSnapshot(models.Model):
+    """
+    Per-product stock on hand at the start of a month: the sum of every
+    ledger row timestamped before ``as_of``. As-of queries start from the
+    latest snapshot instead of the beginning of the ledger.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="snapshots")
+    as_of = models.DateTimeField()
+    quantity = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["as_of", "product"], name="stocksnapshot_unique_month"),
+        ]
+
+    def __str__(self): return f"{self.product_id} @ {self.as_of}: {self.quantity}"
+
+    @staticmethod
+    def month_start(when):
+        """Local midnight on the first of ``when``'s month."""
+        local = timezone.localtime(when)
+        return timezone.make_aware(datetime(local.year, local.month, 1))
+
+    @classmethod
+    def due(cls, now=None):
+        """Month boundaries from the first ledger month up to the latest settled one, oldest first."""
+        now = now or timezone.now()
+        first = min(
+            (ts for ts in (
+                StockTransaction.objects.order_by("timestamp").values_list("timestamp", flat=True).first(),
+                ArchivedStockTransaction.objects.order_by("timestamp").values_list("timestamp", flat=True).first(),
+            ) if ts),
+            default=None,
+        )
+        if first is None:
+            return []
+        boundary = cls.month_start(first)
+        last = cls.month_start(now - SNAPSHOT_DELAY)
+        taken = set(cls.objects.values_list("as_of", flat=True).distinct())
+        boundaries = []
+        while boundary <= last:
+            boundary = cls.month_start(boundary + timedelta(days=32))
+            if boundary <= last and boundary not in taken:
+                boundaries.append(boundary)
+        return boundaries
+
+    @classmethod
+    @transaction.atomic
+    def take(cls, as_of):
+        """Snapshot every product with ledger history at ``as_of`` from the previous snapshot plus one month of deltas."""
+        previous = cls.objects.filter(as_of__lt=as_of).aggregate(latest=models.Max("as_of"))["latest"]
+        quantities = dict(cls.objects.filter(as_of=previous).values_list("product_id", "quantity")) if previous else {}
+        for pk, qty in StockTransaction.objects.totals(previous, as_of).items():
+            quantities[pk] = quantities.get(pk, 0) + qty
+        cls.objects.bulk_create(
+            [cls(product_id=pk, as_of=as_of, quantity=qty) for pk, qty in quantities.items()],
+            batch_size=5000,
+        )
+        return len(quantities)
+
+    @classmethod
+    def stock_at(cls, when, product_ids=None):
+        """
+        {product_id: quantity on hand at ``when``}: the latest snapshot at or
+        before it plus the ledger rows in between. Products without history
+        are omitted.
+        """
+        snapshots = cls.objects.filter(as_of__lte=when)
+        latest = snapshots.aggregate(latest=models.Max("as_of"))["latest"]
+        quantities = {}
+        if latest:
+            rows = cls.objects.filter(as_of=latest)
+            if product_ids is not None:
+                rows = rows.filter(product_id__in=product_ids)
+            quantities = dict(rows.values_list("product_id", "quantity"))
+        for pk, qty in StockTransaction.objects.totals(latest, when, product_ids).items():
+            quantities[pk] = quantities.get(pk, 0) + qty
+        return quantities
+
+class ProductTombstone(models.Model):
+    """A deleted product, kept so offline terminals pulling deltas drop it too."""
+    product_id = models.IntegerField()
+    sku = models.CharField(max_length=64)
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self): return f"{self.sku} deleted {self.deleted_at}"
+
+class StockBalance(models.Model):
+    """Running per-product total of the StockTransaction ledger."""
+    product = models.OneToOneField(Product, primary_key=True, on_delete=models.CASCADE, related_name="stock_balance")
+    quantity = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self): return f"{self.product_id}: {self.quantity}"
+
+    @classmethod
+    def apply(cls, deltas):
+        """
+        Add {product_id: quantity} deltas to the balances in a single UPDATE.
+        Must run inside the same transaction as the ledger insert.
+        """
+        deltas = {pk: qty for pk, qty in deltas.items() if qty}
+        if not deltas:
+            return
+        cls.objects.bulk_create(
+            [cls(product_id=pk) for pk in deltas], ignore_conflicts=True
+        )
+        delta = models.Case(
+            *[models.When(product_id=pk, then=models.Value(Decimal(qty))) for pk, qty in deltas.items()],
+            output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        )
+        cls.objects.filter(product_id__in=deltas).update(
+            quantity=models.F("quantity") + delta, updated_at=timezone.now()
+        )
+        invalidate_stock(deltas)
 
 class MpesaTransaction(models.Model):
     sale = models.ForeignKey(Sale, on_delete=models.CASCADE, related_name='payments')
@@ -107,5 +631,55 @@ class MpesaTransaction(models.Model):
     status = models.CharField(max_length=20, default='PENDING') # PENDING, COMPLETED, FAILED
     date_created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=["status", "date_created"], name="mpesatxn_status_created_idx")]
+
+    def __str__(self):
+        return f"{self.checkout_request_id} - {self.status}"
+
+class MpesaCallback(models.Model):
+    """
+    Raw STK callbacks as received from Safaricom. The endpoint only inserts here;
+    ``process_mpesa_callbacks`` applies them to payments and sales in batches.
+    """
+    checkout_request_id = models.CharField(max_length=100, unique=True)
+    result_code = models.IntegerField()
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["received_at"], name="mpesacallback_pending_idx",
+                condition=models.Q(processed_at__isnull=True),
+            ),
+        ]
+
     def __str__(self):
-        return f"{self.checkout_request_id} - {self.status}"
\ No newline at end of file
+        return f"{self.checkout_request_id} ({self.result_code})"
+
+class Job(models.Model):
+    """A unit of background work picked up by ``manage.py run_jobs`` workers."""
+    QUEUED = "QUEUED"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    DEAD = "DEAD"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (DEAD, "Dead")]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "run_at"], name="job_status_run_at_idx")]
+
+    def __str__(self): return f"{self.name} #{self.pk} ({self.status})"
+
@@ -0,0 +1,143 @@
+import base64
+import json
+from datetime import datetime, time
+from functools import cached_property
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+class StableCursorPagination(CursorPagination):
+    """Keyset pagination on the primary key: every page is an indexed range scan, however deep."""
+    ordering = "pk"
+    page_size_query_param = "page_size"
+    max_page_size = 500
+
+
+def approximate_count(queryset, exact_below=10000):
+    """
+    Row count for pagination labels. On PostgreSQL an unfiltered table is
+    counted from the planner statistics instead of a full COUNT(*); small or
+    never-analysed tables, filtered querysets and other databases are
+    counted exactly.
+    """
+    if connection.vendor == "postgresql" and not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= exact_below:
+            return row[0]
+    return queryset.count()
+
+
+class KeysetPaginator:
+    def __init__(self, queryset):
+        self.queryset = queryset
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.queryset)
+
+
+class KeysetPage:
+    def __init__(self, object_list, keyset, has_next, has_previous):
+        self.object_list = object_list
+        self.keyset = keyset
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    def _cursor(self, obj):
+        values = [getattr(obj, field.lstrip("-")) for field in self.keyset]
+        # isoformat() keeps microseconds; DjangoJSONEncoder would round to
+        # milliseconds and seek from before the boundary row
+        values = [value.isoformat() if isinstance(value, (datetime, time)) else value for value in values]
+        return base64.urlsafe_b64encode(json.dumps(values, cls=DjangoJSONEncoder).encode()).decode()
+
+    # A stale cursor (its rows since deleted or archived) can land on an empty page
+    @property
+    def next_cursor(self):
+        return self._cursor(self.object_list[-1]) if self._has_next and self.object_list else ""
+
+    @property
+    def previous_cursor(self):
+        return self._cursor(self.object_list[0]) if self._has_previous and self.object_list else ""
+
+
+class KeysetPaginationMixin:
+    """
+    Seek pagination for ListViews. Pages are addressed by ``?after=`` /
+    ``?before=`` cursors holding the ``keyset`` values of the last / first
+    row shown, so each page is an index range scan instead of an OFFSET that
+    grows with depth. ``keyset`` must end in a unique field (usually pk) and
+    should match an index.
+    """
+    keyset = ("pk",)
+
+    def get_ordering(self):
+        return self.keyset
+
+    def _decode_cursor(self, cursor):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.keyset):
+                return None
+            opts = self.model._meta
+            return [
+                (opts.pk if field.lstrip("-") == "pk" else opts.get_field(field.lstrip("-"))).to_python(value)
+                for field, value in zip(self.keyset, values)
+            ]
+        except Exception:
+            return None
+
+    def _seek(self, values, forward):
+        """(k1, k2, ...) strictly after (forward) or before the given values in keyset order."""
+        condition, prefix = None, {}
+        for field, value in zip(self.keyset, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") == forward else "gt"
+            clause = Q(**prefix, **{f"{name}__{lookup}": value})
+            condition = clause if condition is None else condition | clause
+            prefix[name] = value
+        # Redundant bound on the leading key so the planner can start the index scan there
+        name = self.keyset[0].lstrip("-")
+        lookup = "lte" if self.keyset[0].startswith("-") == forward else "gte"
+        return Q(**{f"{name}__{lookup}": values[0]}) & condition
+
+    def paginate_queryset(self, queryset, page_size):
+        after = self._decode_cursor(self.request.GET.get("after", ""))
+        before = None if after else self._decode_cursor(self.request.GET.get("before", ""))
+        if before:
+            reverse = [field[1:] if field.startswith("-") else f"-{field}" for field in self.keyset]
+            rows = list(queryset.filter(self._seek(before, forward=False)).order_by(*reverse)[:page_size + 1])
+            has_previous, has_next = len(rows) > page_size, True
+            rows = rows[:page_size][::-1]
+        else:
+            if after:
+                queryset_page = queryset.filter(self._seek(after, forward=True))
+            else:
+                queryset_page = queryset
+            rows = list(queryset_page[:page_size + 1])
+            has_next, has_previous = len(rows) > page_size, bool(after)
+            rows = rows[:page_size]
+        page = KeysetPage(rows, self.keyset, has_next, has_previous)
+        return KeysetPaginator(queryset), page, rows, page.has_other_pages()
@@ -0,0 +1,301 @@
+"""
+Deterministic synthetic data for load tests, benchmarks and query-plan checks.
+
+Everything is drawn from one ``random.Random(seed)`` and dated back from a
+fixed ``now`` (the start of the day by default), and written with
+``bulk_create`` in batches, so two runs with the same seed, ``now`` and counts
+on an empty database produce the same rows. The seed and ``now`` are recorded
+in the seeded products' description (see ``seeded_with``). Derived tables
+(StockBalance, DailySalesSummary, search vectors) are rebuilt at the end
+rather than maintained row by row.
+"""
+import bisect
+import itertools
+import random
+import re
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+
+from .cache import invalidate_catalogue
+from .models import (
+    Category, CategoryClosure, Customer, MpesaTransaction, Product, Purchase, PurchaseItem,
+    Sale, SaleItem, StockTransaction, Supplier, Unit,
+)
+
+SKU_PREFIX = "SEED-"
+_DESCRIPTION = "Synthetic product for load testing, seed {seed} as of {now}."
+_DESCRIPTION_PATTERN = re.compile(r"seed (-?\d+) as of (\S+)\.$")
+
+DEPARTMENTS = {
+    "Animal Feeds": ["Dairy", "Poultry", "Pig", "Pet", "Calf", "Goat"],
+    "Seeds": ["Maize", "Vegetable", "Bean", "Fodder", "Sorghum", "Fruit"],
+    "Fertilizers": ["Planting", "Top Dressing", "Foliar", "Organic", "Lime"],
+    "Crop Protection": ["Insecticides", "Fungicides", "Herbicides", "Rodenticides"],
+    "Veterinary": ["Dewormers", "Antibiotics", "Vaccines", "Acaricides", "Supplements"],
+    "Equipment": ["Sprayers", "Irrigation", "Milking", "Hand Tools", "Feeders"],
+}
+BRANDS = ["Unga", "Pembe", "Kenchic", "Simlaw", "Kenseed", "Twiga", "Bayer", "Syngenta",
+          "Cooper", "Norbrook", "Amiran", "Osho", "Elgon", "Mea", "Yara", "Farmers Choice"]
+QUALITIES = ["Premium", "Standard", "Gold", "Super", "Plus", "Organic", "Hybrid", "Extra"]
+SIZES = ["50g", "100g", "250g", "500g", "1kg", "2kg", "5kg", "10kg", "25kg", "50kg", "70kg",
+         "100ml", "250ml", "500ml", "1L", "5L", "20L"]
+UNITS = [("Kilogram", "kg"), ("Litre", "L"), ("Piece", "pcs"), ("Bag", "bag"), ("Packet", "pkt")]
+FIRST_NAMES = ["Wanjiku", "Otieno", "Kamau", "Achieng", "Mwangi", "Njeri", "Kiprop", "Wambui",
+               "Mutua", "Akinyi", "Chebet", "Omondi", "Nyambura", "Kariuki", "Jeptoo", "Barasa"]
+LAST_NAMES = ["Farm", "Agro", "Dairy", "Poultry", "Holdings", "Growers", "Shamba", "Ranch"]
+
+
+class Seeder:
+    """Bulk generator for the catalogue, customers and two years of trading history."""
+
+    def __init__(self, seed=0, batch_size=5000, days=730, now=None, log=None):
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.days = days
+        self.now = now or start_of_day()
+        self.log = log or (lambda message: None)
+        self._products = None
+        self._customers = None
+
+    def _batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield min(self.batch_size, total - start)
+
+    def _moment(self):
+        return self.now - timedelta(seconds=self.rng.randrange(self.days * 86400))
+
+    # --- Catalogue ---
+
+    def categories(self, per_leaf=4):
+        """Three-level tree: department > section > ``per_leaf`` ranges. Returns the leaf ids."""
+        leaves = []
+        for department, sections in DEPARTMENTS.items():
+            top = Category.objects.create(name=department)
+            middle = Category.objects.bulk_create([Category(name=f"{name} {department}", parent=top) for name in sections])
+            leaves += Category.objects.bulk_create([
+                Category(name=f"{section.name} {quality}", parent=section)
+                for section in middle for quality in QUALITIES[:per_leaf]
+            ])
+        CategoryClosure.rebuild()
+        self.log(f"Created {Category.objects.count()} categories.")
+        return [leaf.pk for leaf in leaves]
+
+    def products(self, count):
+        if Product.objects.filter(sku__startswith=SKU_PREFIX).exists():
+            raise ValueError("This database has already been seeded.")
+        leaves = self.categories()
+        units = [Unit.objects.get_or_create(name=name, defaults={"abbreviation": abbr})[0].pk for name, abbr in UNITS]
+        serial = itertools.count(1)
+        for size in self._batches(count):
+            rows = []
+            for _ in range(size):
+                n = next(serial)
+                price = Decimal(self.rng.randrange(50, 15000))
+                rows.append(Product(
+                    sku=f"{SKU_PREFIX}{n:07d}",
+                    name=f"{self.rng.choice(BRANDS)} {self.rng.choice(QUALITIES)} "
+                         f"{self.rng.choice(list(DEPARTMENTS))} {self.rng.choice(SIZES)} #{n}",
+                    description=_DESCRIPTION.format(seed=self.seed, now=self.now.isoformat()),
+                    category_id=self.rng.choice(leaves),
+                    unit_id=self.rng.choice(units),
+                    buying_price=(price * Decimal("0.8")).quantize(Decimal("0.01")),
+                    selling_price=price,
+                    reorder_level=self.rng.randrange(5, 50),
+                    active=self.rng.random() > 0.02,
+                ))
+            created = Product.objects.bulk_create(rows)
+            Product.objects.filter(pk__in=[p.pk for p in created]).update_search_vector()
+        self._products = None
+        self.log(f"Created {count} products.")
+
+    def customers(self, count, users=200):
+        """``count`` customers; the first ``users`` get storefront logins (password ``seed``)."""
+        password = make_password("seed")
+        accounts = User.objects.bulk_create([
+            User(username=f"seed-customer-{i}", email=f"seed{i}@example.com", password=password)
+            for i in range(min(users, count))
+        ])
+        for start, size in zip(itertools.count(0, self.batch_size), self._batches(count)):
+            Customer.objects.bulk_create([
+                Customer(
+                    name=f"{self.rng.choice(FIRST_NAMES)} {self.rng.choice(LAST_NAMES)} {start + i}",
+                    phone=f"2547{self.rng.randrange(10 ** 8):08d}",
+                    user=accounts[start + i] if start + i < len(accounts) else None,
+                )
+                for i in range(size)
+            ])
+        self._customers = None
+        self.log(f"Created {count} customers.")
+
+    def suppliers(self, count):
+        Supplier.objects.bulk_create([
+            Supplier(name=f"{brand} Distributors {i}", phone=f"2547{self.rng.randrange(10 ** 8):08d}")
+            for i, brand in zip(range(count), itertools.cycle(BRANDS))
+        ])
+
+    # --- Trading history ---
+
+    @property
+    def product_pool(self):
+        """(ids, cumulative weights, prices): a long tail where a few products sell most."""
+        if self._products is None:
+            rows = list(Product.objects.filter(active=True).order_by("pk").values_list("pk", "selling_price"))
+            if not rows:
+                raise ValueError("Seeding sales needs at least one active product.")
+            weights = list(itertools.accumulate(1 / (rank + 10) for rank in range(len(rows))))
+            order = list(range(len(rows)))
+            random.Random(len(rows)).shuffle(order)
+            self._products = ([rows[i][0] for i in order], weights, [rows[i][1] for i in order])
+        return self._products
+
+    def _pick_product(self):
+        ids, weights, prices = self.product_pool
+        i = bisect.bisect_left(weights, self.rng.random() * weights[-1])
+        return ids[i], prices[i]
+
+    @property
+    def customer_pool(self):
+        if self._customers is None:
+            self._customers = (
+                list(Customer.objects.filter(user__isnull=False).values_list("pk", flat=True)),
+                list(Customer.objects.filter(user__isnull=True).values_list("pk", flat=True)),
+            )
+        return self._customers
+
+    def sales(self, count, items=(1, 4)):
+        """
+        ``count`` sales with 1-4 items each, an OUT ledger row per item and
+        M-Pesa payments for web orders. Returns the number of ledger rows written.
+        """
+        online, walk_in = self.customer_pool
+        ledger_rows = 0
+        for size in self._batches(count):
+            sales, lines = [], []
+            for _ in range(size):
+                channel = self.rng.choices(["POS", "WEB"], weights=[4, 1])[0]
+                status, date = "COMPLETED", self._moment()
+                if channel == "WEB":
+                    customer = self.rng.choice(online) if online else None
+                    status = self.rng.choices(["COMPLETED", "PENDING", "CANCELLED"], weights=[88, 4, 8])[0]
+                    if status == "PENDING":
+                        # Older unpaid orders would already have been expired
+                        date = self.now - timedelta(seconds=self.rng.randrange(2 * 86400))
+                else:
+                    customer = self.rng.choice(walk_in) if walk_in and self.rng.random() < 0.3 else None
+                picked = [(*self._pick_product(), self.rng.randrange(1, 6)) for _ in range(self.rng.randint(*items))]
+                sales.append(Sale(
+                    customer_id=customer, date=date, channel=channel, status=status,
+                    total=sum(price * qty for _, price, qty in picked),
+                ))
+                lines.append(picked)
+            sales = Sale.objects.bulk_create(sales)
+            SaleItem.objects.bulk_create([
+                SaleItem(sale=sale, product_id=pk, quantity=qty, unit_price=price)
+                for sale, picked in zip(sales, lines) for pk, price, qty in picked
+            ])
+            # Cancelled orders were booked out and then released again
+            ledger = []
+            for sale, picked in zip(sales, lines):
+                for pk, _, qty in picked:
+                    ledger.append(StockTransaction(
+                        product_id=pk, quantity=-qty, transaction_type=StockTransaction.OUT,
+                        reference=f"Sale {sale.pk}", timestamp=sale.date,
+                    ))
+                    if sale.status == "CANCELLED":
+                        ledger.append(StockTransaction(
+                            product_id=pk, quantity=qty, transaction_type=StockTransaction.IN,
+                            reference=f"Cancelled Order #{sale.pk}", timestamp=sale.date + timedelta(hours=1),
+                        ))
+            StockTransaction.objects.bulk_create(ledger)
+            ledger_rows += len(ledger)
+            payments = []
+            for sale in sales:
+                if sale.channel != "WEB":
+                    continue
+                if self.rng.random() < 0.1:
+                    payments.append(self._payment(sale, "FAILED"))
+                if sale.status != "CANCELLED" or self.rng.random() < 0.5:
+                    payments.append(self._payment(sale, "PENDING" if sale.status == "PENDING" else
+                                                  "COMPLETED" if sale.status == "COMPLETED" else "FAILED"))
+            MpesaTransaction.objects.bulk_create(payments)
+        self.log(f"Created {count} sales ({ledger_rows} ledger rows).")
+        return ledger_rows
+
+    def _payment(self, sale, status):
+        n = self.rng.getrandbits(32)
+        return MpesaTransaction(
+            sale=sale, merchant_request_id=f"seed-{n:08x}", checkout_request_id=f"ws_CO_seed_{sale.pk}_{status}_{n:08x}",
+            amount=sale.total, phone=f"2547{self.rng.randrange(10 ** 8):08d}", status=status,
+        )
+
+    def purchases(self, ledger_rows, items=10):
+        """Restocks adding about ``ledger_rows`` IN rows, sized so stock stays well above what was sold."""
+        suppliers = list(Supplier.objects.values_list("pk", flat=True))
+        if not suppliers:
+            self.suppliers(50)
+            suppliers = list(Supplier.objects.values_list("pk", flat=True))
+        count = -(-ledger_rows // items)
+        for size in self._batches(count):
+            purchases, lines = [], []
+            for _ in range(size):
+                picked = [(*self._pick_product(), self.rng.randrange(20, 200)) for _ in range(items)]
+                purchases.append(Purchase(
+                    supplier_id=self.rng.choice(suppliers), invoice_number=f"INV-{self.rng.randrange(10 ** 8):08d}",
+                    date=self._moment(), total=sum(price * qty for _, price, qty in picked),
+                ))
+                lines.append(picked)
+            purchases = Purchase.objects.bulk_create(purchases)
+            PurchaseItem.objects.bulk_create([
+                PurchaseItem(purchase=purchase, product_id=pk, quantity=qty, unit_price=price)
+                for purchase, picked in zip(purchases, lines) for pk, price, qty in picked
+            ])
+            StockTransaction.objects.bulk_create([
+                StockTransaction(
+                    product_id=pk, quantity=qty, transaction_type=StockTransaction.IN,
+                    reference=f"Purchase {purchase.pk}", timestamp=purchase.date,
+                )
+                for purchase, picked in zip(purchases, lines) for pk, _, qty in picked
+            ])
+        self.log(f"Created {count} purchases ({count * items} ledger rows).")
+
+    def finish(self, stdout=None):
+        """Rebuild the derived tables from the seeded rows and refresh planner statistics."""
+        call_command("rebuild_stock_balances", stdout=stdout)
+        call_command("rebuild_sales_summary", stdout=stdout)
+        analyze()
+        invalidate_catalogue()
+
+
+def start_of_day(moment=None):
+    """Local midnight at the start of ``moment``'s day (today by default)."""
+    return timezone.localtime(moment).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def seeded_with():
+    """
+    {"seed", "now"} the seeded catalogue was generated with, or None if the
+    database was not seeded (or was seeded before they were recorded).
+    """
+    description = (
+        Product.objects.filter(sku__startswith=SKU_PREFIX).order_by("sku")
+        .values_list("description", flat=True).first()
+    )
+    match = _DESCRIPTION_PATTERN.search(description or "")
+    if match is None:
+        return None
+    return {"seed": int(match[1]), "now": datetime.fromisoformat(match[2])}
+
+
+def analyze():
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        for model in (Product, Customer, Sale, SaleItem, StockTransaction, MpesaTransaction, Purchase, PurchaseItem):
+            cursor.execute(f"ANALYZE {model._meta.db_table}")
@@ -2,22 +2,37 @@ from rest_framework import serializers
 from .models import (
     Product, Supplier, Customer,
     Purchase, PurchaseItem,
-    Sale, SaleItem, StockTransaction
+    Sale, SaleItem
 )
+from .services import InsufficientStock, record_sale, record_purchase
 
-class ProductSerializer(serializers.ModelSerializer):
+class SparseFieldsMixin:
+    """Limit the serialized fields to a comma-separated ``?fields=`` list on read requests."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or request.method != "GET":
+            return
+        requested = request.query_params.get("fields")
+        if requested:
+            keep = {name.strip() for name in requested.split(",")}
+            for name in set(self.fields) - keep:
+                self.fields.pop(name)
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     stock_quantity = serializers.ReadOnlyField()
 
     class Meta:
         model = Product
-        fields = "__all__"
+        exclude = ("search_vector",)
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
         fields = "__all__"
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
         fields = "__all__"
@@ -36,20 +51,9 @@ class PurchaseSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop("items", [])
-        purchase = Purchase.objects.create(**validated_data)
-        total = 0
-        for item in items_data:
-            pi = PurchaseItem.objects.create(purchase=purchase, **item)
-            total += pi.quantity * pi.unit_price
-            StockTransaction.objects.create(
-                product=pi.product,
-                quantity=pi.quantity,
-                transaction_type=StockTransaction.IN,
-                reference=f"Purchase {purchase.id}"
-            )
-        purchase.total = total
-        purchase.save()
-        return purchase
+        validated_data.pop("total", None)
+        lines = [(item["product"], item["quantity"], item["unit_price"]) for item in items_data]
+        return record_purchase(lines, **validated_data)
 
 class SaleItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -65,17 +69,23 @@ class SaleSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop("items", [])
-        sale = Sale.objects.create(**validated_data)
-        total = 0
-        for item in items_data:
-            si = SaleItem.objects.create(sale=sale, **item)
-            total += si.quantity * si.unit_price
-            StockTransaction.objects.create(
-                product=si.product,
-                quantity=si.quantity,
-                transaction_type=StockTransaction.OUT,
-                reference=f"Sale {sale.id}"
-            )
-        sale.total = total
-        sale.save()
-        return sale
\ No newline at end of file
+        validated_data.pop("total", None)
+        lines = [(item["product"], item["quantity"], item["unit_price"]) for item in items_data]
+        try:
+            return record_sale(lines, **validated_data)
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({"items": exc.messages})
+
+
+class SyncProductSerializer(serializers.ModelSerializer):
+    stock_quantity = serializers.ReadOnlyField()
+
+    class Meta:
+        model = Product
+        fields = ("id", "sku", "name", "category", "unit", "selling_price", "active", "stock_quantity", "updated_at")
+
+class OfflineSaleSerializer(serializers.Serializer):
+    client_uuid = serializers.UUIDField()
+    customer = serializers.PrimaryKeyRelatedField(queryset=Customer.objects.all(), required=False, allow_null=True)
+    date = serializers.DateTimeField(required=False)
+    items = SaleItemSerializer(many=True, allow_empty=False)
@@ -0,0 +1,379 @@
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .models import (
+    Purchase, PurchaseItem, Sale, SaleItem, StockBalance, StockTransaction, ArchivedStockTransaction,
+    StockSnapshot, DailySalesSummary, MpesaCallback, MpesaTransaction
+)
+from .utils import MpesaClient, MpesaError
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    """Raised when one or more sale lines ask for more than is on hand."""
+
+    def __init__(self, shortages):
+        # shortages: list of (product, requested, available)
+        self.shortages = shortages
+        super().__init__("; ".join(self.messages))
+
+    @property
+    def messages(self):
+        return [
+            f"Not enough stock for {product.name}: requested {requested}, {available} available."
+            for product, requested, available in self.shortages
+        ]
+
+
+def _document_total(lines):
+    return sum(Decimal(qty) * Decimal(price) for _, qty, price in lines).quantize(Decimal("0.01"))
+
+
+def _totals_by_product(lines):
+    products, quantities = {}, defaultdict(Decimal)
+    for product, quantity, _ in lines:
+        products[product.pk] = product
+        quantities[product.pk] += Decimal(quantity)
+    return products, quantities
+
+
+def lock_stock(product_ids):
+    """
+    Lock the StockBalance rows of the given products in primary-key order and
+    return {product_id: on_hand}. Taking locks in a fixed order keeps concurrent
+    documents touching the same products from deadlocking.
+    """
+    StockBalance.objects.bulk_create(
+        [StockBalance(product_id=pk) for pk in product_ids], ignore_conflicts=True
+    )
+    return dict(
+        StockBalance.objects.select_for_update()
+        .filter(product_id__in=product_ids)
+        .order_by("pk")
+        .values_list("product_id", "quantity")
+    )
+
+
+def reserve_stock(lines):
+    """
+    Lock stock for (product, quantity, unit_price) lines and return the
+    shortages as (product, requested, available) tuples.
+    """
+    products, quantities = _totals_by_product(lines)
+    on_hand = lock_stock(list(products))
+    return [
+        (products[pk], qty, on_hand.get(pk, 0))
+        for pk, qty in quantities.items()
+        if on_hand.get(pk, 0) < qty
+    ]
+
+
+@transaction.atomic
+def record_sale(lines, reference="Sale {id}", allow_oversell=False, **sale_fields):
+    """
+    Create a Sale from (product, quantity, unit_price) lines with a constant
+    number of queries: one locked stock check, then bulk inserts for the items
+    and their OUT ledger rows. Raises InsufficientStock unless allow_oversell
+    is set, which is used for sales that already happened offline.
+    """
+    shortages = reserve_stock(lines)
+    if shortages and not allow_oversell:
+        raise InsufficientStock(shortages)
+    sale_fields["total"] = _document_total(lines)
+    sale = Sale.objects.create(**sale_fields)
+    SaleItem.objects.bulk_create([
+        SaleItem(sale=sale, product=product, quantity=qty, unit_price=price)
+        for product, qty, price in lines
+    ])
+    StockTransaction.objects.record_many(
+        [(product, -Decimal(qty)) for product, qty, _ in lines],
+        StockTransaction.OUT, reference=reference.format(id=sale.id),
+    )
+    DailySalesSummary.add_sale(sale)
+    return sale
+
+
+@transaction.atomic
+def record_purchase(lines, reference="Purchase {id}", **purchase_fields):
+    """Create a Purchase from (product, quantity, unit_price) lines and book the stock IN."""
+    products, _ = _totals_by_product(lines)
+    lock_stock(list(products))
+    purchase_fields["total"] = _document_total(lines)
+    purchase = Purchase.objects.create(**purchase_fields)
+    PurchaseItem.objects.bulk_create([
+        PurchaseItem(purchase=purchase, product=product, quantity=qty, unit_price=price)
+        for product, qty, price in lines
+    ])
+    StockTransaction.objects.record_many(
+        [(product, Decimal(qty)) for product, qty, _ in lines],
+        StockTransaction.IN, reference=reference.format(id=purchase.id),
+    )
+    return purchase
+
+
+@transaction.atomic
+def cancel_pending_sales(sale_ids, reference="Cancelled Order #{id}"):
+    """
+    Cancel the given sales that are still PENDING and return their stock with
+    compensating IN ledger rows, all in bulk. Returns the cancelled sales.
+    """
+    sales = list(
+        Sale.objects.select_for_update()
+        .filter(pk__in=sale_ids, status='PENDING')
+        .order_by("pk")
+    )
+    if not sales:
+        return []
+    items = list(SaleItem.objects.filter(sale__in=sales).values_list("sale_id", "product_id", "quantity"))
+    lock_stock(sorted({product_id for _, product_id, _ in items}))
+    StockTransaction.objects.bulk_create([
+        StockTransaction(
+            product_id=product_id, quantity=qty,
+            transaction_type=StockTransaction.IN, reference=reference.format(id=sale_id),
+        )
+        for sale_id, product_id, qty in items
+    ], batch_size=1000)
+    deltas = defaultdict(Decimal)
+    for _, product_id, qty in items:
+        deltas[product_id] += qty
+    StockBalance.apply(deltas)
+    Sale.objects.filter(pk__in=[sale.pk for sale in sales]).update(status='CANCELLED')
+    DailySalesSummary.move_sales(sales, 'PENDING', 'CANCELLED')
+    for sale in sales:
+        sale.status = 'CANCELLED'
+    return sales
+
+
+@transaction.atomic
+def complete_pending_sales(sale_ids):
+    """
+    Mark the given sales that are still PENDING as COMPLETED and move their
+    rollup totals. Sales are locked first, so one that a payment, the expiry
+    sweep or a cancellation already moved is left alone. Returns the
+    completed sales.
+    """
+    sales = list(
+        Sale.objects.select_for_update()
+        .filter(pk__in=sale_ids, status='PENDING')
+        .order_by("pk")
+    )
+    if not sales:
+        return []
+    Sale.objects.filter(pk__in=[sale.pk for sale in sales]).update(status='COMPLETED')
+    DailySalesSummary.move_sales(sales, 'PENDING', 'COMPLETED')
+    for sale in sales:
+        sale.status = 'COMPLETED'
+    return sales
+
+
+def expired_orders(ttl):
+    """Web orders that have been PENDING for longer than ``ttl``, oldest first."""
+    return Sale.objects.filter(
+        status='PENDING', channel='WEB', date__lt=timezone.now() - ttl
+    ).order_by("date")
+
+
+def expire_pending_orders(ttl, batch_size=500):
+    """
+    Cancel web orders that have been PENDING for longer than ``ttl`` and
+    return their reserved stock, one batch per transaction so locks stay
+    short. Returns the number of orders cancelled.
+    """
+    stale = expired_orders(ttl)
+    expired = 0
+    while True:
+        sale_ids = list(stale.values_list("pk", flat=True)[:batch_size])
+        if not sale_ids:
+            return expired
+        with transaction.atomic():
+            expired += len(cancel_pending_sales(sale_ids, reference="Expired Order #{id}"))
+
+
+def archive_stock_ledger(before, batch_size=10000):
+    """
+    Move StockTransaction rows timestamped before ``before`` into
+    ArchivedStockTransaction, one batch per transaction. ``before`` must be a
+    StockSnapshot boundary so as-of queries after it never need the moved
+    rows; balances are not touched. Returns the number of rows moved.
+    """
+    if not StockSnapshot.objects.filter(as_of=before).exists():
+        raise ValueError(f"No stock snapshot at {before}; run snapshot_stock first.")
+    old = StockTransaction.objects.filter(timestamp__lt=before).order_by("timestamp", "pk")
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(old.values("pk", "product_id", "quantity", "transaction_type", "reference", "timestamp")[:batch_size])
+            if not rows:
+                return moved
+            archived = ArchivedStockTransaction.objects.bulk_create([
+                ArchivedStockTransaction(id=row.pop("pk"), **row) for row in rows
+            ])
+            StockTransaction.objects.filter(pk__in=[row.pk for row in archived]).delete()
+        moved += len(archived)
+
+
+def apply_offline_sales(sales):
+    """
+    Book a batch of sales pushed by an offline POS terminal in one transaction.
+    Each sale is a dict with ``client_uuid``, ``items`` (product, quantity,
+    unit_price dicts) and optional ``customer``/``date``; sales whose
+    client_uuid is already booked are skipped, so a terminal can safely retry.
+    Returns {client_uuid: (sale, created)}.
+    """
+    results = {}
+    with transaction.atomic():
+        uuids = [sale["client_uuid"] for sale in sales]
+        existing = {s.client_uuid: s for s in Sale.objects.filter(client_uuid__in=uuids)}
+        # Lock every product in the batch up front in one global order; the
+        # per-sale locks below would otherwise interleave with checkouts'
+        lock_stock(sorted({
+            item["product"].pk for data in sales if data["client_uuid"] not in existing
+            for item in data["items"]
+        }))
+        for data in sales:
+            uuid = data["client_uuid"]
+            if uuid in results:
+                continue
+            if uuid in existing:
+                results[uuid] = (existing[uuid], False)
+                continue
+            lines = [(item["product"], item["quantity"], item["unit_price"]) for item in data["items"]]
+            fields = {key: data[key] for key in ("customer", "date") if data.get(key) is not None}
+            try:
+                sale = record_sale(
+                    lines, reference="POS Sale {id}", allow_oversell=True,
+                    client_uuid=uuid, status='COMPLETED', channel='POS', **fields
+                )
+            except IntegrityError:
+                # Another worker booked the same client_uuid concurrently
+                sale = Sale.objects.get(client_uuid=uuid)
+                results[uuid] = (sale, False)
+                continue
+            results[uuid] = (sale, True)
+    return results
+
+
+def _apply_payment_results(results):
+    """
+    Move PENDING payments to the outcome in ``results`` ({checkout_request_id:
+    result_code}) and complete the PENDING sales they paid for. Payments and
+    sales are locked first, so a result that has already been applied is a
+    no-op. Call inside a transaction; returns the matched payments by id.
+    """
+    payments = {
+        payment.checkout_request_id: payment
+        for payment in MpesaTransaction.objects.select_for_update()
+        .select_related("sale")
+        .filter(checkout_request_id__in=list(results))
+        .order_by("sale_id", "pk")
+    }
+    completed, failed, paid_sales = [], [], {}
+    for checkout_id, result_code in results.items():
+        payment = payments.get(checkout_id)
+        if payment is None or payment.status != 'PENDING':
+            continue
+        if result_code != 0:
+            failed.append(payment.pk)
+            continue
+        completed.append(payment.pk)
+        if payment.sale.status == 'PENDING':
+            paid_sales[payment.sale_id] = payment.sale
+        else:
+            logger.warning(
+                "Payment %s completed for sale %s in status %s",
+                checkout_id, payment.sale_id, payment.sale.status,
+            )
+
+    MpesaTransaction.objects.filter(pk__in=completed).update(status='COMPLETED')
+    MpesaTransaction.objects.filter(pk__in=failed).update(status='FAILED')
+    if paid_sales:
+        Sale.objects.filter(pk__in=paid_sales).update(status='COMPLETED')
+        DailySalesSummary.move_sales(paid_sales.values(), 'PENDING', 'COMPLETED')
+    return payments
+
+
+def process_mpesa_callbacks(limit=500, match_window=timedelta(minutes=15)):
+    """
+    Apply a batch of unprocessed M-Pesa callbacks. Callback rows are claimed
+    with SKIP LOCKED so several processors can run at once. A callback that
+    arrives before its payment row exists is left alone until
+    ``match_window`` has passed. Returns the number of callbacks processed.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        callbacks = list(
+            MpesaCallback.objects.select_for_update(skip_locked=True)
+            .filter(processed_at__isnull=True)
+            .filter(
+                Exists(MpesaTransaction.objects.filter(checkout_request_id=OuterRef("checkout_request_id")))
+                | Q(received_at__lte=now - match_window)
+            )
+            .order_by("received_at")[:limit]
+        )
+        if not callbacks:
+            return 0
+        payments = _apply_payment_results({cb.checkout_request_id: cb.result_code for cb in callbacks})
+        for cb in callbacks:
+            if cb.checkout_request_id not in payments:
+                logger.warning("M-Pesa callback %s matches no payment", cb.checkout_request_id)
+        MpesaCallback.objects.filter(pk__in=[cb.pk for cb in callbacks]).update(processed_at=now)
+    return len(callbacks)
+
+
+def stale_payments(older_than):
+    """PENDING payments created more than ``older_than`` ago, oldest first."""
+    return MpesaTransaction.objects.filter(
+        status='PENDING', date_created__lt=timezone.now() - older_than
+    ).order_by("date_created", "pk")
+
+
+def reconcile_payments(checkout_ids, client=None, workers=8):
+    """
+    Ask Daraja for the outcome of payments whose callback never arrived, with
+    at most ``workers`` queries in flight. Paid orders are completed; orders
+    whose only payment failed are cancelled and their stock returned. Payments
+    Daraja is still processing, or could not be asked about, stay PENDING.
+    Returns (completed, failed, unresolved) counts.
+    """
+    client = client or MpesaClient()
+
+    def query(checkout_id):
+        try:
+            return checkout_id, client.stk_query(checkout_id)
+        except MpesaError as exc:
+            logger.warning("STK query for %s failed: %s", checkout_id, exc)
+            return checkout_id, {}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        responses = list(pool.map(query, checkout_ids))
+    # Only a ResultCode is an outcome; errorCode responses mean "still processing" or a rejected query
+    results = {
+        checkout_id: int(response['ResultCode'])
+        for checkout_id, response in responses
+        if str(response.get('ResultCode', '')).isdigit()
+    }
+
+    with transaction.atomic():
+        payments = _apply_payment_results(results)
+        failed_sales = {
+            payments[checkout_id].sale_id
+            for checkout_id, code in results.items()
+            if code != 0 and checkout_id in payments
+        }
+        # A customer may have retried from My Orders; keep orders with another live payment
+        failed_sales -= set(
+            MpesaTransaction.objects.filter(sale_id__in=failed_sales, status__in=['PENDING', 'COMPLETED'])
+            .values_list("sale_id", flat=True)
+        )
+        cancel_pending_sales(failed_sales, reference="Unpaid Order #{id}")
+
+    completed = sum(1 for code in results.values() if code == 0)
+    return completed, len(results) - completed, len(checkout_ids) - len(results)
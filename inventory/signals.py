@@ -0,0 +1,35 @@
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import invalidate_catalogue
+from .models import Category, CategoryClosure, Product, ProductTombstone, Unit
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Unit)
+def invalidate_storefront(sender, **kwargs):
+    invalidate_catalogue()
+
+
+@receiver(post_save, sender=Category)
+def link_category(sender, instance, **kwargs):
+    CategoryClosure.attach(instance)
+
+
+@receiver(pre_delete, sender=Category)
+def unlink_category(sender, instance, **kwargs):
+    CategoryClosure.detach(instance)
+
+
+@receiver(post_delete, sender=Product)
+def record_product_tombstone(sender, instance, **kwargs):
+    ProductTombstone.objects.create(product_id=instance.pk, sku=instance.sku)
+
+
+@receiver(user_logged_out)
+def clear_cart(sender, request, **kwargs):
+    # A cart kept in the browser would otherwise pass to whoever signs in next
+    if request is not None and hasattr(request, "cart"):
+        request.cart.clear()
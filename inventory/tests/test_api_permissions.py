@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from inventory.models import Customer, Product, Supplier
+
+
+class StaffOnlyAPITests(TestCase):
+    """Storefront shoppers are Django users too; the catalogue and sync APIs are for staff only."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        cls.shopper = User.objects.create_user("shopper", password="x")
+        Customer.objects.create(user=cls.shopper, name="Shopper", phone="0700000000")
+        cls.supplier = Supplier.objects.create(name="Unga Ltd")
+        Product.objects.create(sku="DM-70", name="Dairy Meal 70kg", buying_price=2800, selling_price=3200)
+
+    def test_shopper_is_refused(self):
+        self.client.force_login(self.shopper)
+        for url in ("/api/products/", "/api/suppliers/", "/api/customers/", reverse("inventory:sync_pull")):
+            self.assertEqual(self.client.get(url).status_code, 403, url)
+        self.assertEqual(self.client.post("/api/products/", {"sku": "X", "name": "X"}).status_code, 403)
+        self.assertEqual(self.client.delete(f"/api/suppliers/{self.supplier.pk}/").status_code, 403)
+        self.assertEqual(Product.objects.count(), 1)
+        self.assertTrue(Supplier.objects.filter(pk=self.supplier.pk).exists())
+
+    def test_staff_is_allowed(self):
+        self.client.force_login(self.staff)
+        for url in ("/api/products/", "/api/suppliers/", "/api/customers/", reverse("inventory:sync_pull")):
+            self.assertEqual(self.client.get(url).status_code, 200, url)
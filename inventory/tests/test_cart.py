@@ -0,0 +1,123 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from inventory.cart import CART_COOKIE
+from inventory.models import Product, SavedCart, StockTransaction
+
+from .test_query_counts import LOCMEM_CACHE
+
+
+class CartBehaviour:
+    """Storefront cart behaviour every CART_BACKEND must share."""
+
+    # Queries the backend spends saving a guest's cart
+    storage_queries = 0
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="x")
+        cls.feed = Product.objects.create(sku="DM-70", name="Dairy Meal 70kg", selling_price=3200)
+        cls.seed = Product.objects.create(sku="MZ-2", name="Hybrid Maize 2kg", selling_price=450)
+        cls.salt = Product.objects.create(sku="SL-5", name="Mineral Salt 5kg", selling_price=600)
+        for product in (cls.feed, cls.seed):
+            StockTransaction.objects.record(product, 10, StockTransaction.IN)
+
+    def setUp(self):
+        cache.clear()
+
+    def add(self, *lines):
+        return self.client.post(reverse("inventory:add_many_to_cart"), {
+            "product": [product.pk for product, _ in lines], "quantity": [qty for _, qty in lines],
+        })
+
+    def contents(self):
+        response = self.client.get(reverse("inventory:cart"))
+        return {item["product"].sku: item["quantity"] for item in response.context["items"]}
+
+    def login(self):
+        self.client.post(reverse("login"), {"username": "shopper", "password": "x"})
+
+    def test_add_many_sums_repeated_lines(self):
+        self.add((self.feed, 1), (self.seed, 2), (self.feed, 2), (self.seed, "x"), (self.salt, 0))
+        self.assertEqual(self.contents(), {"DM-70": 3, "MZ-2": 2})
+
+    def test_add_many_checks_stock_in_one_query(self):
+        with self.assertNumQueries(1 + self.storage_queries):
+            self.add((self.feed, 1), (self.seed, 1), (self.salt, 1))
+        self.assertEqual(self.contents(), {"DM-70": 1, "MZ-2": 1})
+
+    def test_add_beyond_stock_is_refused(self):
+        self.add((self.feed, 8))
+        response = self.add((self.feed, 3))
+        self.assertEqual(self.contents(), {"DM-70": 8})
+        self.assertIn("Only 10 of Dairy Meal 70kg available.", [str(m) for m in response.wsgi_request._messages])
+
+    def test_guest_cart_is_kept_on_login(self):
+        self.add((self.feed, 2))
+        self.login()
+        self.assertEqual(self.contents(), {"DM-70": 2})
+
+    def test_logout_empties_the_cart(self):
+        self.login()
+        self.add((self.feed, 2))
+        self.client.post(reverse("logout"))
+        self.assertEqual(self.contents(), {})
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CART_BACKEND="inventory.cart.SignedCookieCartBackend")
+class SignedCookieCartTests(CartBehaviour, TestCase):
+    def test_cart_lives_in_the_cookie(self):
+        self.add((self.feed, 2))
+        self.assertIn(CART_COOKIE, self.client.cookies)
+        self.assertFalse(SavedCart.objects.exists())
+
+    def test_tampered_cookie_is_ignored(self):
+        self.add((self.feed, 2))
+        value = self.client.cookies[CART_COOKIE].value
+        self.client.cookies[CART_COOKIE] = value.replace('"2"', '"9"').replace(":2", ":9")
+        self.assertEqual(self.contents(), {})
+
+    def test_logout_deletes_the_cookie(self):
+        self.login()
+        self.add((self.feed, 2))
+        self.client.post(reverse("logout"))
+        self.assertEqual(self.client.cookies[CART_COOKIE].value, "")
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CART_BACKEND="inventory.cart.CacheCartBackend")
+class CacheCartTests(CartBehaviour, TestCase):
+    def test_guest_cart_merges_into_the_saved_cart(self):
+        SavedCart.objects.create(user=self.user, items={str(self.feed.pk): 1})
+        self.add((self.feed, 2), (self.seed, 1))
+        guest_key = f"cart:{self.client.cookies[CART_COOKIE].value}"
+        self.assertIsNotNone(cache.get(guest_key))
+        self.login()
+        self.assertEqual(self.contents(), {"DM-70": 3, "MZ-2": 1})
+        self.assertEqual(SavedCart.objects.get(user=self.user).items, {str(self.feed.pk): 3, str(self.seed.pk): 1})
+        self.assertIsNone(cache.get(guest_key))
+        self.assertEqual(self.client.cookies[CART_COOKIE].value, "")
+
+    def test_saved_cart_outlives_the_cache(self):
+        self.login()
+        self.add((self.feed, 2))
+        cache.clear()
+        self.assertEqual(self.contents(), {"DM-70": 2})
+
+    def test_logout_keeps_the_saved_cart(self):
+        self.login()
+        self.add((self.feed, 2))
+        self.client.post(reverse("logout"))
+        self.assertEqual(SavedCart.objects.get(user=self.user).items, {str(self.feed.pk): 2})
+        self.login()
+        self.assertEqual(self.contents(), {"DM-70": 2})
+
+    def test_browsing_writes_nothing(self):
+        self.client.get(reverse("inventory:cart"))
+        self.assertNotIn(CART_COOKIE, self.client.cookies)
+
+
+@override_settings(CACHES=LOCMEM_CACHE, CART_BACKEND="inventory.cart.SessionCartBackend")
+class SessionCartTests(CartBehaviour, TestCase):
+    storage_queries = 4
@@ -0,0 +1,68 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from inventory.models import Category, Product, StockTransaction
+
+from .test_query_counts import LOCMEM_CACHE
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class CatalogueCacheTests(TestCase):
+    """
+    Anonymous catalogue pages are served from cache with no queries until the
+    data changes. Invalidation runs on commit, so writes here go through
+    captureOnCommitCallbacks.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Seeds")
+        cls.product = Product.objects.create(sku="MZ-2", name="Hybrid Maize 2kg", selling_price=450, category=cls.category)
+        StockTransaction.objects.record(cls.product, 40, StockTransaction.IN)
+
+    def setUp(self):
+        cache.clear()
+
+    def assertWarmWithoutQueries(self, url, data=None):
+        self.assertEqual(self.client.get(url, data).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, data).status_code, 200)
+
+    def test_store_home(self):
+        self.assertWarmWithoutQueries(reverse("inventory:store_home"))
+
+    def test_store_category_and_search(self):
+        self.assertWarmWithoutQueries(reverse("inventory:store_home"), {"category": self.category.pk})
+        self.assertWarmWithoutQueries(reverse("inventory:store_home"), {"q": "maize"})
+
+    def test_product_detail(self):
+        self.assertWarmWithoutQueries(reverse("inventory:store_product_detail", args=[self.product.pk]))
+
+    def test_product_change_invalidates(self):
+        url = reverse("inventory:store_product_detail", args=[self.product.pk])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = "Hybrid Maize 2kg H614"
+            self.product.save()
+        self.assertContains(self.client.get(url), "H614")
+
+    def test_stock_change_invalidates(self):
+        url = reverse("inventory:store_product_detail", args=[self.product.pk])
+        self.assertContains(self.client.get(url), "40 units available")
+        with self.captureOnCommitCallbacks(execute=True):
+            StockTransaction.objects.record(self.product, -40, StockTransaction.OUT)
+        self.assertNotContains(self.client.get(url), "units available")
+
+    def test_stock_change_keeps_other_products_cached(self):
+        other = Product.objects.create(sku="BN-1", name="Rosecoco Beans 1kg", selling_price=200, category=self.category)
+        url = reverse("inventory:store_product_detail", args=[self.product.pk])
+        other_url = reverse("inventory:store_product_detail", args=[other.pk])
+        self.assertWarmWithoutQueries(other_url)
+        self.assertWarmWithoutQueries(reverse("inventory:store_home"), {"category": self.category.pk})
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            StockTransaction.objects.record(self.product, -15, StockTransaction.OUT)
+        with self.assertNumQueries(0):
+            self.client.get(other_url)
+        self.assertContains(self.client.get(url), "25 units available")
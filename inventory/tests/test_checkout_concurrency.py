@@ -0,0 +1,109 @@
+import threading
+import uuid
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.db.models import Sum
+from django.test import TransactionTestCase
+
+from inventory.models import Customer, Product, SaleItem, StockBalance, StockTransaction, Supplier
+from inventory.services import InsufficientStock, apply_offline_sales, record_purchase, record_sale
+
+
+@skipUnless(connection.vendor == "postgresql", "Row locks need PostgreSQL")
+class ConcurrentCheckoutTests(TransactionTestCase):
+    """Parallel checkouts, each on its own connection, must never oversell or deadlock."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Shopper")
+        self.supplier = Supplier.objects.create(name="Unga Ltd")
+
+    def stocked(self, sku, quantity):
+        product = Product.objects.create(sku=sku, name=f"Dairy Meal {sku}", selling_price=100)
+        record_purchase([(product, quantity, 60)], supplier=self.supplier)
+        return product
+
+    def checkout(self, cart):
+        record_sale(
+            [(product, qty, 100) for product, qty in cart],
+            customer=self.customer, status='PENDING', channel='WEB',
+        )
+
+    def push_offline(self, cart):
+        """One terminal batch holding one single-line sale per cart line, in the cart's order."""
+        apply_offline_sales([
+            {"client_uuid": uuid.uuid4(), "items": [{"product": product, "quantity": qty, "unit_price": 100}]}
+            for product, qty in cart
+        ])
+
+    def checkout_in_parallel(self, carts):
+        return self.run_in_parallel([lambda cart=cart: self.checkout(cart) for cart in carts])
+
+    def run_in_parallel(self, tasks):
+        """Start every task at once, each on its own connection; returns 'sold', 'short' or the exception per task."""
+        start = threading.Barrier(len(tasks))
+        results = [None] * len(tasks)
+
+        def run(i, task):
+            try:
+                start.wait()
+                task()
+                results[i] = "sold"
+            except InsufficientStock:
+                results[i] = "short"
+            except Exception as exc:
+                results[i] = exc
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(i, task)) for i, task in enumerate(tasks)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+        self.assertFalse(any(thread.is_alive() for thread in threads), "a checkout never finished")
+        errors = [result for result in results if isinstance(result, Exception)]
+        self.assertEqual(errors, [])
+        return results
+
+    def assertBalanced(self, product, purchased):
+        sold = SaleItem.objects.filter(product=product).aggregate(qty=Sum("quantity"))["qty"] or 0
+        ledger = StockTransaction.objects.filter(product=product).aggregate(qty=Sum("quantity"))["qty"]
+        balance = StockBalance.objects.get(product=product).quantity
+        self.assertGreaterEqual(balance, 0, f"{product.sku} oversold")
+        self.assertEqual(balance, Decimal(purchased) - sold)
+        self.assertEqual(balance, ledger)
+
+    def test_last_units_of_one_product(self):
+        product = self.stocked("LOW-1", 5)
+        results = self.checkout_in_parallel([[(product, 1)]] * 12)
+        self.assertEqual(results.count("sold"), 5)
+        self.assertEqual(results.count("short"), 7)
+        self.assertBalanced(product, 5)
+        self.assertEqual(StockBalance.objects.get(product=product).quantity, 0)
+
+    def test_overlapping_multi_line_carts(self):
+        a, b, c = self.stocked("MIX-A", 6), self.stocked("MIX-B", 6), self.stocked("MIX-C", 6)
+        # The same products in every order, so unordered locking would deadlock
+        orders = [(a, b, c), (c, b, a), (b, a, c), (c, a, b), (b, c), (c, a), (a, b), (b, a)]
+        carts = [[(product, 1) for product in order] for order in orders * 2]
+        results = self.checkout_in_parallel(carts)
+        self.assertGreater(results.count("sold"), 0)
+        self.assertGreater(results.count("short"), 0)
+        for product in (a, b, c):
+            self.assertBalanced(product, 6)
+
+    def test_offline_pushes_alongside_checkouts(self):
+        a, b, c = self.stocked("SYNC-A", 100), self.stocked("SYNC-B", 100), self.stocked("SYNC-C", 100)
+        orders = [(c, b, a), (a, c, b), (b, a, c), (c, a, b)]
+        carts = [[(product, 1) for product in order] for order in orders * 3]
+        # Alternate terminal pushes and web checkouts over the same products
+        tasks = [
+            (lambda cart=cart: self.push_offline(cart)) if i % 2 else (lambda cart=cart: self.checkout(cart))
+            for i, cart in enumerate(carts)
+        ]
+        results = self.run_in_parallel(tasks)
+        self.assertEqual(results.count("sold"), len(carts))
+        for product in (a, b, c):
+            self.assertBalanced(product, 100)
@@ -0,0 +1,92 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from inventory.imports import import_products
+from inventory.models import Category, Product, StockBalance, Unit
+
+
+def csv_lines(*rows):
+    return [row + "\n" for row in rows]
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.feeds = Category.objects.create(name="Animal Feeds")
+        cls.bag = Unit.objects.create(name="Bag", abbreviation="bag")
+        cls.meal = Product.objects.create(
+            sku="DM-70", name="Dairy Meal 70kg", description="High yield", category=cls.feeds, unit=cls.bag,
+            buying_price=2800, selling_price=3200, reorder_level=10,
+        )
+
+    def test_new_and_updated_products(self):
+        result = import_products(csv_lines(
+            "SKU,Name,Category,Unit,Selling Price",
+            "DM-70,Dairy Meal 70kg,animal feeds,BAG,3300",
+            "CM-50,Chick Mash 50kg,Animal Feeds,bag,2600",
+        ))
+        self.assertEqual((result.created, result.updated, result.errors), (1, 1, []))
+        mash = Product.objects.get(sku="CM-50")
+        self.assertEqual((mash.category, mash.unit, mash.selling_price), (self.feeds, self.bag, Decimal("2600")))
+        self.assertTrue(StockBalance.objects.filter(product=mash).exists())
+
+    def test_price_only_update_keeps_other_fields(self):
+        result = import_products(csv_lines("sku,selling_price", "DM-70,3450"))
+        self.assertEqual((result.created, result.updated), (0, 1))
+        meal = Product.objects.get(sku="DM-70")
+        self.assertEqual(meal.selling_price, Decimal("3450"))
+        self.assertEqual(
+            (meal.name, meal.description, meal.category, meal.unit, meal.buying_price, meal.reorder_level, meal.active),
+            ("Dairy Meal 70kg", "High yield", self.feeds, self.bag, Decimal("2800"), 10, True),
+        )
+
+    def test_unknown_category(self):
+        result = import_products(csv_lines("sku,name,category", "CM-50,Chick Mash 50kg,Pet Food"))
+        self.assertEqual(result.errors, [(2, "category: unknown category 'Pet Food'.")])
+        self.assertFalse(Product.objects.filter(sku="CM-50").exists())
+
+    def test_bad_number(self):
+        result = import_products(csv_lines("sku,selling_price,reorder_level", "DM-70,abc,-1"))
+        self.assertEqual([line for line, _ in result.errors], [2, 2])
+        self.assertTrue(result.errors[0][1].startswith("selling_price:"))
+        self.assertTrue(result.errors[1][1].startswith("reorder_level:"))
+        self.assertEqual(Product.objects.get(sku="DM-70").selling_price, Decimal("3200"))
+
+    def test_new_sku_needs_a_name(self):
+        result = import_products(csv_lines("sku,selling_price", "CM-50,2600"))
+        self.assertEqual(result.errors, [(2, "name: required for a new product.")])
+        self.assertEqual(result.created, 0)
+        self.assertFalse(Product.objects.filter(sku="CM-50").exists())
+
+    def test_dry_run_saves_nothing(self):
+        result = import_products(csv_lines(
+            "sku,name,selling_price", "DM-70,Dairy Meal,1", "CM-50,Chick Mash 50kg,2600",
+        ), dry_run=True)
+        self.assertEqual((result.created, result.updated, result.errors), (1, 1, []))
+        self.assertEqual(Product.objects.get(sku="DM-70").selling_price, Decimal("3200"))
+        self.assertFalse(Product.objects.filter(sku="CM-50").exists())
+
+    def test_missing_sku_column(self):
+        result = import_products(csv_lines("name,selling_price", "Dairy Meal,1"))
+        self.assertEqual(result.errors, [(1, "The header row must include a 'sku' column.")])
+
+    def test_repeated_sku_in_one_chunk(self):
+        result = import_products(csv_lines(
+            "sku,name,selling_price", "CM-50,Chick Mash,2500", "CM-50,Chick Mash 50kg,2600",
+        ))
+        self.assertEqual(result.errors, [(2, "sku: CM-50 appears again on line 3; the later row is used.")])
+        self.assertEqual((result.created, result.updated), (1, 0))
+        self.assertEqual(Product.objects.get(sku="CM-50").selling_price, Decimal("2600"))
+
+    def test_repeated_sku_across_chunks(self):
+        result = import_products(csv_lines(
+            "sku,name,selling_price",
+            "CM-50,Chick Mash,2500",
+            "DM-70,Dairy Meal 70kg,3300",
+            "GM-50,Growers Mash 50kg,2700",
+            "CM-50,Chick Mash 50kg,2600",
+        ), chunk_size=2)
+        self.assertEqual(result.errors, [(2, "sku: CM-50 appears again on line 5; the later row is used.")])
+        self.assertEqual((result.created, result.updated), (2, 1))
+        self.assertEqual(Product.objects.get(sku="CM-50").selling_price, Decimal("2600"))
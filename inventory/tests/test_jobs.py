@@ -0,0 +1,86 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from inventory.jobs import claim_jobs, mpesa_stk_push, run_job
+from inventory.models import Customer, Job, MpesaTransaction, Sale
+from inventory.utils import MpesaError, MpesaTimeout
+
+
+@mock.patch("inventory.jobs.MpesaClient.stk_push")
+class StkPushJobTests(TestCase):
+    """A push that may have reached the customer is never sent twice."""
+
+    def setUp(self):
+        customer = Customer.objects.create(name="Shopper", phone="254700000000")
+        self.sale = Sale.objects.create(customer=customer, total=3200, status='PENDING', channel='WEB')
+        mpesa_stk_push.enqueue(sale_id=self.sale.pk, phone="254700000000")
+
+    def run_once(self):
+        (claimed,) = claim_jobs()
+        return run_job(claimed)
+
+    def test_timed_out_push_is_not_retried(self, stk_push):
+        stk_push.side_effect = MpesaTimeout("read timed out")
+        self.assertEqual(self.run_once(), Job.DEAD)
+        self.assertEqual(stk_push.call_count, 1)
+        self.assertEqual(claim_jobs(), [])
+
+    def test_unsent_push_is_retried(self, stk_push):
+        stk_push.side_effect = MpesaError("connection refused")
+        self.assertEqual(self.run_once(), Job.QUEUED)
+
+    def test_recorded_push_is_not_resent(self, stk_push):
+        MpesaTransaction.objects.create(
+            sale=self.sale, merchant_request_id="m-1", checkout_request_id="ws_CO_1",
+            amount=self.sale.total, phone="254700000000",
+        )
+        self.assertEqual(self.run_once(), Job.DONE)
+        stk_push.assert_not_called()
+
+
+@override_settings(MPESA_STATUS_QUERY_DELAY=120)
+@mock.patch("inventory.jobs.MpesaClient.stk_query")
+class PaymentStatusJobTests(TestCase):
+    """Every accepted push is followed by a status query, in case its callback never arrives."""
+
+    def setUp(self):
+        customer = Customer.objects.create(name="Shopper", phone="254700000000")
+        self.sale = Sale.objects.create(customer=customer, total=3200, status='PENDING', channel='WEB')
+        mpesa_stk_push.enqueue(sale_id=self.sale.pk, phone="254700000000")
+        with mock.patch("inventory.jobs.MpesaClient.stk_push") as stk_push:
+            stk_push.return_value = {"ResponseCode": "0", "MerchantRequestID": "m-1", "CheckoutRequestID": "ws_CO_1"}
+            (claimed,) = claim_jobs()
+            run_job(claimed)
+        self.payment = MpesaTransaction.objects.get()
+
+    def run_status_query(self):
+        Job.objects.filter(name="mpesa_payment_status").update(run_at=timezone.now())
+        (claimed,) = claim_jobs()
+        return run_job(claimed)
+
+    def test_query_is_queued_after_the_delay(self, stk_query):
+        follow_up = Job.objects.get(name="mpesa_payment_status")
+        self.assertEqual(follow_up.payload, {"checkout_request_id": "ws_CO_1"})
+        self.assertGreater(follow_up.run_at, timezone.now() + timedelta(seconds=100))
+        self.assertEqual(claim_jobs(), [])
+
+    def test_paid_push_completes_the_sale(self, stk_query):
+        stk_query.return_value = {"ResponseCode": "0", "ResultCode": "0"}
+        self.assertEqual(self.run_status_query(), Job.DONE)
+        self.sale.refresh_from_db()
+        self.payment.refresh_from_db()
+        self.assertEqual((self.sale.status, self.payment.status), ('COMPLETED', 'COMPLETED'))
+
+    def test_push_still_processing_is_queried_again(self, stk_query):
+        stk_query.return_value = {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"}
+        self.assertEqual(self.run_status_query(), Job.QUEUED)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'PENDING')
+
+    def test_settled_payment_is_not_queried(self, stk_query):
+        MpesaTransaction.objects.filter(pk=self.payment.pk).update(status='COMPLETED')
+        self.assertEqual(self.run_status_query(), Job.DONE)
+        stk_query.assert_not_called()
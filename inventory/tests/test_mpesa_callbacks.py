@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+from datetime import timedelta
+from unittest import skipUnless
+
+from django.db import connection, connections
+from django.test import Client, TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Customer, DailySalesSummary, MpesaCallback, MpesaTransaction, Sale
+from inventory.services import process_mpesa_callbacks, reconcile_payments
+from inventory.utils import MpesaClient
+
+from .test_mpesa_client import QUERY_PATH, StubDarajaMixin
+
+
+def stk_callback(checkout_id, result_code=0):
+    return json.dumps({"Body": {"stkCallback": {
+        "MerchantRequestID": f"m-{checkout_id}", "CheckoutRequestID": checkout_id,
+        "ResultCode": result_code, "ResultDesc": "The service request is processed successfully.",
+    }}})
+
+
+class CallbackInboxTests(TestCase):
+    """The endpoint only records callbacks; process_mpesa_callbacks applies each one once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Shopper", phone="254700000000")
+
+    def setUp(self):
+        self.sale = Sale.objects.create(customer=self.customer, total=3200, status='PENDING', channel='WEB')
+        self.payment = self.pay(self.sale, "ws_CO_1")
+
+    def pay(self, sale, checkout_id):
+        return MpesaTransaction.objects.create(
+            sale=sale, merchant_request_id=f"m-{checkout_id}", checkout_request_id=checkout_id,
+            amount=sale.total, phone="254700000000",
+        )
+
+    def post(self, checkout_id, result_code=0):
+        return self.client.post(
+            reverse("inventory:mpesa_callback"), stk_callback(checkout_id, result_code), content_type="application/json"
+        )
+
+    def summary(self, status):
+        return DailySalesSummary.objects.get(date=timezone.localdate(self.sale.date), channel='WEB', status=status)
+
+    def test_callback_is_only_recorded(self):
+        self.assertEqual(self.post("ws_CO_1").json()["ResultCode"], 0)
+        self.sale.refresh_from_db()
+        self.assertEqual(self.sale.status, 'PENDING')
+        self.assertEqual(MpesaCallback.objects.get().result_code, 0)
+
+    def test_duplicate_callback_is_applied_once(self):
+        self.post("ws_CO_1")
+        self.post("ws_CO_1")
+        self.assertEqual(process_mpesa_callbacks(), 1)
+        # Safaricom resends after the first was applied
+        self.post("ws_CO_1")
+        self.assertEqual(process_mpesa_callbacks(), 0)
+        self.assertEqual(MpesaCallback.objects.count(), 1)
+        self.payment.refresh_from_db()
+        self.sale.refresh_from_db()
+        self.assertEqual((self.payment.status, self.sale.status), ('COMPLETED', 'COMPLETED'))
+        self.assertEqual(self.summary('COMPLETED').sale_count, 1)
+
+    def test_failed_payment_leaves_the_order_pending(self):
+        self.post("ws_CO_1", result_code=1032)
+        process_mpesa_callbacks()
+        self.payment.refresh_from_db()
+        self.sale.refresh_from_db()
+        self.assertEqual((self.payment.status, self.sale.status), ('FAILED', 'PENDING'))
+
+    def test_unknown_callback_waits_for_its_payment(self):
+        self.post("ws_CO_2")
+        self.assertEqual(process_mpesa_callbacks(), 0)
+        # The push job records the payment after Safaricom already called back
+        second = self.pay(Sale.objects.create(customer=self.customer, total=500, status='PENDING', channel='WEB'), "ws_CO_2")
+        self.assertEqual(process_mpesa_callbacks(), 1)
+        second.refresh_from_db()
+        self.assertEqual(second.status, 'COMPLETED')
+
+    def test_unmatched_callback_is_set_aside_after_the_window(self):
+        self.post("ws_CO_404")
+        self.assertEqual(process_mpesa_callbacks(match_window=timedelta(minutes=15)), 0)
+        MpesaCallback.objects.update(received_at=timezone.now() - timedelta(minutes=16))
+        with self.assertLogs("inventory.services", "WARNING"):
+            self.assertEqual(process_mpesa_callbacks(match_window=timedelta(minutes=15)), 1)
+        self.assertIsNotNone(MpesaCallback.objects.get().processed_at)
+        self.payment.refresh_from_db()
+        self.assertEqual(self.payment.status, 'PENDING')
+
+    def test_matched_callbacks_skip_the_window(self):
+        self.post("ws_CO_404")
+        self.post("ws_CO_1")
+        self.assertEqual(process_mpesa_callbacks(match_window=timedelta(days=1)), 1)
+        self.assertEqual(MpesaCallback.objects.filter(processed_at__isnull=True).get().checkout_request_id, "ws_CO_404")
+
+    def test_malformed_callback_is_rejected(self):
+        response = self.client.post(reverse("inventory:mpesa_callback"), "{}", content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MpesaCallback.objects.exists())
+
+
+@skipUnless(connection.vendor == "postgresql", "SKIP LOCKED needs PostgreSQL")
+class CallbackLoadTests(StubDarajaMixin, TransactionTestCase):
+    """
+    Load harness: thousands of callbacks, with resends, posted from several
+    threads while several processors drain the inbox, then a status-query
+    sweep against the Daraja stub for the pushes whose callback was lost.
+    """
+
+    payments = 3000
+    senders = 8
+    processors = 4
+
+    def test_callback_burst(self):
+        customer = Customer.objects.create(name="Shopper", phone="254700000000")
+        sales = Sale.objects.bulk_create(
+            Sale(customer=customer, total=100, status='PENDING', channel='WEB') for _ in range(self.payments)
+        )
+        MpesaTransaction.objects.bulk_create(
+            MpesaTransaction(sale=sale, checkout_request_id=f"ws_CO_{sale.pk}", amount=100, phone="254700000000")
+            for sale in sales
+        )
+        ids = [f"ws_CO_{sale.pk}" for sale in sales]
+        # Every tenth callback is lost and every fifth is sent twice
+        sent = [checkout_id for i, checkout_id in enumerate(ids) if i % 10]
+        sent += sent[::5]
+
+        done = threading.Event()
+        applied = []
+
+        def send(share):
+            client = Client()
+            try:
+                for checkout_id in share:
+                    response = client.post(
+                        reverse("inventory:mpesa_callback"), stk_callback(checkout_id), content_type="application/json"
+                    )
+                    assert response.status_code == 200, response.content
+            finally:
+                connections.close_all()
+
+        def process():
+            try:
+                while True:
+                    finished = done.is_set()
+                    count = process_mpesa_callbacks(limit=200)
+                    applied.append(count)
+                    if finished and not count:
+                        break
+                    if not count:
+                        time.sleep(0.05)
+            finally:
+                connections.close_all()
+
+        start = time.perf_counter()
+        senders = [threading.Thread(target=send, args=(sent[i::self.senders],)) for i in range(self.senders)]
+        processors = [threading.Thread(target=process) for _ in range(self.processors)]
+        for thread in senders + processors:
+            thread.start()
+        for thread in senders:
+            thread.join(timeout=120)
+        done.set()
+        for thread in processors:
+            thread.join(timeout=120)
+        elapsed = time.perf_counter() - start
+        self.assertFalse(any(thread.is_alive() for thread in senders + processors), "the burst never drained")
+
+        lost = [checkout_id for i, checkout_id in enumerate(ids) if not i % 10]
+        self.assertEqual(sum(applied), len(ids) - len(lost))
+        self.assertEqual(MpesaCallback.objects.filter(processed_at__isnull=True).count(), 0)
+        self.assertEqual(Sale.objects.filter(status='COMPLETED').count(), len(ids) - len(lost))
+        per_minute = len(sent) / elapsed * 60
+        self.assertGreater(per_minute, 2000, f"{len(sent)} callbacks took {elapsed:.1f}s")
+
+        self.assertEqual(reconcile_payments(lost, client=MpesaClient()), (len(lost), 0, 0))
+        self.assertEqual(len(self.daraja.hits(QUERY_PATH)), len(lost))
+        self.assertFalse(MpesaTransaction.objects.filter(status='PENDING').exists())
+        self.assertEqual(Sale.objects.filter(status='COMPLETED').count(), len(ids))
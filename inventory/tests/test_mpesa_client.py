@@ -0,0 +1,219 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from inventory.jobs import claim_jobs, run_job
+from inventory.models import Customer, MpesaTransaction, Product, Sale, StockTransaction
+from inventory.utils import MpesaClient, MpesaError, MpesaTimeout
+
+from .test_query_counts import LOCMEM_CACHE
+
+TOKEN_PATH = "/oauth/v1/generate"
+PUSH_PATH = "/mpesa/stkpush/v1/processrequest"
+QUERY_PATH = "/mpesa/stkpushquery/v1/query"
+
+
+class StubDaraja(ThreadingHTTPServer):
+    """
+    Local stand-in for the Daraja API. Replies to each path come from
+    ``replies[path]`` in order as (status, body, delay), falling back to a
+    success; every request received is kept in ``received``.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubDarajaHandler)
+        self.received = []
+        self.replies = {}
+        self.tokens = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+    def hits(self, path):
+        return [request for request in self.received if request["path"] == path]
+
+    def reply(self, path, body):
+        with self.lock:
+            queued = self.replies.get(path)
+            if queued:
+                return queued.pop(0)
+            if path == TOKEN_PATH:
+                self.tokens += 1
+                return 200, {"access_token": f"token-{self.tokens}", "expires_in": "3599"}, 0
+            if path == PUSH_PATH:
+                n = len(self.hits(PUSH_PATH))
+                return 200, {
+                    "MerchantRequestID": f"m-{n}", "CheckoutRequestID": f"ws_CO_{n}",
+                    "ResponseCode": "0", "ResponseDescription": "Success. Request accepted for processing",
+                }, 0
+            return 200, {"ResponseCode": "0", "ResultCode": "0", "CheckoutRequestID": body.get("CheckoutRequestID")}, 0
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class StubDarajaHandler(BaseHTTPRequestHandler):
+    def respond(self, method):
+        path = urlsplit(self.path).path
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        with self.server.lock:
+            self.server.received.append({
+                "method": method, "path": path, "body": body,
+                "authorization": self.headers.get("Authorization", ""),
+            })
+        status, payload, delay = self.server.reply(path, body)
+        time.sleep(delay)
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except OSError:
+            pass  # the client timed out and hung up
+
+    def do_GET(self):
+        self.respond("GET")
+
+    def do_POST(self):
+        self.respond("POST")
+
+    def log_message(self, *args):
+        pass
+
+
+class StubDarajaMixin:
+    """Points MpesaClient at a fresh StubDaraja for each test, with a clean token cache."""
+
+    read_timeout = 2
+
+    def setUp(self):
+        super().setUp()
+        self.daraja = StubDaraja()
+        self.addCleanup(self.daraja.close)
+        settings = override_settings(
+            CACHES=LOCMEM_CACHE, MPESA_BASE_URL=self.daraja.url,
+            MPESA_CONNECT_TIMEOUT=1, MPESA_READ_TIMEOUT=self.read_timeout,
+            MPESA_CONSUMER_KEY="key", MPESA_CONSUMER_SECRET="secret", MPESA_PASSKEY="pass",
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+
+
+class MpesaClientTests(StubDarajaMixin, TestCase):
+    read_timeout = 0.5
+
+    def test_token_is_cached_between_calls(self):
+        client = MpesaClient()
+        client.stk_push("254700000000", 100, 1)
+        MpesaClient().stk_query("ws_CO_1")
+        self.assertEqual(len(self.daraja.hits(TOKEN_PATH)), 1)
+        self.assertEqual(
+            [hit["authorization"] for hit in self.daraja.hits(PUSH_PATH) + self.daraja.hits(QUERY_PATH)],
+            ["Bearer token-1", "Bearer token-1"],
+        )
+
+    def test_token_is_refetched_once_expired(self):
+        self.daraja.replies[TOKEN_PATH] = [(200, {"access_token": "short", "expires_in": "120"}, 0)]
+        MpesaClient().stk_push("254700000000", 100, 1)
+        # Cached for a minute less than Safaricom's expiry
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=time.time() + 59):
+            MpesaClient().stk_push("254700000000", 100, 2)
+        with mock.patch("django.core.cache.backends.locmem.time.time", return_value=time.time() + 61):
+            MpesaClient().stk_push("254700000000", 100, 3)
+        self.assertEqual(
+            [hit["authorization"] for hit in self.daraja.hits(PUSH_PATH)],
+            ["Bearer short", "Bearer short", "Bearer token-1"],
+        )
+
+    def test_revoked_token_is_refreshed_and_the_call_retried(self):
+        self.daraja.replies[PUSH_PATH] = [(401, {"errorCode": "404.001.03", "errorMessage": "Invalid Access Token"}, 0)]
+        response = MpesaClient().stk_push("254700000000", 100, 1)
+        self.assertEqual(response["ResponseCode"], "0")
+        self.assertEqual(
+            [hit["authorization"] for hit in self.daraja.hits(PUSH_PATH)],
+            ["Bearer token-1", "Bearer token-2"],
+        )
+
+    def test_push_read_timeout_is_not_resent(self):
+        self.daraja.replies[PUSH_PATH] = [(200, {"ResponseCode": "0"}, 1.5)]
+        with self.assertRaises(MpesaTimeout):
+            MpesaClient().stk_push("254700000000", 100, 1)
+        self.assertEqual(len(self.daraja.hits(PUSH_PATH)), 1)
+
+    def test_push_gateway_error_is_not_resent(self):
+        self.daraja.replies[PUSH_PATH] = [(503, {"error": "upstream unavailable"}, 0)]
+        with self.assertRaises(MpesaTimeout):
+            MpesaClient().stk_push("254700000000", 100, 1)
+        self.assertEqual(len(self.daraja.hits(PUSH_PATH)), 1)
+
+    def test_token_gateway_error_is_retried(self):
+        self.daraja.replies[TOKEN_PATH] = [(503, {}, 0)]
+        self.assertEqual(MpesaClient().get_token(), "token-1")
+        self.assertEqual(len(self.daraja.hits(TOKEN_PATH)), 2)
+
+    def test_token_timeout_is_an_ordinary_error(self):
+        self.daraja.replies[TOKEN_PATH] = [(200, {"access_token": "late"}, 1.5)]
+        with self.assertRaises(MpesaError) as raised:
+            MpesaClient().get_token()
+        self.assertNotIsInstance(raised.exception, MpesaTimeout)
+
+    def test_connection_refused_is_an_ordinary_error(self):
+        self.daraja.close()
+        with self.assertRaises(MpesaError) as raised:
+            MpesaClient().stk_push("254700000000", 100, 1)
+        self.assertNotIsInstance(raised.exception, MpesaTimeout)
+
+
+class CheckoutPushTests(StubDarajaMixin, TestCase):
+    """Checkout only queues the push; Daraja hears about an order once it is committed."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("shopper", password="x")
+        Customer.objects.create(user=cls.user, name="Shopper", phone="0712345678")
+        cls.product = Product.objects.create(sku="DM-70", name="Dairy Meal 70kg", selling_price=3200)
+        StockTransaction.objects.record(cls.product, 5, StockTransaction.IN)
+
+    def checkout(self, quantity):
+        self.client.force_login(self.user)
+        self.client.post(reverse("inventory:add_many_to_cart"), {"product": self.product.pk, "quantity": quantity})
+        return self.client.post(reverse("inventory:checkout"), {"payment_method": "mpesa", "mpesa_phone": "0712345678"})
+
+    def run_jobs(self):
+        for claimed in claim_jobs():
+            run_job(claimed)
+
+    def test_push_is_sent_by_the_worker(self):
+        self.checkout(2)
+        sale = Sale.objects.get()
+        self.assertEqual(self.daraja.received, [])
+        self.run_jobs()
+        (push,) = self.daraja.hits(PUSH_PATH)
+        self.assertEqual(push["body"]["PhoneNumber"], "254712345678")
+        self.assertEqual(push["body"]["Amount"], 6400)
+        self.assertEqual(push["body"]["AccountReference"], f"Order{sale.pk}")
+        payment = MpesaTransaction.objects.get()
+        self.assertEqual((payment.sale, payment.checkout_request_id), (sale, "ws_CO_1"))
+
+    def test_rolled_back_checkout_never_pushes(self):
+        self.checkout(6)
+        self.assertFalse(Sale.objects.exists())
+        self.run_jobs()
+        self.assertEqual(self.daraja.received, [])
@@ -0,0 +1,87 @@
+from datetime import timedelta
+from itertools import count
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Customer, MpesaTransaction, Product, Sale, Supplier
+from inventory.services import record_purchase, record_sale
+
+_checkout_ids = count()
+
+
+class OrderListTests(TestCase):
+    """Both order lists cost a fixed number of queries per page and page by (date, pk) without gaps."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        cls.shopper = User.objects.create_user("shopper", password="x")
+        cls.customer = Customer.objects.create(user=cls.shopper, name="Shopper", phone="254700000000")
+        cls.products = [Product.objects.create(sku=f"P-{i}", name=f"Layers Mash {i}", selling_price=100) for i in range(3)]
+        record_purchase([(product, 1000, 60) for product in cls.products], supplier=Supplier.objects.create(name="Unga Ltd"))
+
+    def add_orders(self, number, lines=2, payments=1, start=None):
+        start = start or timezone.now() - timedelta(days=1)
+        for i in range(number):
+            sale = record_sale(
+                [(product, 1, 100) for product in self.products[:lines]],
+                customer=self.customer, status='PENDING', channel='WEB',
+                date=start + timedelta(microseconds=10 * i),
+            )
+            for _ in range(payments):
+                MpesaTransaction.objects.create(
+                    sale=sale, merchant_request_id="m", checkout_request_id=f"ws_CO_{next(_checkout_ids)}",
+                    amount=sale.total, phone=self.customer.phone,
+                )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, url):
+        self.add_orders(3)
+        small = self.count_queries(url)
+        self.add_orders(10, lines=3, payments=2)
+        self.assertEqual(self.count_queries(url), small, f"{url} runs more queries with more orders on the page")
+
+    def test_my_orders_queries(self):
+        self.client.force_login(self.shopper)
+        self.assertConstantQueries(reverse("inventory:my_orders"))
+
+    def test_staff_order_list_queries(self):
+        self.client.force_login(self.staff)
+        self.assertConstantQueries(reverse("inventory:order_list"))
+
+    def assertWalksForwardAndBack(self, url):
+        # Microseconds apart, so a cursor rounded to milliseconds would skip or repeat orders
+        self.add_orders(45)
+        expected = list(Sale.objects.order_by("-date", "-pk").values_list("pk", flat=True))
+
+        def page(**params):
+            page_obj = self.client.get(url, params).context["page_obj"]
+            return [order.pk for order in page_obj], page_obj
+
+        rows, page_obj = page()
+        pages = [rows]
+        while page_obj.has_next():
+            rows, page_obj = page(after=page_obj.next_cursor)
+            pages.append(rows)
+        self.assertEqual([pk for rows in pages for pk in rows], expected)
+        for expected_rows in reversed(pages[:-1]):
+            rows, page_obj = page(before=page_obj.previous_cursor)
+            self.assertEqual(rows, expected_rows)
+        self.assertFalse(page_obj.has_previous())
+
+    def test_my_orders_pages(self):
+        self.client.force_login(self.shopper)
+        self.assertWalksForwardAndBack(reverse("inventory:my_orders"))
+
+    def test_staff_order_list_pages(self):
+        self.client.force_login(self.staff)
+        self.assertWalksForwardAndBack(reverse("inventory:order_list"))
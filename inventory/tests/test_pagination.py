@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Product, StockTransaction
+from inventory.pagination import KeysetPage
+
+
+class KeysetPaginationTests(TestCase):
+    """Walking the stock history forward and back visits every row exactly once, in order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        product = Product.objects.create(sku="DM-70", name="Dairy Meal 70kg")
+        start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        # 70 rows inside one millisecond, as one bulk-recorded document writes
+        # them, then 40 rows 5 ms apart
+        moments = [start + timedelta(microseconds=10 * i) for i in range(70)]
+        moments += [start + timedelta(milliseconds=5 * i) for i in range(1, 41)]
+        StockTransaction.objects.bulk_create([
+            StockTransaction(product=product, quantity=1, transaction_type=StockTransaction.IN, timestamp=moment)
+            for moment in moments
+        ])
+        cls.expected = list(StockTransaction.objects.order_by("-timestamp", "-pk").values_list("pk", flat=True))
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def page(self, **params):
+        response = self.client.get(reverse("inventory:stock_history"), params)
+        self.assertEqual(response.status_code, 200)
+        page = response.context["page_obj"]
+        return [txn.pk for txn in page], page
+
+    def test_forward_and_back(self):
+        pages = []
+        rows, page = self.page()
+        pages.append(rows)
+        while page.has_next():
+            rows, page = self.page(after=page.next_cursor)
+            pages.append(rows)
+        self.assertEqual([pk for rows in pages for pk in rows], self.expected)
+
+        for expected in reversed(pages[:-1]):
+            rows, page = self.page(before=page.previous_cursor)
+            self.assertEqual(rows, expected)
+        self.assertFalse(page.has_previous())
+
+    def test_cursor_past_the_end(self):
+        # A link whose rows have since gone: seek after the oldest row
+        oldest = StockTransaction.objects.get(pk=self.expected[-1])
+        cursor = KeysetPage([oldest], ("-timestamp", "-pk"), True, False).next_cursor
+        rows, page = self.page(after=cursor)
+        self.assertEqual(rows, [])
+        self.assertTrue(page.has_previous())
+        self.assertEqual(page.previous_cursor, "")
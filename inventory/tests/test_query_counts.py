@@ -0,0 +1,78 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory.models import Category, Customer, Product, Supplier, Unit
+from inventory.services import record_purchase, record_sale
+
+LOCMEM_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+def add_products(count, start=0, **fields):
+    """
+    Products with stock bought in and some sold, so every listing has rows to
+    annotate; every other one is below its reorder level for the stock alerts.
+    """
+    products = [
+        Product.objects.create(
+            sku=f"TEST-{i:04d}", name=f"Test Feed {i}", selling_price=100, buying_price=60,
+            reorder_level=50 if i % 2 else 5, **fields
+        )
+        for i in range(start, start + count)
+    ]
+    record_purchase([(product, 20, 60) for product in products], supplier=Supplier.objects.first())
+    record_sale([(product, 2, 100) for product in products], customer=Customer.objects.first())
+    return products
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductListingQueryCountTests(TestCase):
+    """Every product listing reads annotated stock, so its query count does not grow with the page."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        cls.category = Category.objects.create(name="Animal Feeds")
+        cls.unit = Unit.objects.create(name="Bag", abbreviation="bag")
+        Supplier.objects.create(name="Unga Ltd")
+        Customer.objects.create(name="Walk-in")
+        add_products(4, category=cls.category, unit=cls.unit)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+
+    def assertConstantQueries(self, url, data=None):
+        def count():
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, data)
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        small = count()
+        add_products(5, start=100, category=self.category, unit=self.unit)
+        self.assertEqual(count(), small, f"{url} runs more queries with more products on the page")
+
+    def test_store_home(self):
+        self.client.logout()
+        self.assertConstantQueries(reverse("inventory:store_home"))
+
+    def test_store_category(self):
+        self.client.logout()
+        self.assertConstantQueries(reverse("inventory:store_home"), {"category": self.category.pk})
+
+    def test_dashboard_product_list(self):
+        self.assertConstantQueries(reverse("inventory:product_list"))
+
+    def test_dashboard_home(self):
+        self.assertConstantQueries(reverse("inventory:dashboard"))
+
+    def test_report(self):
+        self.assertConstantQueries(reverse("inventory:admin_report"), {"period": "monthly"})
+
+    def test_api_products(self):
+        self.assertConstantQueries("/api/products/")
@@ -0,0 +1,124 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from inventory.models import Customer, MpesaTransaction, Product, StockBalance, StockTransaction, Supplier
+from inventory.services import reconcile_payments, record_purchase, record_sale
+from inventory.utils import MpesaError
+
+PAID = {"ResponseCode": "0", "ResultCode": "0", "ResultDesc": "The service request is processed successfully."}
+CANCELLED = {"ResponseCode": "0", "ResultCode": "1032", "ResultDesc": "Request cancelled by user"}
+PROCESSING = {"errorCode": "500.001.1001", "errorMessage": "The transaction is being processed"}
+
+
+class FakeDaraja:
+    """Stands in for MpesaClient: answers stk_query from ``results``, raising any exception found there."""
+
+    def __init__(self, results):
+        self.results = results
+        self.queried = []
+
+    def stk_query(self, checkout_request_id):
+        self.queried.append(checkout_request_id)
+        result = self.results[checkout_request_id]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class ReconcilePaymentsTests(TestCase):
+    """Stale PENDING payments are settled from Daraja's answer; unpaid orders give their stock back."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = Customer.objects.create(name="Shopper", phone="254700000000")
+        cls.feed = Product.objects.create(sku="DM-70", name="Dairy Meal 70kg", selling_price=3200)
+        cls.seed = Product.objects.create(sku="MZ-2", name="Hybrid Maize 2kg", selling_price=450)
+        record_purchase([(cls.feed, 20, 2800), (cls.seed, 20, 400)], supplier=Supplier.objects.create(name="Unga Ltd"))
+
+    def order(self, checkout_id, *checkout_ids):
+        sale = record_sale(
+            [(self.feed, 2, 3200), (self.seed, 3, 450)], customer=self.customer, status='PENDING', channel='WEB'
+        )
+        for cid in (checkout_id,) + checkout_ids:
+            MpesaTransaction.objects.create(
+                sale=sale, checkout_request_id=cid, amount=sale.total, phone="254700000000"
+            )
+        return sale
+
+    def on_hand(self, product):
+        return StockBalance.objects.get(product=product).quantity
+
+    def reconcile(self, results):
+        return reconcile_payments(list(results), client=FakeDaraja(results))
+
+    def assertStatus(self, sale, sale_status, **payments):
+        sale.refresh_from_db()
+        self.assertEqual(sale.status, sale_status)
+        for checkout_id, status in payments.items():
+            self.assertEqual(MpesaTransaction.objects.get(checkout_request_id=checkout_id).status, status)
+
+    def test_paid_order_is_completed(self):
+        sale = self.order("ws_1")
+        self.assertEqual(self.reconcile({"ws_1": PAID}), (1, 0, 0))
+        self.assertStatus(sale, 'COMPLETED', ws_1='COMPLETED')
+        self.assertEqual(self.on_hand(self.feed), 18)
+
+    def test_unpaid_orders_are_cancelled_with_bulk_reversals(self):
+        sales = [self.order(f"ws_{i}") for i in range(3)]
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.reconcile({f"ws_{i}": CANCELLED for i in range(3)}), (0, 3, 0))
+        for i, sale in enumerate(sales):
+            self.assertStatus(sale, 'CANCELLED', **{f"ws_{i}": 'FAILED'})
+            self.assertEqual(
+                set(StockTransaction.objects.filter(reference=f"Unpaid Order #{sale.pk}").values_list("product_id", "quantity")),
+                {(self.feed.pk, 2), (self.seed.pk, 3)},
+            )
+        self.assertEqual((self.on_hand(self.feed), self.on_hand(self.seed)), (20, 20))
+        inserts = [q for q in queries.captured_queries if q["sql"].startswith('INSERT INTO "inventory_stocktransaction"')]
+        self.assertEqual(len(inserts), 1, "reversals are written one row at a time")
+
+    def test_unanswered_payments_stay_pending(self):
+        processing, unreachable = self.order("ws_1"), self.order("ws_2")
+        results = {"ws_1": PROCESSING, "ws_2": MpesaError("connection refused")}
+        with self.assertLogs("inventory.services", "WARNING"):
+            self.assertEqual(self.reconcile(results), (0, 0, 2))
+        self.assertStatus(processing, 'PENDING', ws_1='PENDING')
+        self.assertStatus(unreachable, 'PENDING', ws_2='PENDING')
+        self.assertEqual(self.on_hand(self.feed), 16)
+
+    def test_order_with_another_live_payment_is_kept(self):
+        # The customer retried from My Orders and the second push is still open
+        sale = self.order("ws_1", "ws_2")
+        self.assertEqual(self.reconcile({"ws_1": CANCELLED}), (0, 1, 0))
+        self.assertStatus(sale, 'PENDING', ws_1='FAILED', ws_2='PENDING')
+        self.assertEqual(self.on_hand(self.feed), 18)
+
+    def test_settled_payment_is_left_alone(self):
+        sale = self.order("ws_1")
+        self.reconcile({"ws_1": CANCELLED})
+        self.reconcile({"ws_1": PAID})
+        self.assertStatus(sale, 'CANCELLED', ws_1='FAILED')
+        self.assertEqual(StockTransaction.objects.filter(reference=f"Unpaid Order #{sale.pk}").count(), 2)
+
+    def test_command_queries_only_stale_payments(self):
+        stale = [self.order(f"ws_{i}") for i in range(5)]
+        fresh = self.order("ws_new")
+        MpesaTransaction.objects.exclude(checkout_request_id="ws_new").update(
+            date_created=timezone.now() - timedelta(minutes=30)
+        )
+        daraja = FakeDaraja({f"ws_{i}": PAID if i % 2 else CANCELLED for i in range(5)})
+        out = StringIO()
+        with mock.patch("inventory.services.MpesaClient", return_value=daraja):
+            call_command("reconcile_payments", "--older-than=10", "--batch=2", stdout=out)
+        self.assertEqual(sorted(daraja.queried), [f"ws_{i}" for i in range(5)])
+        self.assertIn("Completed 2, failed 3, still pending 0.", out.getvalue())
+        for i, sale in enumerate(stale):
+            self.assertStatus(sale, 'COMPLETED' if i % 2 else 'CANCELLED')
+        self.assertStatus(fresh, 'PENDING', ws_new='PENDING')
@@ -0,0 +1,47 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+
+from inventory.models import Product
+
+from .test_query_counts import LOCMEM_CACHE
+
+
+@skipUnless(connection.vendor == "postgresql", "Full-text search needs PostgreSQL")
+@override_settings(CACHES=LOCMEM_CACHE)
+class ProductSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dairy = Product.objects.create(sku="DM-70", name="Unga Dairy Meal 70kg")
+        cls.layers = Product.objects.create(
+            sku="LM-70", name="Layers Mash 70kg", description="Balanced ration; use dairy meal for cows.",
+        )
+        cls.oxytet = Product.objects.create(sku="OXY-100", name="Oxytetracycline 20% LA 100ml")
+        Product.objects.create(sku="KNAP-16", name="Knapsack Sprayer 16L")
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        return list(Product.objects.search(query))
+
+    def test_word_prefixes_match(self):
+        self.assertEqual(self.search("dai")[0], self.dairy)
+        self.assertEqual(self.search("oxytet"), [self.oxytet])
+        self.assertEqual(self.search("unga dai 70"), [self.dairy])
+
+    def test_name_matches_rank_above_description(self):
+        self.assertEqual(self.search("dairy meal"), [self.dairy, self.layers])
+
+    def test_misspelling_is_corrected(self):
+        self.assertEqual(self.search("diary meal")[0], self.dairy)
+        self.assertEqual(self.search("oxytetracyclne"), [self.oxytet])
+
+    def test_exact_sku(self):
+        self.assertEqual(self.search("KNAP-16")[0].sku, "KNAP-16")
+
+    def test_no_match(self):
+        self.assertEqual(self.search("zebra"), [])
+        self.assertEqual(self.search("  %% "), [])
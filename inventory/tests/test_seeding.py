@@ -0,0 +1,41 @@
+from datetime import datetime
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import transaction
+from django.db.models import Max
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import Sale, StockTransaction
+from inventory.seeding import seeded_with
+
+
+class SeedDataTests(TestCase):
+    """seed_data dates its history back from --now and records it with the seed."""
+
+    def seed(self, *args):
+        call_command(
+            "seed_data", "--scale=0.0001", "--products=100000", "--customers=100000", "--sales=200000",
+            *args, stdout=StringIO(),
+        )
+
+    def rows(self):
+        return (
+            list(Sale.objects.order_by("date", "total").values_list("date", "total", "status")),
+            sorted(StockTransaction.objects.values_list("timestamp", "quantity", "transaction_type")),
+        )
+
+    def test_same_seed_and_now_give_the_same_history(self):
+        now = timezone.make_aware(datetime(2025, 6, 30))
+        with transaction.atomic():
+            self.seed("--seed=3", "--now=2025-06-30")
+            self.assertEqual(seeded_with(), {"seed": 3, "now": now})
+            self.assertLess(Sale.objects.aggregate(last=Max("date"))["last"], now)
+            first = self.rows()
+            transaction.set_rollback(True)
+        self.seed("--seed=3", "--now=2025-06-30")
+        self.assertEqual(self.rows(), first)
+
+    def test_unseeded_database(self):
+        self.assertIsNone(seeded_with())
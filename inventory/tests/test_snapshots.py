@@ -0,0 +1,125 @@
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from inventory.models import ArchivedStockTransaction, Product, StockSnapshot, StockTransaction
+from inventory.services import archive_stock_ledger
+
+
+def local(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class StockSnapshotTests(TestCase):
+    """Snapshots plus later ledger rows give the same stock as the whole ledger, before and after archiving."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.feed = Product.objects.create(sku="DM-70", name="Dairy Meal 70kg", selling_price=3200)
+        cls.seed = Product.objects.create(sku="MZ-2", name="Hybrid Maize 2kg", selling_price=450)
+        # Movements either side of midnight on the first of each month
+        moves = [
+            (cls.feed, 50, local(2025, 1, 15, 9)), (cls.seed, 20, local(2025, 1, 31, 23, 59)),
+            (cls.feed, -12, local(2025, 2, 1, 0, 0)), (cls.seed, -5, local(2025, 2, 28, 18)),
+            (cls.feed, 30, local(2025, 3, 1, 0, 1)), (cls.seed, -3, local(2025, 3, 31, 23, 30)),
+            (cls.feed, -8, local(2025, 4, 2, 10)), (cls.seed, 40, local(2025, 4, 20, 16)),
+        ]
+        StockTransaction.objects.bulk_create(
+            StockTransaction(
+                product=product, quantity=qty, timestamp=at,
+                transaction_type=StockTransaction.IN if qty > 0 else StockTransaction.OUT,
+            )
+            for product, qty, at in moves
+        )
+        cls.moves = moves
+        cls.now = local(2025, 5, 10, 12)
+
+    def ledger_at(self, when):
+        quantities = {}
+        for product, qty, at in self.moves:
+            if at < when:
+                quantities[product.pk] = quantities.get(product.pk, 0) + qty
+        return quantities
+
+    def take_snapshots(self):
+        for as_of in StockSnapshot.due(self.now):
+            StockSnapshot.take(as_of)
+
+    def assertMatchesLedger(self):
+        for when in [local(2025, 1, 20), local(2025, 2, 1), local(2025, 2, 1, 0, 0, 1), local(2025, 3, 15),
+                     local(2025, 4, 1), local(2025, 4, 25), self.now]:
+            with self.subTest(when=when):
+                self.assertEqual(StockSnapshot.stock_at(when), self.ledger_at(when))
+                self.assertEqual(self.feed.stock_as_of(when), self.ledger_at(when).get(self.feed.pk, 0))
+
+    def test_snapshots_plus_deltas_match_the_ledger(self):
+        self.assertMatchesLedger()
+        self.take_snapshots()
+        self.assertEqual(
+            dict(StockSnapshot.objects.filter(as_of=local(2025, 3, 1)).values_list("product_id", "quantity")),
+            {self.feed.pk: Decimal("38"), self.seed.pk: Decimal("15")},
+        )
+        self.assertMatchesLedger()
+
+        self.assertEqual(archive_stock_ledger(local(2025, 3, 1), batch_size=2), 4)
+        self.assertEqual(ArchivedStockTransaction.objects.count(), 4)
+        self.assertFalse(StockTransaction.objects.filter(timestamp__lt=local(2025, 3, 1)).exists())
+        self.assertMatchesLedger()
+        self.assertEqual(StockTransaction.objects.totals(), self.ledger_at(self.now))
+
+    def test_archiving_needs_a_snapshot_at_the_cutoff(self):
+        with self.assertRaises(ValueError):
+            archive_stock_ledger(local(2025, 3, 1))
+        self.assertFalse(ArchivedStockTransaction.objects.exists())
+
+    def test_totals_read_live_and_archived_rows_in_one_query(self):
+        self.take_snapshots()
+        archive_stock_ledger(local(2025, 3, 1))
+        with self.assertNumQueries(1):
+            totals = StockTransaction.objects.totals(local(2025, 2, 1), local(2025, 4, 1), [self.feed.pk])
+        self.assertEqual(totals, {self.feed.pk: Decimal("18")})
+
+
+class SnapshotDueTests(TestCase):
+    """due() lists the local month starts after the first ledger row that have settled and aren't taken yet."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.feed = Product.objects.create(sku="DM-70", name="Dairy Meal 70kg", selling_price=3200)
+
+    def move(self, at, model=StockTransaction, **extra):
+        model.objects.create(product=self.feed, quantity=1, transaction_type=StockTransaction.IN, timestamp=at, **extra)
+
+    def test_empty_ledger(self):
+        self.assertEqual(StockSnapshot.due(local(2025, 5, 1)), [])
+
+    def test_month_starts_after_the_first_row(self):
+        self.move(local(2025, 1, 15))
+        self.assertEqual(StockSnapshot.due(local(2025, 4, 15)), [local(2025, 2, 1), local(2025, 3, 1), local(2025, 4, 1)])
+
+    def test_row_at_midnight_on_the_first(self):
+        self.move(local(2025, 2, 1))
+        self.assertEqual(StockSnapshot.due(local(2025, 4, 15)), [local(2025, 3, 1), local(2025, 4, 1)])
+
+    def test_month_is_due_only_after_the_delay(self):
+        self.move(local(2025, 1, 15))
+        self.assertEqual(StockSnapshot.due(local(2025, 3, 1, 0, 30)), [local(2025, 2, 1)])
+        self.assertEqual(StockSnapshot.due(local(2025, 3, 1, 1, 0)), [local(2025, 2, 1), local(2025, 3, 1)])
+
+    def test_year_end_and_taken_months(self):
+        self.move(local(2024, 11, 30, 23, 59))
+        StockSnapshot.take(local(2024, 12, 1))
+        self.assertEqual(StockSnapshot.due(local(2025, 2, 10)), [local(2025, 1, 1), local(2025, 2, 1)])
+
+    def test_archived_rows_count_as_history(self):
+        self.move(local(2025, 3, 5))
+        self.move(local(2024, 12, 20), model=ArchivedStockTransaction, id=999)
+        self.assertEqual(StockSnapshot.due(local(2025, 2, 10))[0], local(2025, 1, 1))
+
+    def test_boundaries_are_local_midnight(self):
+        self.move(local(2025, 1, 15))
+        boundary = StockSnapshot.due(local(2025, 2, 15))[0]
+        self.assertEqual(timezone.localtime(boundary).timetuple()[:6], (2025, 2, 1, 0, 0, 0))
+        self.assertNotEqual(boundary, datetime(2025, 2, 1, tzinfo=dt_timezone.utc))
@@ -0,0 +1,79 @@
+import uuid
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from inventory.models import Product, Sale, StockBalance, StockTransaction
+
+
+class OfflineSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("till", password="x", is_staff=True)
+        cls.dairy = Product.objects.create(sku="DM-70", name="Dairy Meal 70kg", selling_price=3200)
+        cls.layers = Product.objects.create(sku="LM-70", name="Layers Mash 70kg", selling_price=2900)
+        cls.sprayer = Product.objects.create(sku="KNAP-16", name="Knapsack Sprayer 16L", selling_price=4500)
+        for product in (cls.dairy, cls.layers, cls.sprayer):
+            StockTransaction.objects.record(product, 50, StockTransaction.IN)
+
+    def setUp(self):
+        self.client.force_login(self.staff)
+
+    def push(self, sales):
+        response = self.client.post(reverse("inventory:sync_push"), {"sales": sales}, content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["sales"]
+
+    def offline_sale(self, product, quantity=1, client_uuid=None):
+        return {
+            "client_uuid": str(client_uuid or uuid.uuid4()),
+            "items": [{"product": product.pk, "quantity": str(quantity), "unit_price": str(product.selling_price)}],
+        }
+
+    def on_hand(self, product):
+        return StockBalance.objects.get(product=product).quantity
+
+    def test_repush_is_idempotent(self):
+        batch = [self.offline_sale(self.dairy, 2), self.offline_sale(self.layers, 3)]
+        first = self.push(batch)
+        again = self.push(batch)
+        self.assertEqual([row["created"] for row in first], [True, True])
+        self.assertEqual([row["created"] for row in again], [False, False])
+        self.assertEqual([row["sale_id"] for row in again], [row["sale_id"] for row in first])
+        self.assertEqual(Sale.objects.count(), 2)
+        self.assertEqual(self.on_hand(self.dairy), 48)
+        self.assertEqual(self.on_hand(self.layers), 47)
+
+    def test_duplicate_uuid_in_one_batch(self):
+        sale = self.offline_sale(self.dairy, 5)
+        self.assertEqual(len(self.push([sale, sale])), 1)
+        self.assertEqual(self.on_hand(self.dairy), 45)
+
+    def test_pull_returns_changes_and_deletions_since_cursor(self):
+        full = self.client.get(reverse("inventory:sync_pull")).json()
+        self.assertEqual({row["sku"] for row in full["products"]}, {"DM-70", "LM-70", "KNAP-16"})
+        self.assertEqual(full["deleted"], [])
+
+        # Everything so far is older than the cursor's overlap window
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Product.objects.update(updated_at=an_hour_ago)
+        StockBalance.objects.update(updated_at=an_hour_ago)
+        cursor = (timezone.now() - timedelta(minutes=5)).isoformat()
+        self.assertEqual(self.client.get(reverse("inventory:sync_pull"), {"since": cursor}).json()["products"], [])
+
+        self.dairy.selling_price = 3300
+        self.dairy.save()
+        StockTransaction.objects.record(self.layers, -1, StockTransaction.OUT)
+        sprayer_id = self.sprayer.pk
+        self.sprayer.delete()
+
+        delta = self.client.get(reverse("inventory:sync_pull"), {"since": cursor}).json()
+        self.assertEqual([row["sku"] for row in delta["products"]], ["DM-70", "LM-70"])
+        self.assertEqual(delta["products"][0]["selling_price"], "3300.00")
+        self.assertEqual(delta["deleted"], [sprayer_id])
+
+    def test_pull_rejects_bad_cursor(self):
+        self.assertEqual(self.client.get(reverse("inventory:sync_pull"), {"since": "yesterday"}).status_code, 400)
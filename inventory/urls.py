@@ -1,8 +1,14 @@
-from django.urls import path
+from django.urls import path, include
+from rest_framework.routers import DefaultRouter
 from . import views
 
 app_name = "inventory"
 
+router = DefaultRouter()
+router.register("products", views.ProductViewSet)
+router.register("suppliers", views.SupplierViewSet)
+router.register("customers", views.CustomerViewSet)
+
 urlpatterns = [
     # ... (Keep existing Auth & Store URLs) ...
     path("login-redirect/", views.login_success_view, name="login_redirect"),
@@ -11,9 +17,11 @@ urlpatterns = [
     path("store/my-orders/", views.CustomerOrderListView.as_view(), name="my_orders"),
     path("store/product/<int:pk>/", views.StoreProductDetailView.as_view(), name="store_product_detail"),
     path("store/cart/", views.cart_view, name="cart"),
+    path("store/cart/add/", views.add_many_to_cart, name="add_many_to_cart"),
     path("store/cart/add/<int:pk>/", views.add_to_cart, name="add_to_cart"),
     path("store/cart/clear/", views.clear_cart, name="clear_cart"),
     path("store/checkout/", views.checkout_view, name="checkout"),
+    path("mpesa/callback/", views.mpesa_callback, name="mpesa_callback"),
 
     # --- Admin Interface (Dashboard) ---
     path("dashboard/", views.DashboardHomeView.as_view(), name="dashboard"),
@@ -21,7 +29,10 @@ urlpatterns = [
     # NEW: Report Generation URL
     path("dashboard/report/", views.AdminReportView.as_view(), name="admin_report"),
 
+    path("dashboard/metrics/", views.RequestMetricsView.as_view(), name="request_metrics"),
+    path("dashboard/export/<str:dataset>/", views.export_view, name="export"),
     path("dashboard/stock-history/", views.StockTransactionListView.as_view(), name="stock_history"),
+    path("dashboard/stock-as-of/", views.StockAsOfView.as_view(), name="stock_as_of"),
     path("dashboard/orders/", views.OrderListView.as_view(), name="order_list"),
     path("dashboard/orders/<int:pk>/approve/", views.approve_order, name="approve_order"),
     path("dashboard/sales/add/", views.pos_sale_create_view, name="sale_add"),
@@ -30,6 +41,7 @@ urlpatterns = [
     # ... (Keep existing Management URLs for Products, Suppliers, etc.) ...
     path("dashboard/products/", views.ProductListView.as_view(), name="product_list"),
     path("dashboard/products/add/", views.ProductCreateView.as_view(), name="product_add"),
+    path("dashboard/products/import/", views.product_import_view, name="product_import"),
     path("dashboard/products/<int:pk>/edit/", views.ProductUpdateView.as_view(), name="product_edit"),
     path("dashboard/products/<int:pk>/delete/", views.ProductDeleteView.as_view(), name="product_delete"),
     path("dashboard/suppliers/", views.SupplierListView.as_view(), name="supplier_list"),
@@ -44,4 +56,10 @@ urlpatterns = [
     path("dashboard/units/add/", views.UnitCreateView.as_view(), name="unit_add"),
     path("dashboard/units/<int:pk>/edit/", views.UnitUpdateView.as_view(), name="unit_edit"),
     path("dashboard/units/<int:pk>/delete/", views.UnitDeleteView.as_view(), name="unit_delete"),
+
+    # --- REST API ---
+    path("api/stock/as-of/", views.StockAsOfAPIView.as_view(), name="stock_as_of_api"),
+    path("api/sync/pull/", views.SyncPullView.as_view(), name="sync_pull"),
+    path("api/sync/push/", views.SyncPushView.as_view(), name="sync_push"),
+    path("api/", include(router.urls)),
 ]
\ No newline at end of file
@@ -1,26 +1,104 @@
-import requests
 import base64
-from django.conf import settings
 from datetime import datetime
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from django.conf import settings
+from django.core.cache import cache
+
+
+class MpesaError(Exception):
+    """Daraja could not be reached or returned an unusable response."""
+
+
+class MpesaTimeout(MpesaError):
+    """A POST was sent but its reply timed out, so Daraja may already have acted on it."""
+
+
+_session = None
+
+def get_session():
+    """Process-wide keep-alive session so Daraja calls reuse pooled TLS connections."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        # Connection failures are retried with backoff, and so are gateway
+        # errors on GETs. A POST that reached the gateway is never resent: it
+        # may already have been processed.
+        retry = Retry(
+            total=3, connect=3, read=0, status=2, backoff_factor=0.5,
+            status_forcelist=(502, 503, 504), allowed_methods=frozenset({"GET"}),
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=settings.MPESA_POOL_SIZE, max_retries=retry)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _session = session
+    return _session
+
+
 class MpesaClient:
+    TOKEN_CACHE_KEY = "mpesa:access_token"
+
     def __init__(self):
         self.consumer_key = settings.MPESA_CONSUMER_KEY
         self.consumer_secret = settings.MPESA_CONSUMER_SECRET
         self.shortcode = settings.MPESA_SHORTCODE
         self.passkey = settings.MPESA_PASSKEY
+        self.base_url = settings.MPESA_BASE_URL.rstrip("/")
+        self.timeout = (settings.MPESA_CONNECT_TIMEOUT, settings.MPESA_READ_TIMEOUT)
+        self.session = get_session()
+
+    def _request(self, method, path, **kwargs):
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        except requests.ReadTimeout as exc:
+            if method == "GET":
+                raise MpesaError(f"M-Pesa {path} failed: {exc}") from exc
+            raise MpesaTimeout(f"M-Pesa {path} timed out after sending: {exc}") from exc
+        except requests.RequestException as exc:
+            raise MpesaError(f"M-Pesa {path} failed: {exc}") from exc
+        if response.status_code >= 500 and method != "GET":
+            # A gateway error does not say whether Daraja acted on the POST
+            raise MpesaTimeout(f"M-Pesa {path} failed after sending: HTTP {response.status_code}")
+        try:
+            return response.json()
+        except ValueError as exc:
+            raise MpesaError(f"M-Pesa {path} failed: {exc}") from exc
 
     def get_token(self):
-        url = "https://sandbox.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
-        response = requests.get(url, auth=(self.consumer_key, self.consumer_secret))
-        return response.json().get('access_token')
+        """OAuth token, cached until shortly before Safaricom expires it."""
+        token = cache.get(self.TOKEN_CACHE_KEY)
+        if token:
+            return token
+        data = self._request(
+            "GET", "/oauth/v1/generate?grant_type=client_credentials",
+            auth=(self.consumer_key, self.consumer_secret),
+        )
+        token = data.get('access_token')
+        if not token:
+            raise MpesaError(f"M-Pesa token request rejected: {data}")
+        expires_in = int(data.get('expires_in', 3599))
+        cache.set(self.TOKEN_CACHE_KEY, token, max(expires_in - 60, 1))
+        return token
 
-    def stk_push(self, phone, amount, order_id):
-        token = self.get_token()
+    def _password(self):
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         password = base64.b64encode(f"{self.shortcode}{self.passkey}{timestamp}".encode()).decode()
-        
-        headers = {"Authorization": f"Bearer {token}"}
+        return password, timestamp
+
+    def _post(self, path, payload):
+        headers = {"Authorization": f"Bearer {self.get_token()}"}
+        data = self._request("POST", path, json=payload, headers=headers)
+        if data.get('errorCode') == '404.001.03':
+            # Token revoked before its advertised expiry: refresh once and retry
+            cache.delete(self.TOKEN_CACHE_KEY)
+            headers = {"Authorization": f"Bearer {self.get_token()}"}
+            data = self._request("POST", path, json=payload, headers=headers)
+        return data
+
+    def stk_push(self, phone, amount, order_id):
+        password, timestamp = self._password()
         payload = {
             "BusinessShortCode": self.shortcode,
             "Password": password,
@@ -34,7 +112,16 @@ class MpesaClient:
             "AccountReference": f"Order{order_id}",
             "TransactionDesc": "Agrovet Purchase"
         }
-        
-        url = "https://sandbox.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
-        response = requests.post(url, json=payload, headers=headers)
-        return response.json()
\ No newline at end of file
+        return self._post("/mpesa/stkpush/v1/processrequest", payload)
+
+    def stk_query(self, checkout_request_id):
+        """Status of an earlier STK push, for payments whose callback never arrived."""
+        password, timestamp = self._password()
+        payload = {
+            "BusinessShortCode": self.shortcode,
+            "Password": password,
+            "Timestamp": timestamp,
+            "CheckoutRequestID": checkout_request_id,
+        }
+        return self._post("/mpesa/stkpushquery/v1/query", payload)
+
@@ -1,31 +1,51 @@
+import io
 import json
-import threading
 from django.shortcuts import redirect, get_object_or_404, render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.urls import reverse_lazy
 from django.views.generic import TemplateView, ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth import login
 from django.db import transaction
-from django.db.models import Sum, Q, F
+from django.db.models import Sum, Count, Q, F, Prefetch
+from django.db.models.functions import Coalesce
+from django.core.paginator import Paginator
 from django.utils import timezone
-from django.http import JsonResponse, HttpResponse
+from django.utils.dateparse import parse_date, parse_datetime
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.conf import settings
-from django.core.mail import send_mail
 from datetime import timedelta
-from rest_framework import viewsets
+from decimal import Decimal
+from rest_framework import permissions, viewsets
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from .models import (
-    Product, Supplier, Customer, Purchase, Sale, SaleItem, 
-    StockTransaction, Category, Unit, MpesaTransaction
+    Product, ProductTombstone, Supplier, Customer, Sale, SaleItem, StockTransaction, StockBalance, StockSnapshot,
+    Category, CategoryClosure, Unit, MpesaCallback, MpesaTransaction, DailySalesSummary
 )
 from .forms import (
     ProductForm, SupplierForm, CustomerForm, PurchaseItemFormSet, SaleItemFormSet, 
-    CustomerSignupForm, CategoryForm, UnitForm
+    CustomerSignupForm, CategoryForm, UnitForm, ProductImportUploadForm
+)
+from .serializers import (
+    ProductSerializer, SupplierSerializer, CustomerSerializer,
+    SyncProductSerializer, OfflineSaleSerializer
+)
+from .cache import cached_catalogue, cached_stock_fragment
+from .cart import availability
+from .pagination import KeysetPaginationMixin
+from .exports import EXPORTS, export_rows, csv_lines, day_bounds
+from .imports import import_products
+from .metrics import buffer as metrics_buffer
+from .jobs import send_order_confirmation, mpesa_stk_push
+from .services import (
+    InsufficientStock, record_sale, record_purchase, apply_offline_sales, complete_pending_sales
 )
-from .serializers import ProductSerializer, SupplierSerializer, CustomerSerializer
-from .utils import MpesaClient
 
 # ==========================================
 # AUTH & REDIRECTS
@@ -59,70 +79,168 @@ class StoreHomeView(ListView):
     paginate_by = 9
 
     def get_queryset(self):
-        qs = Product.objects.filter(active=True)
-        query = self.request.GET.get('q')
-        if query:
-            qs = qs.filter(Q(name__icontains=query) | Q(description__icontains=query) | Q(sku__icontains=query))
+        qs = Product.objects.filter(active=True).with_stock().select_related('category', 'unit')
         cat_id = self.request.GET.get('category')
         if cat_id:
             try:
-                qs = qs.filter(category_id=int(cat_id))
+                qs = qs.in_category(int(cat_id))
             except ValueError:
                 pass
+        query = self.request.GET.get('q')
+        if query:
+            return qs.search(query)
         return qs.order_by('name')
 
+    def page_context(self):
+        if not hasattr(self, '_page_context'):
+            self._page_context = super().get_context_data(object_list=self.object_list)
+        return self._page_context
+
+    def render_category_menu(self, current):
+        """
+        Sidebar tree and breadcrumbs for the selected category: the roots,
+        plus the children of every category on the path down to it, each
+        with its subtree's active product count.
+        """
+        categories = {c['id']: c for c in Category.objects.values('id', 'name', 'parent_id').order_by('name')}
+        counts = dict(
+            CategoryClosure.objects.values_list('ancestor_id')
+            .annotate(n=Count('descendant__product', filter=Q(descendant__product__active=True)))
+        )
+        children = {}
+        for cat in categories.values():
+            children.setdefault(cat['parent_id'], []).append(cat)
+        path = []
+        node = categories.get(current)
+        while node and node not in path:
+            path.insert(0, node)
+            node = categories.get(node['parent_id'])
+        expanded = {cat['id'] for cat in path}
+
+        entries = []
+        def walk(parent_id, depth):
+            for cat in children.get(parent_id, []):
+                entries.append({**cat, 'depth': depth, 'count': counts.get(cat['id'], 0), 'active': cat['id'] == current})
+                if cat['id'] in expanded:
+                    walk(cat['id'], depth + 1)
+        walk(None, 0)
+        return {
+            'menu': render_to_string("store/_category_menu.html", {'entries': entries, 'current': current}),
+            'breadcrumbs': render_to_string("store/_category_breadcrumbs.html", {'path': path}),
+        }
+
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.all()
-        context['current_query'] = self.request.GET.get('q', '')
-        context['current_category'] = self.request.GET.get('category', '')
-        cart = self.request.session.get('cart', {})
-        context['cart_count'] = sum(cart.values())
+        # Warm-cache hits skip the paginated product query entirely
+        context = {
+            'view': self,
+            'current_query': self.request.GET.get('q', ''),
+            'current_category': self.request.GET.get('category', ''),
+        }
+        params = (context['current_query'], context['current_category'], self.request.GET.get('page', ''))
+        try:
+            current = int(context['current_category'])
+        except ValueError:
+            current = None
+        category_nav = cached_catalogue("category_menu", (current,), lambda: self.render_category_menu(current))
+        context['category_menu'] = mark_safe(category_nav['menu'])
+        context['category_breadcrumbs'] = mark_safe(category_nav['breadcrumbs'])
+        # The page's products depend only on the catalogue; the rendered grid
+        # also on their stock
+        product_ids = cached_catalogue(
+            "product_grid_ids", params, lambda: [p.pk for p in self.page_context()['object_list']]
+        )
+        context['product_grid'] = mark_safe(cached_stock_fragment(
+            "product_grid", params, product_ids,
+            lambda: render_to_string("store/_product_grid.html", {**context, **self.page_context()}),
+        ))
+        context['cart_count'] = self.request.cart.count
         return context
 
 class StoreProductDetailView(DetailView):
     model = Product
     template_name = "store/product_detail.html"
     context_object_name = "product"
+    queryset = Product.objects.with_stock().select_related('category', 'unit')
+
+    def get(self, request, *args, **kwargs):
+        def build():
+            self.object = self.get_object()
+            path = list(self.object.category.ancestors()) if self.object.category_id else []
+            html = render_to_string("store/_product_detail.html", {"product": self.object, "category_path": path})
+            return {"name": self.object.name, "html": html}
+        panel = cached_stock_fragment("product_detail", (self.kwargs['pk'],), [self.kwargs['pk']], build)
+        return render(request, self.template_name, {
+            'product_name': panel['name'],
+            'product_panel': mark_safe(panel['html']),
+        })
+
+def _add_to_cart(request, quantities):
+    """Add {pk: qty} to the cart where stock allows, with one cached availability lookup."""
+    stock = availability(quantities)
+    accepted = {}
+    for pk, qty in quantities.items():
+        info = stock.get(pk)
+        if info is None:
+            continue
+        if request.cart.quantity(pk) + qty > info['on_hand']:
+            if info['on_hand'] <= 0:
+                messages.error(request, f"{info['name']} is out of stock.")
+            else:
+                messages.error(request, f"Only {float(info['on_hand']):g} of {info['name']} available.")
+            continue
+        accepted[pk] = qty
+        messages.success(request, f"{info['name']} added to cart.")
+    if accepted:
+        request.cart.add_many(accepted)
+    return stock
 
 def add_to_cart(request, pk):
-    product = get_object_or_404(Product, pk=pk)
-    if product.stock_quantity <= 0:
-        messages.error(request, "Item is out of stock.")
-        return redirect('inventory:store_home')
-    cart = request.session.get('cart', {})
-    cart[str(pk)] = cart.get(str(pk), 0) + 1
-    request.session['cart'] = cart
-    messages.success(request, f"{product.name} added to cart.")
+    if pk not in _add_to_cart(request, {pk: 1}):
+        raise Http404("No Product matches the given query.")
     return redirect('inventory:store_home')
 
+@require_POST
+def add_many_to_cart(request):
+    """Batch add: parallel `product` and `quantity` fields, e.g. from a re-order list."""
+    quantities = {}
+    for pk, qty in zip(request.POST.getlist('product'), request.POST.getlist('quantity')):
+        try:
+            pk, qty = int(pk), int(qty)
+        except ValueError:
+            continue
+        if qty > 0:
+            quantities[pk] = quantities.get(pk, 0) + qty
+    if quantities:
+        _add_to_cart(request, quantities)
+    return redirect('inventory:cart')
+
 def clear_cart(request):
-    request.session['cart'] = {}
+    request.cart.clear()
     return redirect('inventory:store_home')
 
 def cart_view(request):
-    cart = request.session.get('cart', {})
+    cart = request.cart
     items = []
     total = 0
     if cart:
-        products = Product.objects.filter(pk__in=cart.keys())
+        products = Product.objects.filter(pk__in=cart.items)
         for p in products:
-            qty = cart[str(p.pk)]
+            qty = cart.quantity(p.pk)
             line_total = p.selling_price * qty
             items.append({'product': p, 'quantity': qty, 'line_total': line_total})
             total += line_total
     return render(request, "store/cart.html", {'items': items, 'total': total})
 
 def checkout_view(request):
-    cart = request.session.get('cart', {})
+    cart = request.cart
     
     # Calculate totals for the initial GET request (Standard Checkout)
     total = 0
     items_with_details = []
     if cart:
-        products = Product.objects.filter(pk__in=cart.keys())
+        products = Product.objects.filter(pk__in=cart.items)
         for p in products:
-            qty = cart[str(p.pk)]
+            qty = cart.quantity(p.pk)
             line_total = p.selling_price * qty
             total += line_total
             items_with_details.append({'product': p, 'quantity': qty, 'line_total': line_total})
@@ -143,7 +261,6 @@ def checkout_view(request):
                 if sale.status != 'PENDING':
                     messages.error(request, "This order is already processed or cancelled.")
                     return redirect('inventory:my_orders')
-                total_to_pay = sale.total
             
             # CASE 2: New Checkout from Cart
             else:
@@ -155,101 +272,104 @@ def checkout_view(request):
                     defaults={'name': request.user.username, 'email': request.user.email}
                 )
 
-                # Validate Stock
-                for pk, qty in cart.items():
-                    product = get_object_or_404(Product, pk=pk)
-                    if product.stock_quantity < qty:
-                        messages.error(request, f"Insufficient stock for {product.name}.")
-                        return redirect('inventory:cart')
-
-                sale = Sale.objects.create(customer=customer, total=total, status='PENDING', channel='WEB')
-                
-                for pk, qty in cart.items():
-                    product = get_object_or_404(Product, pk=pk)
-                    SaleItem.objects.create(sale=sale, product=product, quantity=qty, unit_price=product.selling_price)
-                    StockTransaction.objects.create(
-                        product=product, quantity=-qty,
-                        transaction_type=StockTransaction.OUT,
-                        reference=f"Online Order #{sale.id}"
+                by_pk = {str(p.pk): p for p in products}
+                missing = [pk for pk in cart.items if pk not in by_pk]
+                if missing:
+                    for pk in missing:
+                        cart.remove(pk)
+                    messages.error(request, "Some items in your cart are no longer available and were removed.")
+                    return redirect('inventory:cart')
+
+                # Reserve stock: locks every line's balance in a fixed order and validates in one query
+                lines = [(by_pk[pk], qty, by_pk[pk].selling_price) for pk, qty in cart.items.items()]
+                try:
+                    sale = record_sale(
+                        lines, reference="Online Order #{id}",
+                        customer=customer, status='PENDING', channel='WEB'
                     )
-                total_to_pay = total
-
-            # HANDLE M-PESA INTEGRATION
+                except InsufficientStock as exc:
+                    for msg in exc.messages:
+                        messages.error(request, msg)
+                    return redirect('inventory:cart')
+                send_order_confirmation.enqueue(sale_id=sale.id)
+
+            # Side effects are queued in the same transaction and run by the
+            # job workers once it commits, so the request never waits on
+            # Safaricom or the mail server.
             if payment_method == 'mpesa' and phone_number:
-                mpesa = MpesaClient()
                 # Format phone to 2547XXXXXXXX
                 formatted_phone = "254" + phone_number.lstrip('0').lstrip('+').lstrip('254')
-                
-                stk_response = mpesa.stk_push(formatted_phone, total_to_pay, sale.id)
-                
-                if stk_response.get('ResponseCode') == '0':
-                    MpesaTransaction.objects.create(
-                        sale=sale,
-                        merchant_request_id=stk_response.get('MerchantRequestID'),
-                        checkout_request_id=stk_response.get('CheckoutRequestID'),
-                        amount=total_to_pay,
-                        phone=formatted_phone
-                    )
-                    messages.success(request, f"M-Pesa prompt sent to {formatted_phone}.")
-                else:
-                    messages.error(request, "M-Pesa request failed. Please try again.")
-                    # Only rollback if it's a new order; otherwise, just stay on the page
-                    if not order_id:
-                        transaction.set_rollback(True)
-                    return redirect('inventory:my_orders' if order_id else 'inventory:checkout')
-
-            # Finalize: Clear cart if this was a new checkout
-            if not order_id:
-                request.session['cart'] = {}
-                # Send async email via our Utility
-                EmailClient.send_order_confirmation(request.user, sale)
-                messages.success(request, f"Order #{sale.id} placed successfully!")
-            
-            return redirect('inventory:my_orders')
+                # Only a new order is undone (releasing its stock) if the push is rejected
+                mpesa_stk_push.enqueue(sale_id=sale.id, phone=formatted_phone, cancel_on_failure=not order_id)
+                messages.success(request, f"An M-Pesa prompt will be sent to {formatted_phone} shortly.")
+
+        # Finalize: Clear cart if this was a new checkout
+        if not order_id:
+            cart.clear()
+            messages.success(request, f"Order #{sale.id} placed successfully!")
+
+        return redirect('inventory:my_orders')
 
     # GET Request: Only allow if there's a cart
     if not cart:
         return redirect('inventory:store_home')
         
     return render(request, "store/checkout.html", {
-        'cart': cart, 
+        'cart': cart.items,
         'total': total,
         'items_with_details': items_with_details
     })
 
 @csrf_exempt
+@require_POST
 def mpesa_callback(request):
-    """Handles Safaricom M-Pesa Callback"""
-    data = json.loads(request.body)
-    stk_callback = data['Body']['stkCallback']
-    checkout_id = stk_callback['CheckoutRequestID']
-    result_code = stk_callback['ResultCode']
-    
+    """
+    Handles Safaricom M-Pesa STK callbacks. The callback is only recorded here
+    (one INSERT, duplicates ignored) and applied by process_mpesa_callbacks.
+    """
     try:
-        transaction_record = MpesaTransaction.objects.get(checkout_request_id=checkout_id)
-        if result_code == 0:
-            transaction_record.status = 'COMPLETED'
-            # Update the sale status
-            sale = transaction_record.sale
-            sale.status = 'COMPLETED'
-            sale.save()
-        else:
-            transaction_record.status = 'FAILED'
-        transaction_record.save()
-    except MpesaTransaction.DoesNotExist:
-        pass
-        
-    return JsonResponse({"ResultCode": 0, "ResultDesc": "Success"})
+        stk_callback = json.loads(request.body)['Body']['stkCallback']
+        checkout_id = str(stk_callback['CheckoutRequestID'])
+        result_code = int(stk_callback['ResultCode'])
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({"ResultCode": 1, "ResultDesc": "Invalid callback"}, status=400)
+
+    MpesaCallback.objects.bulk_create(
+        [MpesaCallback(checkout_request_id=checkout_id, result_code=result_code, payload=stk_callback)],
+        ignore_conflicts=True,
+    )
+    return JsonResponse({"ResultCode": 0, "ResultDesc": "Accepted"})
+
+def with_order_details(queryset):
+    """
+    Load everything an order listing renders in a fixed number of queries:
+    the customer, line items with their products, and the order's M-Pesa
+    payments newest first (as ``payment_list``; ``latest_payment`` is the head).
+    """
+    return queryset.select_related('customer').prefetch_related(
+        Prefetch('items', queryset=SaleItem.objects.select_related('product').order_by('pk')),
+        Prefetch('payments', queryset=MpesaTransaction.objects.order_by('-date_created', '-pk'), to_attr='payment_list'),
+    )
+
+class OrderDetailsMixin(KeysetPaginationMixin):
+    paginate_by = 20
+    keyset = ("-date", "-pk")
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        for order in context[self.context_object_name]:
+            order.latest_payment = order.payment_list[0] if order.payment_list else None
+        return context
 
-class CustomerOrderListView(LoginRequiredMixin, ListView):
+class CustomerOrderListView(LoginRequiredMixin, OrderDetailsMixin, ListView):
     model = Sale
     template_name = "store/my_orders.html"
     context_object_name = "orders"
-    ordering = ['-date']
 
     def get_queryset(self):
         if hasattr(self.request.user, 'customer_profile'):
-            return Sale.objects.filter(customer=self.request.user.customer_profile)
+            orders = Sale.objects.filter(customer=self.request.user.customer_profile)
+            return with_order_details(orders).order_by(*self.get_ordering())
         return Sale.objects.none()
 
 # ==========================================
@@ -268,10 +388,11 @@ class DashboardHomeView(StaffRequiredMixin, TemplateView):
         context['products_count'] = Product.objects.count()
         context['suppliers_count'] = Supplier.objects.count()
         context['categories_count'] = Category.objects.count()
-        all_products = Product.objects.all()
-        context['low_stock_products'] = [p for p in all_products if p.stock_quantity <= p.reorder_level]
-        today = timezone.now().date()
-        daily_sales = Sale.objects.filter(date__date=today, status='COMPLETED').aggregate(total=Sum('total'))
+        low_stock = Paginator(Product.objects.low_stock().select_related('category', 'unit'), 10)
+        context['low_stock_products'] = low_stock.get_page(self.request.GET.get('low_stock_page'))
+        context['low_stock_count'] = low_stock.count
+        today = timezone.localdate()
+        daily_sales = DailySalesSummary.objects.filter(date=today, status='COMPLETED').aggregate(total=Sum('revenue'))
         context['todays_sales'] = daily_sales.get('total') or 0.00
         context['pending_orders'] = Sale.objects.filter(status='PENDING', channel='WEB').count()
         return context
@@ -283,7 +404,7 @@ class AdminReportView(StaffRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         now = timezone.now()
-        today = now.date()
+        today = timezone.localdate(now)
         
         # 1. Get Filter Parameter
         period = self.request.GET.get('period', 'today')
@@ -311,49 +432,146 @@ class AdminReportView(StaffRequiredMixin, TemplateView):
         if start_date:
             sales_qs = sales_qs.filter(date__range=(start_date, end_date))
 
-        # 4. Context Calculations
-        context['period_revenue'] = sales_qs.aggregate(Sum('total'))['total__sum'] or 0
-        context['total_revenue'] = Sale.objects.filter(status='COMPLETED').aggregate(Sum('total'))['total__sum'] or 0
-        context['today_revenue'] = Sale.objects.filter(status='COMPLETED', date__date=today).aggregate(Sum('total'))['total__sum'] or 0
+        # 4. Context Calculations (read from the daily rollup, not the Sale table)
+        period_days = None
+        if start_date:
+            start_day = timezone.localdate(start_date) if timezone.is_aware(start_date) else start_date.date()
+            end_day = timezone.localdate(end_date) if timezone.is_aware(end_date) else end_date.date() - timedelta(days=1)
+            period_days = Q(date__range=(start_day, end_day))
+        context.update(DailySalesSummary.objects.filter(status='COMPLETED').aggregate(
+            period_revenue=Coalesce(Sum('revenue', filter=period_days), Decimal(0)),
+            total_revenue=Coalesce(Sum('revenue'), Decimal(0)),
+            today_revenue=Coalesce(Sum('revenue', filter=Q(date=today)), Decimal(0)),
+        ))
         
-        context['recent_sales'] = sales_qs.order_by('-date')[:10]
+        context['recent_sales'] = sales_qs.select_related('customer').order_by('-date')[:10]
+        export_start = start_date or Sale.objects.order_by('date').values_list('date', flat=True).first() or now
+        context['export_start'] = timezone.localdate(export_start) if timezone.is_aware(export_start) else export_start.date()
+        context['export_end'] = timezone.localdate(end_date) if timezone.is_aware(end_date) else end_date.date() - timedelta(days=1)
         
         # Counts & Alerts (Static)
         context['total_products'] = Product.objects.count()
         context['total_suppliers'] = Supplier.objects.count()
         context['total_customers'] = Customer.objects.count()
-        all_products = Product.objects.all()
-        context['critical_stock'] = [p for p in all_products if p.stock_quantity <= 0]
-        context['reorder_stock'] = [p for p in all_products if p.stock_quantity > 0 and p.stock_quantity <= p.reorder_level]
+        low_stock = Product.objects.low_stock()
+        context.update(low_stock.aggregate(
+            critical_count=Count('pk', filter=Q(on_hand__lte=0)),
+            reorder_count=Count('pk', filter=Q(on_hand__gt=0)),
+        ))
+        context['stock_alerts'] = Paginator(low_stock, 50).get_page(self.request.GET.get('stock_page'))
+        params = self.request.GET.copy()
+        params.pop('stock_page', None)
+        context['report_query'] = params.urlencode()
+
+        # Category rollup: children of ?category= (roots by default), each over its whole subtree
+        rollup_parent = None
+        try:
+            rollup_parent = Category.objects.get(pk=int(self.request.GET.get('category', '')))
+        except (ValueError, Category.DoesNotExist):
+            pass
+        nodes = Category.objects.filter(parent=rollup_parent).order_by('name')
+        if rollup_parent and not nodes.exists():
+            nodes = [rollup_parent]
+        context['category_rollup'] = CategoryClosure.rollup(nodes, sales=sales_qs)
+        context['rollup_path'] = list(rollup_parent.ancestors()) if rollup_parent else []
+        params.pop('category', None)
+        context['category_query'] = params.urlencode()
         
         # Meta Data
         context['report_date'] = now
         context['current_period'] = period
         return context
 
-class OrderListView(StaffRequiredMixin, ListView):
+class OrderListView(StaffRequiredMixin, OrderDetailsMixin, ListView):
     model = Sale
     template_name = "dashboard/order_list.html"
     context_object_name = "orders"
-    def get_queryset(self):
-        return Sale.objects.filter(channel='WEB').order_by('-date')
+    queryset = with_order_details(Sale.objects.filter(channel='WEB'))
 
 def approve_order(request, pk):
     if not request.user.is_staff: return redirect('login')
     order = get_object_or_404(Sale, pk=pk)
-    if order.status == 'PENDING':
-        with transaction.atomic():
-            order.status = 'COMPLETED'
-            order.save()
-            messages.success(request, f"Order #{order.id} marked as Completed.")
+    if complete_pending_sales([order.pk]):
+        messages.success(request, f"Order #{order.id} marked as Completed.")
     return redirect('inventory:order_list')
 
+class RequestMetricsView(StaffRequiredMixin, TemplateView):
+    """Rolling per-view timings from this worker's metrics buffer; POST clears it."""
+    template_name = "dashboard/request_metrics.html"
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['enabled'] = settings.REQUEST_METRICS
+        context['rows'] = metrics_buffer.summary()
+        context['sample_count'] = len(metrics_buffer.snapshot())
+        context['buffer_size'] = settings.REQUEST_METRICS_BUFFER
+        return context
+
+    def post(self, request, *args, **kwargs):
+        metrics_buffer.clear()
+        messages.success(request, "Request metrics cleared.")
+        return redirect('inventory:request_metrics')
+
+def export_view(request, dataset):
+    """Stream a CSV export; ?start= and ?end= are inclusive YYYY-MM-DD days (default: today)."""
+    if not request.user.is_staff: return redirect('login')
+    if dataset not in EXPORTS:
+        raise Http404("Unknown export.")
+    today = timezone.localdate()
+    try:
+        start = parse_date(request.GET.get('start', '')) or today
+        end = parse_date(request.GET.get('end', '')) or today
+    except ValueError:
+        return HttpResponse("Dates must be YYYY-MM-DD.", status=400)
+    response = StreamingHttpResponse(csv_lines(export_rows(dataset, start, end)), content_type="text/csv")
+    response['Content-Disposition'] = f'attachment; filename="{dataset}_{start}_{end}.csv"'
+    return response
+
 # --- STOCK & SETTINGS ---
-class StockTransactionListView(StaffRequiredMixin, ListView):
+class StockTransactionListView(StaffRequiredMixin, KeysetPaginationMixin, ListView):
     model = StockTransaction
     template_name = "dashboard/transaction_list.html"
     context_object_name = "transactions"
     paginate_by = 30
+    keyset = ("-timestamp", "-pk")
+    queryset = StockTransaction.objects.select_related('product')
+
+def parse_as_of(value):
+    """An aware moment from ?at=/?date=: a datetime as given, or a YYYY-MM-DD date meaning the end of that day."""
+    day = parse_date(value)
+    if day is not None:
+        return day_bounds(day, day)[1]
+    moment = parse_datetime(value)
+    if moment is not None:
+        return moment if timezone.is_aware(moment) else timezone.make_aware(moment)
+    return None
+
+class StockAsOfView(StaffRequiredMixin, KeysetPaginationMixin, ListView):
+    """Each product's stock at a past moment next to today's; defaults to the end of last month."""
+    model = Product
+    template_name = "dashboard/stock_as_of.html"
+    context_object_name = "products"
+    paginate_by = 30
+    keyset = ("name", "pk")
+    queryset = Product.objects.with_stock().select_related('unit')
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        try:
+            at = parse_as_of(self.request.GET.get('date', ''))
+        except ValueError:
+            at = None
+        if at is None:
+            at = StockSnapshot.month_start(timezone.now())
+        # Only the products on this page, so the cost is per page, not per catalogue
+        quantities = StockSnapshot.stock_at(at, [p.pk for p in context['products']])
+        for product in context['products']:
+            product.as_of_quantity = quantities.get(product.pk, 0)
+            product.stock_change = product.on_hand - product.as_of_quantity
+        context['as_of'] = at
+        context['as_of_date'] = timezone.localdate(at - timedelta(microseconds=1))
+        context['pager_query'] = f"date={context['as_of_date']:%Y-%m-%d}"
+        return context
 
 class CategoryListView(StaffRequiredMixin, ListView):
     model = Category
@@ -399,11 +617,13 @@ class UnitDeleteView(StaffRequiredMixin, DeleteView):
     template_name = "units/unit_confirm_delete.html"
     success_url = reverse_lazy("inventory:unit_list")
 
-class ProductListView(StaffRequiredMixin, ListView):
+class ProductListView(StaffRequiredMixin, KeysetPaginationMixin, ListView):
     model = Product
     template_name = "products/product_list.html"
     context_object_name = "products"
     paginate_by = 20
+    keyset = ("name", "pk")
+    queryset = Product.objects.with_stock().select_related('category')
 
 class ProductCreateView(StaffRequiredMixin, CreateView):
     model = Product
@@ -411,6 +631,23 @@ class ProductCreateView(StaffRequiredMixin, CreateView):
     template_name = "products/product_form.html"
     success_url = reverse_lazy("inventory:product_list")
 
+def product_import_view(request):
+    if not request.user.is_staff: return redirect('login')
+    context = {}
+    form = ProductImportUploadForm(request.POST or None, request.FILES or None)
+    if request.method == "POST" and form.is_valid():
+        upload = io.TextIOWrapper(form.cleaned_data['file'].file, encoding='utf-8-sig', newline='')
+        try:
+            result = import_products(upload, dry_run=form.cleaned_data['dry_run'])
+        except UnicodeDecodeError:
+            form.add_error('file', "The file must be UTF-8 encoded CSV.")
+        else:
+            context.update(result=result, errors=result.errors[:200], dry_run=form.cleaned_data['dry_run'])
+            if result.ok and not form.cleaned_data['dry_run']:
+                messages.success(request, f"Imported {result.created} new and {result.updated} updated products.")
+    context['form'] = form
+    return render(request, "products/product_import.html", context)
+
 class ProductUpdateView(StaffRequiredMixin, UpdateView):
     model = Product
     form_class = ProductForm
@@ -422,11 +659,12 @@ class ProductDeleteView(StaffRequiredMixin, DeleteView):
     template_name = "products/product_confirm_delete.html"
     success_url = reverse_lazy("inventory:product_list")
 
-class SupplierListView(StaffRequiredMixin, ListView):
+class SupplierListView(StaffRequiredMixin, KeysetPaginationMixin, ListView):
     model = Supplier
     template_name = "suppliers/supplier_list.html"
     context_object_name = "suppliers"
     paginate_by = 20
+    keyset = ("name", "pk")
 
 class SupplierCreateView(StaffRequiredMixin, CreateView):
     model = Supplier
@@ -434,11 +672,12 @@ class SupplierCreateView(StaffRequiredMixin, CreateView):
     template_name = "suppliers/supplier_form.html"
     success_url = reverse_lazy("inventory:supplier_list")
 
-class CustomerListView(StaffRequiredMixin, ListView):
+class CustomerListView(StaffRequiredMixin, KeysetPaginationMixin, ListView):
     model = Customer
     template_name = "customers/customer_list.html"
     context_object_name = "customers"
     paginate_by = 20
+    keyset = ("name", "pk")
 
 class CustomerCreateView(StaffRequiredMixin, CreateView):
     model = Customer
@@ -447,51 +686,36 @@ class CustomerCreateView(StaffRequiredMixin, CreateView):
     success_url = reverse_lazy("inventory:customer_list")
 
 # --- POS & PURCHASES ---
+def _formset_lines(formset, default_price=None):
+    lines = []
+    for item in formset:
+        if item.cleaned_data and not item.cleaned_data.get("DELETE", False):
+            prod = item.cleaned_data['product']
+            unit_price = item.cleaned_data.get('unit_price')
+            if default_price and not unit_price:
+                unit_price = default_price(prod)
+            lines.append((prod, item.cleaned_data['quantity'], unit_price or 0))
+    return lines
+
 def pos_sale_create_view(request):
     if not request.user.is_staff: return redirect("login")
     if request.method == "POST":
         formset = SaleItemFormSet(request.POST, prefix="items")
         customer_id = request.POST.get("customer")
         if formset.is_valid():
-            with transaction.atomic():
-                customer = None
-                if customer_id:
-                    customer = get_object_or_404(Customer, pk=customer_id)
-                
-                sale = Sale.objects.create(customer=customer, status='COMPLETED', channel='POS', total=0)
-                
-                total = 0
-                for item in formset:
-                    if item.cleaned_data and not item.cleaned_data.get("DELETE", False):
-                        prod = item.cleaned_data['product']
-                        qty = item.cleaned_data['quantity']
-                        
-                        # Use the form's unit price, or fallback to the product's default selling price
-                        unit_price = item.cleaned_data.get('unit_price') or prod.selling_price
-                        
-                        if prod.stock_quantity < qty:
-                             messages.error(request, f"Not enough stock for {prod.name}")
-                             transaction.set_rollback(True)
-                             return redirect("inventory:sale_add")
-                        
-                        si = item.save(commit=False)
-                        si.sale = sale
-                        si.unit_price = unit_price  # Force the unit price here
-                        si.save()
-                        
-                        total += qty * unit_price
-                        
-                        StockTransaction.objects.create(
-                            product=prod, 
-                            quantity=-qty,
-                            transaction_type=StockTransaction.OUT, 
-                            reference=f"POS Sale {sale.id}"
-                        )
-                
-                sale.total = total
-                sale.save()
-                messages.success(request, f"POS Sale #{sale.id} recorded for KES {total}")
-                return redirect("inventory:dashboard")
+            customer = None
+            if customer_id:
+                customer = get_object_or_404(Customer, pk=customer_id)
+            # Use the form's unit price, or fallback to the product's default selling price
+            lines = _formset_lines(formset, default_price=lambda prod: prod.selling_price)
+            try:
+                sale = record_sale(lines, reference="POS Sale {id}", customer=customer, status='COMPLETED', channel='POS')
+            except InsufficientStock as exc:
+                for msg in exc.messages:
+                    messages.error(request, msg)
+                return redirect("inventory:sale_add")
+            messages.success(request, f"POS Sale #{sale.id} recorded for KES {sale.total}")
+            return redirect("inventory:dashboard")
     else:
         formset = SaleItemFormSet(prefix="items")
     
@@ -511,25 +735,10 @@ def purchase_create_view(request):
         formset = PurchaseItemFormSet(request.POST, prefix="items")
         supplier_id = request.POST.get("supplier")
         if formset.is_valid() and supplier_id:
-            with transaction.atomic():
-                supplier = get_object_or_404(Supplier, pk=supplier_id)
-                purchase = Purchase.objects.create(supplier=supplier)
-                total = 0
-                for item in formset:
-                    if item.cleaned_data and not item.cleaned_data.get("DELETE", False):
-                        pi = item.save(commit=False)
-                        pi.purchase = purchase
-                        pi.save()
-                        total += pi.quantity * pi.unit_price
-                        StockTransaction.objects.create(
-                            product=pi.product, quantity=pi.quantity,
-                            transaction_type=StockTransaction.IN, 
-                            reference=f"Purchase {purchase.id}"
-                        )
-                purchase.total = total
-                purchase.save()
-                messages.success(request, "Purchase recorded.")
-                return redirect("inventory:dashboard")
+            supplier = get_object_or_404(Supplier, pk=supplier_id)
+            record_purchase(_formset_lines(formset), supplier=supplier)
+            messages.success(request, "Purchase recorded.")
+            return redirect("inventory:dashboard")
     else:
         formset = PurchaseItemFormSet(prefix="items")
     suppliers = Supplier.objects.all()
@@ -537,11 +746,108 @@ def purchase_create_view(request):
 
 # --- API ---
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all()
+    permission_classes = [permissions.IsAdminUser]
+    queryset = Product.objects.with_stock()
     serializer_class = ProductSerializer
+    filterset_fields = {
+        "sku": ["exact"],
+        "category": ["exact"],
+        "unit": ["exact"],
+        "active": ["exact"],
+        "selling_price": ["gte", "lte"],
+    }
 class SupplierViewSet(viewsets.ModelViewSet):
+    permission_classes = [permissions.IsAdminUser]
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
+    filterset_fields = {"name": ["exact", "icontains"], "phone": ["exact"], "email": ["exact"]}
 class CustomerViewSet(viewsets.ModelViewSet):
+    permission_classes = [permissions.IsAdminUser]
     queryset = Customer.objects.all()
-    serializer_class = CustomerSerializer
\ No newline at end of file
+    serializer_class = CustomerSerializer
+    filterset_fields = {"name": ["exact", "icontains"], "phone": ["exact"], "email": ["exact"]}
+
+# How far back each pull's cursor is set, so rows written by transactions
+# that were still open when the pull ran are picked up by the next pull.
+SYNC_OVERLAP = timedelta(seconds=30)
+
+class SyncPullView(APIView):
+    """
+    Offline POS delta feed: every product whose details, price or stock changed
+    after ``?since=<cursor>``, and the ids of products deleted since then.
+    Omit ``since`` for a full load, then pass back the returned ``cursor`` on
+    each subsequent pull.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        pulled_at = timezone.now()
+        since = request.query_params.get("since")
+        products = Product.objects.with_stock()
+        deleted = []
+        if since:
+            since = parse_datetime(since)
+            if since is None:
+                return Response({"since": "Expected an ISO 8601 timestamp."}, status=400)
+            changed = set(Product.objects.filter(updated_at__gt=since).values_list("pk", flat=True))
+            changed.update(StockBalance.objects.filter(updated_at__gt=since).values_list("product_id", flat=True))
+            products = products.filter(pk__in=changed)
+            deleted = list(
+                ProductTombstone.objects.filter(deleted_at__gt=since).order_by("product_id")
+                .values_list("product_id", flat=True).distinct()
+            )
+        return Response({
+            "cursor": (pulled_at - SYNC_OVERLAP).isoformat(),
+            "products": SyncProductSerializer(products.order_by("pk"), many=True).data,
+            "deleted": deleted,
+        })
+
+class StockAsOfAPIView(APIView):
+    """
+    Stock on hand at ``?at=`` (ISO datetime, or YYYY-MM-DD for the end of that
+    day), optionally narrowed by repeated ``?product=`` ids or a ``?category=``
+    subtree. Answered from the nearest monthly snapshot plus later ledger rows.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        try:
+            at = parse_as_of(request.query_params.get("at", ""))
+        except ValueError:
+            at = None
+        if at is None:
+            return Response({"at": "Expected an ISO 8601 date or datetime."}, status=400)
+        products, narrowed = Product.objects.order_by("pk"), False
+        try:
+            if request.query_params.getlist("product"):
+                products = products.filter(pk__in=[int(pk) for pk in request.query_params.getlist("product")])
+                narrowed = True
+            if request.query_params.get("category"):
+                products = products.in_category(int(request.query_params["category"]))
+                narrowed = True
+        except ValueError:
+            return Response({"detail": "product and category must be integer ids."}, status=400)
+        rows = list(products.values_list("pk", "sku"))
+        quantities = StockSnapshot.stock_at(at, [pk for pk, _ in rows] if narrowed else None)
+        return Response({
+            "at": at.isoformat(),
+            "stock": [{"product": pk, "sku": sku, "quantity": f"{quantities.get(pk, 0):.2f}"} for pk, sku in rows],
+        })
+
+class SyncPushView(APIView):
+    """
+    Accepts a batch of sales recorded offline, keyed by client-generated UUIDs.
+    Re-pushing a batch is safe: already-booked UUIDs are reported, not re-booked.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def post(self, request):
+        serializer = OfflineSaleSerializer(data=request.data.get("sales", []), many=True)
+        serializer.is_valid(raise_exception=True)
+        results = apply_offline_sales(serializer.validated_data)
+        return Response({
+            "sales": [
+                {"client_uuid": str(uuid), "sale_id": sale.id, "created": created}
+                for uuid, (sale, created) in results.items()
+            ]
+        })